@@ -0,0 +1,478 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+In-process stand-ins for the GitHub and Concourse HTTP APIs, implementing just enough of them
+to replicate pipelines (see `benchmark.replication`).
+'''
+
+import base64
+import collections
+import hashlib
+import http.server
+import json
+import os
+import re
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import util
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self):
+        fake_server = self.server.fake_server
+        parsed_url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        fake_server._count_request(self.command)
+        if fake_server.latency:
+            time.sleep(fake_server.latency)
+
+        for method, pattern, handler in fake_server._routes():
+            if method != self.command:
+                continue
+            match = re.fullmatch(pattern, parsed_url.path)
+            if match:
+                status, headers, response_body = handler(
+                    body=body,
+                    query={k: v[0] for k, v in parse_qs(parsed_url.query).items()},
+                    **match.groupdict(),
+                )
+                break
+        else:
+            status, headers, response_body = 404, {}, {'message': 'Not Found'}
+
+        if not isinstance(response_body, bytes):
+            response_body = json.dumps(response_body).encode('utf-8')
+            headers = {'Content-Type': 'application/json', **headers}
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    do_GET = do_PUT = do_POST = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass # do not spam stderr
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients dropping connections (e.g. during TLS handshakes) are expected; do not print
+        # tracebacks to stderr for those
+        if isinstance(sys.exc_info()[1], (ssl.SSLError, ConnectionError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class _FakeServer(object):
+    def __init__(self, latency: float=0.0):
+        '''
+        @param latency: seconds to delay each response (to simulate network latency)
+        '''
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.request_counts = collections.Counter()
+        self._httpd = None
+        self._thread = None
+
+    def _routes(self):
+        raise NotImplementedError('subclasses must override')
+
+    def _count_request(self, method):
+        with self._lock:
+            self.request_counts[method] += 1
+
+    def _wrap_socket(self, sock):
+        return sock
+
+    def start(self):
+        self._httpd = _HTTPServer(('127.0.0.1', 0), _RequestHandler)
+        self._httpd.fake_server = self
+        self._httpd.socket = self._wrap_socket(self._httpd.socket)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    @property
+    def host(self):
+        return f'127.0.0.1:{self.port}'
+
+
+def _blob_sha(contents: str):
+    # git blob object id
+    data = contents.encode('utf-8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class FakeGithubServer(_FakeServer):
+    '''
+    Serves the given (synthetic) organisations through (the subset of) GitHub's REST (v3) and
+    GraphQL APIs used to enumerate pipeline definitions.
+
+    Organisations are given as a dict: `{org_name: {repo_name: repository}}`, where each
+    repository is a dict with the following attributes:
+
+    - `default_branch`: name of the default branch
+    - `branches`: dict mapping branch names to the contents of `.ci/pipeline_definitions`
+      (or `None` if absent)
+    - `branch_cfg`: contents of `branch.cfg` in `refs/meta/ci` (or `None` if absent)
+    '''
+    REST_PAGE_SIZE = 30
+
+    def __init__(self, organisations: dict, latency: float=0.0):
+        super().__init__(latency=latency)
+        self.organisations = organisations
+
+    @property
+    def http_url(self):
+        return f'http://{self.host}'
+
+    @property
+    def api_url(self):
+        return f'{self.http_url}/api/v3'
+
+    def _routes(self):
+        api = '/api/v3'
+        return (
+            ('POST', '/api/graphql', self._graphql),
+            ('GET', f'{api}/orgs/(?P<org>[^/]+)', self._org),
+            ('GET', f'{api}/orgs/(?P<org>[^/]+)/repos', self._org_repos),
+            ('GET', f'{api}/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)', self._repo),
+            ('GET', f'{api}/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/branches', self._branches),
+            (
+                'GET',
+                f'{api}/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/contents/(?P<path>.+)',
+                self._contents,
+            ),
+        )
+
+    def _url(self, *parts):
+        return '/'.join((self.api_url,) + parts)
+
+    def _paginated(self, elements, query, url):
+        page = int(query.get('page', 1))
+        page_size = int(query.get('per_page', self.REST_PAGE_SIZE))
+        start = (page - 1) * page_size
+        headers = {}
+        if start + page_size < len(elements):
+            headers['Link'] = f'<{url}?per_page={page_size}&page={page + 1}>; rel="next"'
+        return 200, headers, elements[start:start + page_size]
+
+    def _user_json(self, login):
+        url = self._url('users', login)
+        user = {
+            'login': login,
+            'id': 1,
+            'type': 'Organization',
+            'url': url,
+            'html_url': f'{self.http_url}/{login}',
+            'gravatar_id': '',
+        }
+        for attr in (
+            'avatar', 'events', 'followers', 'following', 'gists', 'organizations',
+            'received_events', 'repos', 'starred', 'subscriptions',
+        ):
+            user[f'{attr}_url'] = f'{url}/{attr}'
+        return user
+
+    def _repo_json(self, org, repo):
+        url = self._url('repos', org, repo)
+        repo_json = {
+            'id': abs(hash((org, repo))) % 10**8,
+            'name': repo,
+            'full_name': f'{org}/{repo}',
+            'owner': self._user_json(org),
+            'private': False,
+            'fork': False,
+            'description': '',
+            'url': url,
+            'html_url': f'{self.http_url}/{org}/{repo}',
+            'default_branch': self.organisations[org][repo]['default_branch'],
+        }
+        for attr in (
+            'archive', 'assignees', 'blobs', 'branches', 'collaborators', 'comments', 'commits',
+            'compare', 'contents', 'contributors', 'deployments', 'downloads', 'events', 'forks',
+            'git_commits', 'git_refs', 'git_tags', 'hooks', 'issue_comment', 'issue_events',
+            'issues', 'keys', 'labels', 'languages', 'merges', 'milestones', 'notifications',
+            'pulls', 'releases', 'stargazers', 'statuses', 'subscribers', 'subscription', 'tags',
+            'teams', 'trees',
+        ):
+            repo_json[f'{attr}_url'] = f'{url}/{attr}'
+        return repo_json
+
+    def _org(self, body, query, org):
+        if org not in self.organisations:
+            return 404, {}, {'message': 'Not Found'}
+        org_json = self._user_json(org)
+        org_url = self._url('orgs', org)
+        org_json.update({
+            'url': org_url,
+            'repos_url': f'{org_url}/repos',
+            'events_url': f'{org_url}/events',
+            'description': '',
+            'hooks_url': f'{org_url}/hooks',
+            'issues_url': f'{org_url}/issues',
+            'members_url': f'{org_url}/members{{/member}}',
+            'public_members_url': f'{org_url}/public_members{{/member}}',
+            'created_at': '2019-01-01T00:00:00Z',
+            'followers': 0,
+            'following': 0,
+            'public_repos': len(self.organisations[org]),
+        })
+        return 200, {}, org_json
+
+    def _org_repos(self, body, query, org):
+        return self._paginated(
+            [self._repo_json(org, repo) for repo in sorted(self.organisations[org])],
+            query=query,
+            url=self._url('orgs', org, 'repos'),
+        )
+
+    def _repo(self, body, query, org, repo):
+        if repo not in self.organisations.get(org, {}):
+            return 404, {}, {'message': 'Not Found'}
+        return 200, {}, self._repo_json(org, repo)
+
+    def _branches(self, body, query, org, repo):
+        url = self._url('repos', org, repo)
+        return self._paginated(
+            [
+                {
+                    'name': branch,
+                    'commit': {
+                        'sha': hashlib.sha1(branch.encode('utf-8')).hexdigest(),
+                        'url': f'{url}/commits/{branch}',
+                    },
+                }
+                for branch in sorted(self.organisations[org][repo]['branches'])
+            ],
+            query=query,
+            url=f'{url}/branches',
+        )
+
+    def _file_contents(self, org, repo, path, ref):
+        repository = self.organisations.get(org, {}).get(repo)
+        if not repository:
+            return None
+        if path == 'branch.cfg' and ref == 'refs/meta/ci':
+            return repository.get('branch_cfg')
+        if path == '.ci/pipeline_definitions':
+            return repository['branches'].get(ref)
+        return None
+
+    def _contents(self, body, query, org, repo, path):
+        ref = query.get('ref') or self.organisations[org][repo]['default_branch']
+        contents = self._file_contents(org, repo, path, ref)
+        if contents is None:
+            return 404, {}, {'message': 'Not Found'}
+
+        url = self._url('repos', org, repo, 'contents', path)
+        sha = _blob_sha(contents)
+        return 200, {}, {
+            'type': 'file',
+            'encoding': 'base64',
+            'name': os.path.basename(path),
+            'path': path,
+            'sha': sha,
+            'size': len(contents),
+            'content': base64.b64encode(contents.encode('utf-8')).decode('ascii'),
+            'url': url,
+            'git_url': self._url('repos', org, repo, 'git', 'blobs', sha),
+            'html_url': f'{self.http_url}/{org}/{repo}/blob/{ref}/{path}',
+            'download_url': None,
+            '_links': {'self': url},
+        }
+
+    # GraphQL - queries are not parsed, but recognised by the fields issued by the enumerator
+
+    def _blob_json(self, contents):
+        if contents is None:
+            return None
+        return {'oid': _blob_sha(contents), 'text': contents, 'isTruncated': False}
+
+    def _refs_json(self, org, repo, page_size, cursor):
+        branches = sorted(self.organisations[org][repo]['branches'])
+        start = int(cursor) if cursor else 0
+        end = start + page_size
+        return {
+            'pageInfo': {'hasNextPage': end < len(branches), 'endCursor': str(end)},
+            'nodes': [{'name': branch} for branch in branches[start:end]],
+        }
+
+    def _graphql(self, body, query):
+        request = json.loads(body)
+        query_text = request['query']
+        variables = request.get('variables') or {}
+        org = variables['org']
+
+        if 'repositories(' in query_text:
+            data = self._graphql_repositories(org, variables)
+        elif 'refs(' in query_text:
+            data = {'repository': {'refs': self._refs_json(
+                org=org,
+                repo=variables['repo'],
+                page_size=variables['pageSize'],
+                cursor=variables.get('cursor'),
+            )}}
+        else:
+            data = self._graphql_definitions(org, query_text)
+
+        return 200, {}, {'data': data}
+
+    def _graphql_repositories(self, org, variables):
+        repos = sorted(self.organisations[org])
+        start = int(variables['cursor']) if variables.get('cursor') else 0
+        end = start + variables['pageSize']
+
+        nodes = []
+        for repo in repos[start:end]:
+            repository = self.organisations[org][repo]
+            default_branch = repository['default_branch']
+            nodes.append({
+                'name': repo,
+                'defaultBranchRef': {'name': default_branch},
+                'branchCfg': self._blob_json(repository.get('branch_cfg')),
+                'defaultDefinitions': self._blob_json(repository['branches'].get(default_branch)),
+                'refs': self._refs_json(org, repo, variables['branchesPageSize'], None),
+            })
+
+        return {'organization': {'repositories': {
+            'pageInfo': {'hasNextPage': end < len(repos), 'endCursor': str(end)},
+            'nodes': nodes,
+        }}}
+
+    def _graphql_definitions(self, org, query_text):
+        data = {}
+        for alias, repo, ref, path in re.findall(
+            r'(\w+): repository\(owner: \$org, name: "([^"]+)"\) \{ object\(expression: '
+            r'"([^":]+):([^"]+)"\)',
+            query_text,
+        ):
+            data[alias] = {'object': self._blob_json(self._file_contents(org, repo, path, ref))}
+        return data
+
+
+class FakeConcourseServer(_FakeServer):
+    '''
+    Serves (the subset of) Concourse's REST API used to deploy pipelines. As concourse clients
+    always connect via HTTPS, a self-signed certificate is created (requires the `openssl`
+    command line tool).
+
+    Deployed pipelines are kept in memory (`pipelines` attribute, mapping team names to dicts
+    mapping pipeline names to their raw (YAML) definitions).
+    '''
+    def __init__(self, latency: float=0.0):
+        super().__init__(latency=latency)
+        self.pipelines = collections.defaultdict(dict)
+        self._versions = collections.Counter()
+        self._cert_dir = None
+
+    def _wrap_socket(self, sock):
+        self._cert_dir = tempfile.TemporaryDirectory()
+        cert_file = os.path.join(self._cert_dir.name, 'cert.pem')
+        key_file = os.path.join(self._cert_dir.name, 'key.pem')
+        subprocess.run(
+            [
+                'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                '-subj', '/CN=127.0.0.1', '-keyout', key_file, '-out', cert_file,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+        return context.wrap_socket(sock, server_side=True)
+
+    def stop(self):
+        super().stop()
+        if self._cert_dir:
+            self._cert_dir.cleanup()
+
+    def _routes(self):
+        pipeline = '/api/v1/teams/(?P<team>[^/]+)/pipelines/(?P<pipeline>[^/]+)'
+        return (
+            ('POST', '/sky/token', self._login),
+            ('GET', '/api/v1/teams/(?P<team>[^/]+)/pipelines', self._list_pipelines),
+            ('PUT', '/api/v1/teams/(?P<team>[^/]+)/pipelines/ordering', self._ok),
+            ('GET', f'{pipeline}/config', self._pipeline_config),
+            ('PUT', f'{pipeline}/config', self._set_pipeline_config),
+            ('DELETE', pipeline, self._delete_pipeline),
+            ('PUT', f'{pipeline}/(unpause|expose)', self._ok),
+            ('POST', f'{pipeline}/resources/[^/]+/check', self._ok),
+        )
+
+    def _ok(self, body, query, **kwargs):
+        return 200, {}, b''
+
+    def _login(self, body, query):
+        return 200, {}, {'access_token': 'fake-token', 'token_type': 'Bearer'}
+
+    def _list_pipelines(self, body, query, team):
+        with self._lock:
+            names = sorted(self.pipelines[team])
+        return 200, {}, [{'name': name, 'team_name': team} for name in names]
+
+    def _pipeline_config(self, body, query, team, pipeline):
+        with self._lock:
+            definition = self.pipelines[team].get(pipeline)
+            version = self._versions[(team, pipeline)]
+        if definition is None:
+            return 404, {}, b''
+        return (
+            200,
+            {'X-Concourse-Config-Version': str(version)},
+            {'config': util.load_yaml(definition)},
+        )
+
+    def _set_pipeline_config(self, body, query, team, pipeline):
+        with self._lock:
+            self.pipelines[team][pipeline] = body.decode('utf-8')
+            self._versions[(team, pipeline)] += 1
+        return 200, {}, b''
+
+    def _delete_pipeline(self, body, query, team, pipeline):
+        with self._lock:
+            self.pipelines[team].pop(pipeline, None)
+        return 204, {}, b''
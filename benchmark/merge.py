@@ -0,0 +1,192 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Micro-benchmark comparing `util.merge_dicts` against the previous, `deepmerge`-based
+implementation, using synthetic pipeline definitions shaped like those merged during
+replication (variants onto base definitions, overrides onto pipeline definitions).
+
+usage: python3 -m benchmark.merge --variants 20 --steps 20 --iterations 200
+'''
+
+import argparse
+import json
+import random
+import timeit
+
+import util
+from benchmark.common import git_commit
+
+
+def legacy_merge_dicts(base: dict, other: dict, list_semantics='merge'):
+    '''
+    the implementation of `util.merge_dicts` before it was replaced by a dedicated merge engine
+    (kept as a reference for comparison)
+    '''
+    from deepmerge import Merger
+
+    if list_semantics == 'merge':
+        # monkey-patch merge-strategy for lists
+        list_merge_strategy = Merger.PROVIDED_TYPE_STRATEGIES[list]
+        list_merge_strategy.strategy_merge = lambda c, p, base, other: \
+            list(base) + [e for e in other if e not in base]
+
+        strategy_cfg = [(list, ['merge']), (dict, ['merge'])]
+        merger = Merger(strategy_cfg, ['override'], ['override'])
+    elif list_semantics is None:
+        strategy_cfg = [(dict, ['merge'])]
+        merger = Merger(strategy_cfg, ['override'], ['override'])
+    else:
+        raise NotImplementedError
+
+    from copy import deepcopy
+    return merger.merge(deepcopy(base), deepcopy(other))
+
+
+def synthetic_definitions(
+    variants: int=10,
+    steps: int=10,
+    list_length: int=50,
+    seed: int=0,
+):
+    '''
+    returns a list of (base, other) pairs of dicts to merge
+    '''
+    rnd = random.Random(seed)
+
+    def step(idx):
+        return {
+            'image': f'registry.example.org/step-{idx}:1.0.{idx}',
+            'depends': [f'step-{d}' for d in range(idx)],
+            'output_dir': f'out-{idx}',
+            'vars': {f'VAR_{v}': f'value-{v}' for v in range(5)},
+            'execute': ['run.sh', '--verbose', f'--step={idx}'],
+        }
+
+    base_definition = {
+        'repo': {'path': 'org/repo', 'branch': 'master', 'trigger': True},
+        'steps': {f'step-{idx}': step(idx) for idx in range(steps)},
+        'traits': {
+            'version': {'preprocess': 'finalize'},
+            'notifications': {'default': {'on_error': {'triggering_policy': 'only_first'}}},
+            'component_descriptor': {},
+        },
+        'paths': [f'path/{idx}' for idx in range(list_length)],
+        'teams': [{'name': f'team-{idx}', 'role': 'member'} for idx in range(3)],
+    }
+
+    pairs = []
+    for idx in range(variants):
+        variant = {
+            'traits': {
+                'version': {'preprocess': rnd.choice(('finalize', 'inject-commit-hash'))},
+                f'trait-{idx}': {'option': idx},
+            },
+            'steps': {
+                f'step-{rnd.randrange(steps)}': {'depends': [f'extra-{idx}']},
+                f'variant-step-{idx}': step(idx),
+            },
+            'paths': [f'path/{rnd.randrange(list_length * 2)}' for _ in range(list_length)],
+            'teams': [{'name': 'team-0', 'role': 'member'}, {'name': f'team-{idx}', 'role': 'x'}],
+        }
+        pairs.append((base_definition, variant))
+    return pairs
+
+
+def run_benchmark(
+    variants: int=10,
+    steps: int=10,
+    list_length: int=50,
+    iterations: int=20,
+    seed: int=0,
+):
+    '''
+    runs the merge micro-benchmark and returns its results as a (JSON-serialisable) dict.
+    Raises a `RuntimeError` if both implementations' results differ.
+    '''
+    pairs = synthetic_definitions(
+        variants=variants,
+        steps=steps,
+        list_length=list_length,
+        seed=seed,
+    )
+
+    implementations = {
+        'legacy': legacy_merge_dicts,
+        'merge_dicts': util.merge_dicts,
+        'merge_dicts_shared': lambda base, other: util.merge_dicts(
+            base, other, share_unmodified=True,
+        ),
+    }
+
+    expected = [legacy_merge_dicts(base, other) for base, other in pairs]
+    for name, merge in implementations.items():
+        if [merge(base, other) for base, other in pairs] != expected:
+            raise RuntimeError(f'results of {name} differ from legacy implementation')
+
+    results = {}
+    for name, merge in implementations.items():
+        seconds = min(timeit.repeat(
+            lambda: [merge(base, other) for base, other in pairs],
+            number=iterations,
+            repeat=3,
+        ))
+        results[name] = {
+            'seconds_per_merge': seconds / (iterations * len(pairs)),
+            'speedup': None,
+        }
+    for result in results.values():
+        result['speedup'] = results['legacy']['seconds_per_merge'] / result['seconds_per_merge']
+
+    return {
+        'commit': git_commit(),
+        'parameters': {
+            'variants': variants,
+            'steps': steps,
+            'list_length': list_length,
+            'iterations': iterations,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--variants', type=int, default=10)
+    parser.add_argument('--steps', type=int, default=10, help='per definition')
+    parser.add_argument('--list-length', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write results to (default: stdout)')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        variants=args.variants,
+        steps=args.steps,
+        list_length=args.list_length,
+        iterations=args.iterations,
+        seed=args.seed,
+    )
+    result_text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(result_text)
+    else:
+        print(result_text)
+
+
+if __name__ == '__main__':
+    main()
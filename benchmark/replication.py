@@ -0,0 +1,399 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Benchmark for pipeline replication. Replicates pipelines from synthetic GitHub organisations
+(served by an in-process fake GitHub) to an in-process fake Concourse, end to end through
+`PipelineReplicator`, and reports throughput, per-stage latencies and peak RSS as JSON.
+
+usage: python3 -m benchmark.replication --repositories 100 --branches 3 --output result.json
+'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+import yaml
+
+import github.util
+from benchmark.common import CC_UTILS_DIR, git_commit
+from benchmark.fake_servers import FakeConcourseServer, FakeGithubServer
+from concourse.enumerator import (
+    DefinitionDescriptorPreprocessor,
+    GithubOrganisationDefinitionEnumerator,
+    GithubOrganisationGraphQLDefinitionEnumerator,
+    TemplateRetriever,
+)
+from concourse.metrics import ReplicationMetrics
+from concourse.replicator import (
+    ConcourseDeployer,
+    PipelineReplicator,
+    Renderer,
+    ReplicationResultProcessor,
+)
+from model import ConfigFactory
+
+CFG_NAME = 'benchmark'
+TEAM_NAME = 'main'
+
+# traits (round-robin) of generated jobs
+_JOB_TRAITS = (
+    {'component_descriptor': None, 'draft_release': None},
+    {'pull-request': None},
+    {'component_descriptor': None},
+    {'draft_release': None},
+)
+
+
+def synthetic_organisations(
+    organisations: int=1,
+    repositories: int=10,
+    branches: int=1,
+    variants: int=2,
+    branch_cfg_ratio: float=0.5,
+    seed: int=0,
+):
+    '''
+    creates synthetic organisations to be served by `FakeGithubServer`.
+
+    @param branches: number of branches per repository with pipeline definitions. Only
+        repositories with a `branch.cfg` have more than their default branch replicated
+    @param variants: number of jobs (variants) per pipeline definition
+    @param branch_cfg_ratio: fraction of repositories with a `branch.cfg`
+    '''
+    rnd = random.Random(seed)
+    result = {}
+    for org_idx in range(organisations):
+        org = result[f'org-{org_idx}'] = {}
+        for repo_idx in range(repositories):
+            repo_name = f'repo-{repo_idx}'
+            pipeline_name = f'{repo_name}-pipeline'
+            definitions = yaml.safe_dump({
+                pipeline_name: {
+                    'template': 'default',
+                    'base_definition': {'traits': {'version': None}},
+                    'jobs': {
+                        f'job-{idx}': {'traits': _JOB_TRAITS[idx % len(_JOB_TRAITS)]}
+                        for idx in range(variants)
+                    },
+                },
+            })
+
+            if rnd.random() < branch_cfg_ratio:
+                release_branches = [f'rel-{idx}' for idx in range(1, branches)]
+                branch_cfg = yaml.safe_dump({'cfgs': {
+                    'default': {'branches': ['master']},
+                    'releases': {
+                        'branches': ['rel-.*'],
+                        'inherit': {pipeline_name: {'base_definition': {
+                            'traits': {'version': {'preprocess': 'finalize'}},
+                        }}},
+                    },
+                }})
+            else:
+                release_branches = []
+                branch_cfg = None
+
+            org[repo_name] = {
+                'default_branch': 'master',
+                'branch_cfg': branch_cfg,
+                'branches': {
+                    # branches not matching any branch.cfg entry must be ignored
+                    'feature': definitions,
+                    'master': definitions,
+                    **{branch: definitions for branch in release_branches},
+                },
+            }
+    return result
+
+
+def cfg_factory(github_server: FakeGithubServer, concourse_server: FakeConcourseServer):
+    '''
+    creates a configuration factory with a cfg set (named `CFG_NAME`) referring to the given
+    fake servers
+    '''
+    def cfg_type(name, type_name):
+        return {'model': {'cfg_type_name': name, 'type': type_name, 'factory_method': name}}
+
+    credentials = {'username': 'user', 'password': 'passwd'}
+    raw = {
+        'cfg_types': {
+            'github': cfg_type('github', 'GithubConfig'),
+            'concourse': cfg_type('concourse', 'ConcourseConfig'),
+            'job_mapping': cfg_type('job_mapping', 'JobMappingSet'),
+            'container_registry': cfg_type('container_registry', 'ContainerRegistryConfig'),
+            'email': cfg_type('email', 'EmailConfig'),
+            'secrets_server': cfg_type('secrets_server', 'SecretsServerConfig'),
+            'cfg_set': cfg_type('cfg_set', 'ConfigurationSet'),
+        },
+        'github': {CFG_NAME: {
+            'sshUrl': f'ssh://git@{github_server.host}',
+            'httpUrl': github_server.http_url,
+            'apiUrl': github_server.api_url,
+            'disable_tls_validation': True,
+            'webhook_token': 'webhook-token',
+            'technicalUser': {
+                **credentials,
+                'authToken': 'token',
+                'privateKey': 'key',
+                'emailAddress': 'user@example.org',
+            },
+        }},
+        'concourse': {CFG_NAME: {
+            'externalUrl': f'https://{concourse_server.host}',
+            'ingress_host': concourse_server.host,
+            'teams': {TEAM_NAME: {'teamname': TEAM_NAME, **credentials}},
+            'concourse_version': '4',
+            'job_mapping': CFG_NAME,
+            'helm_chart_default_values_config': 'unused',
+            'helm_chart_values': 'unused',
+            'helm_chart_version': 'unused',
+            'kubernetes_cluster_config': 'unused',
+            'imagePullSecret': 'unused',
+            'tls_config': 'unused',
+            'tls_secret_name': 'unused',
+        }},
+        'job_mapping': {CFG_NAME: {
+            org: {
+                'concourse_target_team': TEAM_NAME,
+                'github_orgs': {org: {'github_cfg': CFG_NAME, 'github_org': org}},
+            }
+            for org in github_server.organisations
+        }},
+        'container_registry': {CFG_NAME: {**credentials, 'host': 'registry.example.org'}},
+        'email': {CFG_NAME: {'host': 'localhost', 'port': 25, 'credentials': credentials}},
+        'secrets_server': {CFG_NAME: {
+            'namespace': 'namespace',
+            'service_name': 'secrets-server',
+            'secrets': {
+                'concourse_config': {'name': 'concourse', 'attribute': 'cfg'},
+                'cfg_sets': [],
+            },
+        }},
+    }
+    raw['cfg_set'] = {CFG_NAME: {cfg_type: CFG_NAME for cfg_type in raw['cfg_types']}}
+    del raw['cfg_set'][CFG_NAME]['cfg_set']
+    return ConfigFactory.from_dict(raw)
+
+
+def replicate(
+    cfg_factory,
+    graphql_enumeration: bool=False,
+    render_processes: int=None,
+    stage_concurrency: dict=None,
+):
+    '''
+    replicates the pipelines of all job mappings of the benchmark cfg set, and returns the
+    replication metrics
+    '''
+    cfg_set = cfg_factory.cfg_set(CFG_NAME)
+    job_mapping_set = cfg_set.job_mapping()
+
+    if graphql_enumeration:
+        enumerator_type = GithubOrganisationGraphQLDefinitionEnumerator
+        enumerator_kwargs = {}
+    else:
+        enumerator_type = GithubOrganisationDefinitionEnumerator
+        enumerator_kwargs = {'scan_concurrency': {
+            **PipelineReplicator.DEFAULT_STAGE_CONCURRENCY,
+            **(stage_concurrency or {}),
+        }['enumerate']}
+
+    replicator = PipelineReplicator(
+        definition_enumerators=[
+            enumerator_type(job_mapping=job_mapping, cfg_set=cfg_set, **enumerator_kwargs)
+            for job_mapping in job_mapping_set.job_mappings().values()
+        ],
+        descriptor_preprocessor=DefinitionDescriptorPreprocessor(),
+        definition_renderer=Renderer(
+            template_retriever=TemplateRetriever(
+                template_path=[os.path.join(CC_UTILS_DIR, 'concourse', 'templates')],
+            ),
+            template_include_dir=os.path.join(CC_UTILS_DIR, 'concourse'),
+            cfg_set=cfg_set,
+        ),
+        definition_deployer=ConcourseDeployer(unpause_pipelines=True, expose_pipelines=True),
+        result_processor=ReplicationResultProcessor(cfg_set=cfg_set),
+        render_processes=render_processes,
+        stage_concurrency=stage_concurrency,
+        metrics=ReplicationMetrics(),
+    )
+    replicator.replicate()
+    return replicator.metrics
+
+
+def _peak_rss_bytes():
+    # ru_maxrss is reported in kilobytes on Linux, but in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def run_benchmark(
+    organisations: int=1,
+    repositories: int=10,
+    branches: int=1,
+    variants: int=2,
+    branch_cfg_ratio: float=0.5,
+    runs: int=1,
+    github_latency: float=0.0,
+    concourse_latency: float=0.0,
+    graphql_enumeration: bool=False,
+    render_processes: int=None,
+    stage_concurrency: dict=None,
+    seed: int=0,
+):
+    '''
+    runs the replication benchmark and returns its results as a (JSON-serialisable) dict.
+    Subsequent runs replicate into the same fake concourse (i.e. the first run creates all
+    pipelines, while subsequent ones update them).
+
+    Note that both fake servers run in the benchmarking process (and thus contribute to the
+    reported CPU and memory usage).
+    '''
+    parameters = {
+        'organisations': organisations,
+        'repositories': repositories,
+        'branches': branches,
+        'variants': variants,
+        'branch_cfg_ratio': branch_cfg_ratio,
+        'runs': runs,
+        'github_latency': github_latency,
+        'concourse_latency': concourse_latency,
+        'graphql_enumeration': graphql_enumeration,
+        'render_processes': render_processes,
+        'stage_concurrency': stage_concurrency,
+        'seed': seed,
+    }
+    github_server = FakeGithubServer(
+        organisations=synthetic_organisations(
+            organisations=organisations,
+            repositories=repositories,
+            branches=branches,
+            variants=variants,
+            branch_cfg_ratio=branch_cfg_ratio,
+            seed=seed,
+        ),
+        latency=github_latency,
+    )
+    concourse_server = FakeConcourseServer(latency=concourse_latency)
+
+    # do not try to log (fake) GitHub requests to elasticsearch
+    github.util.log_github_access = False
+
+    run_results = []
+    with github_server, concourse_server:
+        factory = cfg_factory(github_server=github_server, concourse_server=concourse_server)
+        for _ in range(runs):
+            github_requests = sum(github_server.request_counts.values())
+            concourse_requests = sum(concourse_server.request_counts.values())
+            start = time.time()
+            metrics = replicate(
+                cfg_factory=factory,
+                graphql_enumeration=graphql_enumeration,
+                render_processes=render_processes,
+                stage_concurrency=stage_concurrency,
+            )
+            duration = time.time() - start
+            summary = metrics.summary()
+            pipeline_count = len(concourse_server.pipelines[TEAM_NAME])
+
+            run_results.append({
+                'duration_seconds': duration,
+                'pipelines': pipeline_count,
+                'pipelines_per_second': pipeline_count / duration if duration else None,
+                'peak_rss_bytes': _peak_rss_bytes(),
+                'stages': summary['stages'],
+                'pipeline_latencies': {
+                    stage: {k: v for k, v in latencies.items() if k != 'pipelines'}
+                    for stage, latencies in summary['pipeline_latencies'].items()
+                },
+                'queue_depths': summary['queue_depths'],
+                'http_requests': {
+                    'github': sum(github_server.request_counts.values()) - github_requests,
+                    'concourse':
+                        sum(concourse_server.request_counts.values()) - concourse_requests,
+                },
+            })
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': parameters,
+        'runs': run_results,
+    }
+
+
+def _stage_concurrency(value):
+    stage_concurrency = {}
+    for entry in value.split(','):
+        stage, concurrency = entry.split('=')
+        stage_concurrency[stage.strip()] = int(concurrency)
+    return stage_concurrency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--organisations', type=int, default=1)
+    parser.add_argument('--repositories', type=int, default=50, help='per organisation')
+    parser.add_argument('--branches', type=int, default=2, help='per repository w/ branch.cfg')
+    parser.add_argument('--variants', type=int, default=3, help='jobs per pipeline')
+    parser.add_argument('--branch-cfg-ratio', type=float, default=0.5)
+    parser.add_argument('--runs', type=int, default=2)
+    parser.add_argument('--github-latency', type=float, default=0.0, help='seconds')
+    parser.add_argument('--concourse-latency', type=float, default=0.0, help='seconds')
+    parser.add_argument('--graphql', action='store_true', help='use GraphQL enumeration')
+    parser.add_argument('--render-processes', type=int, default=None)
+    parser.add_argument(
+        '--stage-concurrency',
+        type=_stage_concurrency,
+        default=None,
+        help='e.g. render=8,deploy=16',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write results to (default: stdout)')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        organisations=args.organisations,
+        repositories=args.repositories,
+        branches=args.branches,
+        variants=args.variants,
+        branch_cfg_ratio=args.branch_cfg_ratio,
+        runs=args.runs,
+        github_latency=args.github_latency,
+        concourse_latency=args.concourse_latency,
+        graphql_enumeration=args.graphql,
+        render_processes=args.render_processes,
+        stage_concurrency=args.stage_concurrency,
+        seed=args.seed,
+    )
+
+    result_text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(result_text)
+    else:
+        print(result_text)
+
+
+if __name__ == '__main__':
+    main()
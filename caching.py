@@ -0,0 +1,209 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import functools
+import threading
+import time
+
+'''
+Bounded (optionally expiring), thread-safe in-memory caches with hit-rate statistics.
+
+Intended as a replacement for `functools.lru_cache` in long-running processes (e.g. the
+webhook dispatcher), where unbounded caches grow without limit and cached clients or
+credentials are never renewed.
+'''
+
+CacheStats = collections.namedtuple(
+    'CacheStats',
+    ['hits', 'misses', 'evictions', 'expirations', 'size', 'max_size', 'ttl_seconds'],
+)
+
+_MISSING = object()
+_KWARGS_MARK = object()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class Cache(object):
+    '''
+    a thread-safe mapping that retains at most `max_size` entries (least recently used entries
+    are evicted first). If `ttl_seconds` is set, entries expire after the given amount of
+    seconds since they were stored.
+
+    @param max_size: maximum number of entries (`None` for no limit)
+    @param ttl_seconds: time after which entries expire (`None` for no expiry)
+    @param name: if given, the cache is registered under this name (see `stats`)
+    @param clock: returns the current time in seconds (for testing purposes)
+    '''
+    def __init__(
+        self,
+        max_size: int=128,
+        ttl_seconds: float=None,
+        name: str=None,
+        clock=time.monotonic,
+    ):
+        if max_size is not None and max_size < 1:
+            raise ValueError(f'max_size must be a positive integer: {max_size}')
+        if ttl_seconds is not None and ttl_seconds <= 0:
+            raise ValueError(f'ttl_seconds must be positive: {ttl_seconds}')
+
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = collections.OrderedDict() # key: (expiry, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+        if name:
+            with _caches_lock:
+                _caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._misses += 1
+                return default
+            expiry, value = entry
+            if expiry is not None and expiry <= self._clock():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.ttl_seconds is None:
+            expiry = None
+        else:
+            expiry = self._clock() + self.ttl_seconds
+
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            if self.max_size is None:
+                return
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key) -> bool:
+        '''
+        removes the entry for the given key. Returns whether there was such an entry.
+        '''
+        with self._lock:
+            return self._entries.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        '''
+        removes all entries (statistics are retained)
+        '''
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                size=len(self._entries),
+                max_size=self.max_size,
+                ttl_seconds=self.ttl_seconds,
+            )
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __repr__(self):
+        return f'Cache: {self.name} {self.stats()}'
+
+
+def _make_key(args, kwargs):
+    if not kwargs:
+        return args
+    return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+
+
+def cached(max_size: int=128, ttl_seconds: float=None, name: str=None):
+    '''
+    decorator memoising the results of the decorated function (similar to
+    `functools.lru_cache`) in a `Cache` (see there for the meaning of the parameters).
+    Arguments must be hashable. Caches are registered using the function's qualified name,
+    unless a name is given.
+
+    The decorated function is not called under a lock, so concurrent invocations with equal
+    arguments may each compute (and store) a result.
+
+    In addition to `cache_clear` and `cache_info` (as known from `functools.lru_cache`),
+    decorated functions offer `cache_invalidate(*args, **kwargs)`, removing the cached result
+    for the given arguments, and the underlying `cache`.
+    '''
+    def decorator(function):
+        cache = Cache(
+            max_size=max_size,
+            ttl_seconds=ttl_seconds,
+            name=name or f'{function.__module__}.{function.__qualname__}',
+        )
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            result = cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = function(*args, **kwargs)
+                cache.put(key, result)
+            return result
+
+        def cache_invalidate(*args, **kwargs):
+            return cache.invalidate(_make_key(args, kwargs))
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+        wrapper.cache_info = cache.stats
+        wrapper.cache_invalidate = cache_invalidate
+        return wrapper
+
+    return decorator
+
+
+def caches() -> dict:
+    '''
+    returns all registered caches as a dict {name: Cache}
+    '''
+    with _caches_lock:
+        return dict(_caches)
+
+
+def stats() -> dict:
+    '''
+    returns the statistics of all registered caches as a dict {name: CacheStats}
+    '''
+    return {name: cache.stats() for name, cache in caches().items()}
+
+
+def clear_all():
+    for cache in caches().values():
+        cache.clear()
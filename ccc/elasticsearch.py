@@ -17,9 +17,13 @@ import datetime
 import functools
 import os
 import json
+import queue
+import threading
+import time
 
 import elasticsearch
 
+import caching
 import model.elasticsearch
 import util
 
@@ -32,6 +36,8 @@ def from_cfg(
     )
 
 
+# share clients (and thus their connection pools) per cfg
+@caching.cached(max_size=8)
 def _from_cfg(
     elasticsearch_cfg:model.elasticsearch.ElasticSearchConfig
 ):
@@ -177,3 +183,134 @@ class ElasticSearchClient(object):
             *args,
             **kwargs,
         )
+
+
+class BulkDocumentShipper(object):
+    '''
+    stores documents into an Elasticsearch index asynchronously. Submitted documents are queued
+    (in memory) and sent in bulk from a background thread, whenever `batch_size` documents are
+    queued or after `flush_interval_seconds`, whatever happens first.
+
+    If the queue is full (e.g. because Elasticsearch is slow or unavailable), submitted documents
+    are dropped (and counted). Remaining documents are sent upon `close`.
+
+    @param client: the `ElasticSearchClient` to use
+    @param index: the index to store documents into
+    '''
+    def __init__(
+        self,
+        client: ElasticSearchClient,
+        index: str,
+        max_queue_size: int=10000,
+        batch_size: int=500,
+        flush_interval_seconds: float=5,
+    ):
+        self._client = client
+        self._index = util.not_empty(index)
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._batch_size = batch_size
+        self._flush_interval_seconds = flush_interval_seconds
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._shipped = 0
+        self._dropped = 0
+        self._failed = 0
+
+    def submit(self, document: dict) -> bool:
+        '''
+        queues the given document for being sent. Never blocks. Returns whether the document was
+        accepted (documents are dropped if the queue is full, or after `close` was called).
+        '''
+        if self._closed.is_set():
+            return self._drop()
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(document)
+            return True
+        except queue.Full:
+            return self._drop()
+
+    def _drop(self):
+        with self._lock:
+            self._dropped += 1
+        return False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f'elasticsearch-bulk-shipper-{self._index}',
+                daemon=True, # do not block interpreter shutdown (see `close`)
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._ship(batch)
+            elif self._closed.is_set():
+                return
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self._flush_interval_seconds
+        while len(batch) < self._batch_size:
+            timeout = deadline - time.monotonic()
+            if self._closed.is_set():
+                timeout = 0 # drain without waiting
+            elif timeout <= 0:
+                break
+            try:
+                document = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if document is _CLOSE:
+                continue
+            batch.append(document)
+        return batch
+
+    def _ship(self, batch):
+        try:
+            self._client.store_documents(index=self._index, body=batch)
+            shipped = len(batch)
+            failed = 0
+        except Exception as e:
+            util.info(f'failed to store {len(batch)} document(s) into {self._index}: {e}')
+            shipped = 0
+            failed = len(batch)
+        with self._lock:
+            self._shipped += shipped
+            self._failed += failed
+
+    def close(self, timeout_seconds: float=10):
+        '''
+        stops accepting documents and waits (up to the given timeout) until queued documents
+        were sent
+        '''
+        self._closed.set()
+        with self._lock:
+            thread = self._thread
+        if not thread:
+            return
+        try:
+            # wake up the shipper thread (if the queue is full, it will not wait anyway)
+            self._queue.put_nowait(_CLOSE)
+        except queue.Full:
+            pass
+        thread.join(timeout=timeout_seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'shipped': self._shipped,
+                'dropped': self._dropped,
+                'failed': self._failed,
+            }
+
+
+_CLOSE = object()
@@ -16,6 +16,7 @@
 # limitations under the License.
 
 import argparse
+import ast
 import functools
 import os
 import pkgutil
@@ -55,6 +56,10 @@ def main():
     sub-sub-command. Based on the function signature, optional arguments are added.
     This parser is then used to parse the given ARGV. Provided that parsing succeeds,
     the thus specified function is executed.
+
+    To keep startup fast, only the module of the invoked sub-command is imported (and
+    introspected). All other sub-commands are added based on a manifest of the cli modules'
+    functions, which is read from their sources without importing them.
     '''
 
     parser = argparse.ArgumentParser(formatter_class=FORMATTER_CLASS)
@@ -62,11 +67,13 @@ def main():
     sub_command_parsers = parser.add_subparsers()
     cli_module_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli')
     sys.path.insert(0, cli_module_dir)
-    for _, module_name, _ in pkgutil.iter_modules([cli_module_dir]):
-    # skip own module name
-        if module_name == os.path.splitext(os.path.basename(__file__))[0]:
-            continue
-        add_module(module_name, sub_command_parsers)
+    manifest = cli_module_manifest(cli_module_dir)
+    invoked_module_name = invoked_module(sys.argv[1:], module_names=manifest.keys())
+    for module_name, function_names in manifest.items():
+        if module_name == invoked_module_name:
+            add_module(module_name, sub_command_parsers)
+        else:
+            add_module_stub(module_name, function_names, sub_command_parsers)
     if len(sys.argv) == 1:
         parser.print_usage()
         print_import_errs()
@@ -87,6 +94,56 @@ def main():
     print_import_errs()
 
 
+def cli_module_manifest(cli_module_dir):
+    '''
+    returns a dict mapping the names of all cli modules to the names of their public functions
+    (i.e. their sub-commands). Modules are not imported, but their sources are parsed.
+    Modules defining a `main` function are omitted.
+    '''
+    manifest = {}
+    own_module_name = os.path.splitext(os.path.basename(__file__))[0]
+    for _, module_name, _ in pkgutil.iter_modules([cli_module_dir]):
+        # skip own module name
+        if module_name == own_module_name:
+            continue
+        with open(os.path.join(cli_module_dir, module_name + '.py')) as f:
+            module_ast = ast.parse(f.read())
+        function_names = [
+            node.name for node in module_ast.body
+            if isinstance(node, ast.FunctionDef)
+        ]
+        if 'main' in function_names:
+            continue
+        manifest[module_name] = sorted(
+            name for name in function_names if not name.startswith('_')
+        )
+    return manifest
+
+
+def invoked_module(argv, module_names):
+    '''
+    returns the name of the cli module invoked by the given arguments (or None)
+    '''
+    global_args_parser = argparse.ArgumentParser(add_help=False)
+    add_global_args(global_args_parser)
+    try:
+        _, remaining_args = global_args_parser.parse_known_args(argv)
+    except SystemExit:
+        return None # let the "real" parser report the error
+    if remaining_args and remaining_args[0] in module_names:
+        return remaining_args[0]
+    return None
+
+
+def add_module_stub(module_name, function_names, parser):
+    # the full parser is only created if the module is invoked (see add_module)
+    parser.add_parser(
+        module_name,
+        formatter_class=FORMATTER_CLASS,
+        help=', '.join(function_names),
+    )
+
+
 def add_global_args(parser):
     parser.add_argument('--quiet', action='store_true')
     parser.add_argument('--verbose', action='store_true')
@@ -30,6 +30,7 @@ from concourse.util import sync_org_webhooks
 from concourse.enumerator import (
     DefinitionDescriptorPreprocessor,
     GithubOrganisationDefinitionEnumerator,
+    GithubOrganisationGraphQLDefinitionEnumerator,
     SimpleFileDefinitionEnumerator,
     TemplateRetriever,
 )
@@ -131,6 +132,7 @@ def render_pipelines(
         config_name: str,
         out_dir: str,
         template_include_dir: str = None,
+        graphql_enumeration: bool = False,
 ):
     if not os.path.isdir(out_dir):
         os.makedirs(out_dir)
@@ -144,10 +146,15 @@ def render_pipelines(
     if not template_include_dir:
         template_include_dir = template_path
 
+    if graphql_enumeration:
+        enumerator_type = GithubOrganisationGraphQLDefinitionEnumerator
+    else:
+        enumerator_type = GithubOrganisationDefinitionEnumerator
+
     def_enumerators = []
     for job_mapping in job_mapping_set.job_mappings().values():
         def_enumerators.append(
-            GithubOrganisationDefinitionEnumerator(
+            enumerator_type(
                 job_mapping=job_mapping,
                 cfg_set=config_set
             )
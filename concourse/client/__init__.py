@@ -18,7 +18,7 @@ import warnings
 from ensure import ensure_annotations
 from urllib3.exceptions import InsecureRequestWarning
 
-import functools
+import caching
 
 from .api import (
     ConcourseApiV4,
@@ -60,7 +60,8 @@ AUTH_TOKEN_REQUEST_USER = 'fly'
 AUTH_TOKEN_REQUEST_PWD = 'Zmx5'
 
 
-@functools.lru_cache()
+# renew API objects (and thus auth tokens) after some time
+@caching.cached(max_size=32, ttl_seconds=3600)
 @ensure_annotations
 def from_cfg(concourse_cfg: ConcourseConfig, team_name: str, verify_ssl=False):
     '''
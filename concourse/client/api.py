@@ -13,10 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import itertools
 import json
 import warnings
 
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from ensure import ensure_annotations
 from urllib3.exceptions import InsecureRequestWarning
 
@@ -35,8 +38,8 @@ from .model import (
 from model.concourse import (
     ConcourseTeamCredentials,
 )
-from http_requests import AuthenticatedRequestBuilder
-from util import not_empty
+from http_requests import AuthenticatedRequestBuilder, ensure_pool_maxsize
+from util import load_yaml, not_empty, warning
 
 warnings.filterwarnings('ignore', 'Unverified HTTPS request is being made.*', InsecureRequestWarning)
 
@@ -45,6 +48,55 @@ def select_attr(name: str):
     return lambda o: o.get(name)
 
 
+# pipeline config attributes whose values are passed through by concourse without modification
+_VERBATIM_CFG_ATTRS = {'source', 'params', 'vars'}
+
+
+def _normalise_pipeline_cfg(cfg):
+    '''
+    returns a copy of the given pipeline config with all "empty" values (None, False, 0, empty
+    strings and collections) removed, except for values contained in resource-specific
+    (verbatim) attributes. This mimics the way concourse omits empty attributes when returning
+    pipeline configurations, thus allowing to compare a rendered pipeline definition against
+    the deployed one.
+    '''
+    if isinstance(cfg, dict):
+        normalised = {}
+        for key, value in cfg.items():
+            if key not in _VERBATIM_CFG_ATTRS:
+                value = _normalise_pipeline_cfg(value)
+            if value or value is True:
+                normalised[key] = value
+        return normalised
+    if isinstance(cfg, list):
+        return [_normalise_pipeline_cfg(e) for e in cfg]
+    return cfg
+
+
+def _concurrent_map(function, items, max_workers: int):
+    '''
+    invokes the given function for each of the given items concurrently (using at most
+    `max_workers` threads) and yields `(item, future)` tuples in the order of the given items.
+
+    Only a bounded number of invocations is submitted ahead of the consumer; remaining ones are
+    cancelled if the consumer stops early.
+    '''
+    items = iter(items)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in itertools.islice(items, 2 * max_workers):
+                pending.append((item, executor.submit(function, item)))
+            while pending:
+                item, future = pending.popleft()
+                for next_item in itertools.islice(items, 1):
+                    pending.append((next_item, executor.submit(function, next_item)))
+                yield item, future
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
 class ConcourseApiBase(object):
     '''
     Implements a subset of concourse REST API functionality.
@@ -88,8 +140,21 @@ class ConcourseApiBase(object):
         raise NotImplementedError
 
     @ensure_annotations
-    def set_pipeline(self, name: str, pipeline_definition):
-        previous_version = self.pipeline_config_version(name)
+    def set_pipeline(self, name: str, pipeline_definition, skip_unchanged: bool=False):
+        '''
+        deploys the given pipeline definition.
+
+        @param skip_unchanged: if set, the currently deployed pipeline configuration is compared
+            against the given definition. If they are equivalent, no update is done and
+            `SetPipelineResult.UNCHANGED` is returned.
+        '''
+        if skip_unchanged:
+            previous_cfg, previous_version = self.pipeline_config_and_version(name)
+            if previous_cfg is not None and _normalise_pipeline_cfg(previous_cfg) == \
+                    _normalise_pipeline_cfg(load_yaml(str(pipeline_definition))):
+                return SetPipelineResult.UNCHANGED
+        else:
+            previous_version = self.pipeline_config_version(name)
         headers = {'x-concourse-config-version': previous_version}
 
         url = self.routes.pipeline_cfg(name)
@@ -117,13 +182,48 @@ class ConcourseApiBase(object):
         not_empty(response)
         return PipelineConfig(response, concourse_api=self, name=pipeline_name)
 
-    def pipeline_resources(self, pipeline_names):
+    def pipeline_resources(
+        self,
+        pipeline_names,
+        resource_types=None,
+        max_workers: int=8,
+        isolate_errors: bool=False,
+    ):
+        '''
+        yields the resources of the given pipeline(s), in the order of the given pipeline names.
+        Pipeline configs are retrieved concurrently.
+
+        @param resource_types: if given, only resources of the given type(s) are yielded (other
+            resources are filtered before model objects are created)
+        @param max_workers: max number of pipeline configs to retrieve concurrently
+        @param isolate_errors: if set, pipelines whose config cannot be retrieved are skipped
+            (a warning is logged for each of them); otherwise (default), the error is raised
+        '''
         if isinstance(pipeline_names, str):
             pipeline_names = [pipeline_names]
-
-        resources = map(lambda name: self.pipeline_cfg(pipeline_name=name).resources, pipeline_names)
-        for resource_list in resources:
-            yield from resource_list
+        if isinstance(resource_types, str):
+            resource_types = [resource_types]
+
+        def retrieve_resources(pipeline_name):
+            pipeline_cfg = self.pipeline_cfg(pipeline_name=pipeline_name)
+            if resource_types is None:
+                return list(pipeline_cfg.resources)
+            return list(pipeline_cfg.resources_of_types(resource_types))
+
+        ensure_pool_maxsize(max_workers)
+        for pipeline_name, future in _concurrent_map(
+            retrieve_resources,
+            pipeline_names,
+            max_workers=max_workers,
+        ):
+            try:
+                resources = future.result()
+            except Exception as e:
+                if not isolate_errors:
+                    raise
+                warning(f'failed to retrieve config of pipeline {pipeline_name}: {e!r}')
+                continue
+            yield from resources
 
     @ensure_annotations
     def pipeline_config_version(self, pipeline_name: str):
@@ -141,6 +241,28 @@ class ConcourseApiBase(object):
 
         return response.headers['X-Concourse-Config-Version']
 
+    @ensure_annotations
+    def pipeline_config_and_version(self, pipeline_name: str):
+        '''
+        returns a tuple of the (raw) pipeline config dict and the config version, or
+        `(None, None)` if the pipeline does not exist
+        '''
+        pipeline_cfg_url = self.routes.pipeline_cfg(pipeline_name)
+        response = self.request_builder.get(
+                pipeline_cfg_url,
+                return_type=None,
+                check_http_code=False
+        )
+        if response.status_code == 404:
+            return (None, None) # pipeline did not exist yet
+
+        self.request_builder._check_http_code(response, pipeline_cfg_url)
+
+        return (
+            response.json().get('config'),
+            response.headers['X-Concourse-Config-Version'],
+        )
+
     @ensure_annotations
     def unpause_pipeline(self, pipeline_name: str):
         unpause_url = self.routes.unpause_pipeline(pipeline_name)
@@ -27,6 +27,7 @@ from util import warning
 class SetPipelineResult(Enum):
     UPDATED = 0
     CREATED = 1
+    UNCHANGED = 2
 
 
 class ModelBase(object):
@@ -78,7 +79,11 @@ class PipelineConfig(object):
         self.resources = map(lambda r: Resource(r, self), resources)
 
     def resources_of_types(self, types):
-        return filter(lambda r: r.type in types, self.resources)
+        # filter raw resources (creating model objects only for matching ones)
+        return (
+            Resource(r, self) for r in self.raw['resources']
+            if r['type'] in types
+        )
 
 
 class Resource(object):
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import os
 import re
 
@@ -20,11 +21,13 @@ from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from urllib.parse import urlparse
 import functools
-import yaml
 
 from github3.exceptions import NotFoundError
 
+import caching
+import http_requests
 from util import (
+    load_yaml,
     parse_yaml_file,
     info,
     fail,
@@ -33,7 +36,11 @@ from util import (
     not_empty,
     not_none,
 )
-from github.util import _create_github_api_object, github_cfg_for_hostname
+from github.util import (
+    _create_github_api_object,
+    github_cfg_for_hostname,
+    graphql_query,
+)
 from model.base import ModelBase, NamedModelElement
 from concourse.factory import RawPipelineDefinitionDescriptor
 
@@ -72,6 +79,7 @@ class DefinitionEnumerator(object):
         branch,
         raw_definitions,
         override_definitions={},
+        source_digests=None,
     ) -> 'DefinitionDescriptor':
         for name, definition in raw_definitions.items():
             pipeline_definition = deepcopy(definition)
@@ -82,6 +90,7 @@ class DefinitionEnumerator(object):
                 concourse_target_cfg=self.cfg_set.concourse(),
                 concourse_target_team=self.job_mapping.team_name(),
                 override_definitions=[override_definitions.get(name,{}),],
+                source_digests=source_digests,
             )
 
 
@@ -126,9 +135,19 @@ class SimpleFileDefinitionEnumerator(DefinitionEnumerator):
 
 
 class BranchCfg(ModelBase):
+    def __init__(self, raw_dict, blob_sha: str=None):
+        self._blob_sha = blob_sha
+        super().__init__(raw_dict=raw_dict)
+
     def _required_attributes(self):
         return {'cfgs'}
 
+    def blob_sha(self):
+        '''
+        the git blob SHA of the branch.cfg file this instance was read from (if known)
+        '''
+        return self._blob_sha
+
     def cfg_entries(self):
         return (
             BranchCfgEntry(name=name, raw_dict=raw_dict)
@@ -154,7 +173,11 @@ class BranchCfg(ModelBase):
         indexed_entries = [entry_with_idx(idx, entry) for idx, entry in enumerate(matching_entries)]
 
         for _, entry in sorted(indexed_entries, key=lambda i: i[0]):
-            effective_branch_cfg = merge_dicts(effective_branch_cfg, entry.raw)
+            effective_branch_cfg = merge_dicts(
+                effective_branch_cfg,
+                entry.raw,
+                share_unmodified=True,
+            )
 
         return BranchCfgEntry(name='merged', raw_dict=effective_branch_cfg)
 
@@ -188,11 +211,17 @@ class GithubDefinitionEnumeratorBase(DefinitionEnumerator):
         repository,
     ):
         try:
-            branch_cfg = repository.file_contents(
+            branch_cfg_contents = repository.file_contents(
                 path='branch.cfg',
                 ref='refs/meta/ci',
-            ).decoded.decode('utf-8')
-            return BranchCfg(raw_dict=yaml.load(branch_cfg))
+            )
+            return BranchCfg(
+                raw_dict=load_yaml(
+                    branch_cfg_contents.decoded.decode('utf-8'),
+                    digest=branch_cfg_contents.sha,
+                ),
+                blob_sha=branch_cfg_contents.sha,
+            )
         except NotFoundError:
             return None # no branch cfg present
 
@@ -207,13 +236,13 @@ class GithubDefinitionEnumeratorBase(DefinitionEnumerator):
                 default_branch = repository.default_branch
             except Exception:
                 default_branch = 'master'
-            yield (default_branch, None)
+            yield (default_branch, None, None)
             return
 
         for branch in repository.branches():
             cfg_entry = branch_cfg.cfg_entry_for_branch(branch.name)
             if cfg_entry:
-                yield (branch.name, cfg_entry)
+                yield (branch.name, cfg_entry, branch_cfg)
 
     def _scan_repository_for_definitions(
         self,
@@ -221,7 +250,9 @@ class GithubDefinitionEnumeratorBase(DefinitionEnumerator):
         github_cfg,
         org_name,
     ) -> RawPipelineDefinitionDescriptor:
-        for branch_name, cfg_entry in self._determine_repository_branches(repository=repository):
+        for branch_name, cfg_entry, branch_cfg in self._determine_repository_branches(
+            repository=repository,
+        ):
             try:
                 definitions = repository.file_contents(
                     path='.ci/pipeline_definitions',
@@ -230,35 +261,64 @@ class GithubDefinitionEnumeratorBase(DefinitionEnumerator):
             except NotFoundError:
                 continue # no pipeline definition for this branch
 
-            repo_hostname = urlparse(github_cfg.http_url()).hostname
-            override_definitions = cfg_entry.override_definitions() if cfg_entry else {}
-
-            verbose('from repo: ' + repository.name + ':' + branch_name)
-            try:
-                definitions = yaml.load(definitions.decoded.decode('utf-8'))
-            except BaseException as e:
-                repo_path = f'{org_name}/{repository.name}'
-                yield DefinitionDescriptor(
-                    pipeline_name='<invalid YAML>',
-                    pipeline_definition={},
-                    main_repo={'path': repo_path, 'branch': branch_name, 'hostname': repo_hostname},
-                    concourse_target_cfg=self.cfg_set.concourse(),
-                    concourse_target_team=self.job_mapping.team_name(),
-                    override_definitions=(),
-                    exception=e,
-                )
+            descriptors = list(self._create_definition_descriptors(
+                org_name=org_name,
+                repo_name=repository.name,
+                repo_hostname=urlparse(github_cfg.http_url()).hostname,
+                branch_name=branch_name,
+                cfg_entry=cfg_entry,
+                branch_cfg=branch_cfg,
+                definitions_text=definitions.decoded.decode('utf-8'),
+                definitions_blob_sha=definitions.sha,
+            ))
+            yield from descriptors
+
+            if any(descriptor.exception for descriptor in descriptors):
                 return # nothing else to yield in case parsing failed
 
-            # handle inheritance
-            definitions = merge_dicts(definitions, override_definitions)
+    def _create_definition_descriptors(
+        self,
+        org_name: str,
+        repo_name: str,
+        repo_hostname: str,
+        branch_name: str,
+        cfg_entry,
+        branch_cfg,
+        definitions_text: str,
+        definitions_blob_sha: str,
+    ):
+        override_definitions = cfg_entry.override_definitions() if cfg_entry else {}
+        repo_path = f'{org_name}/{repo_name}'
 
-            yield from self._wrap_into_descriptors(
-                repo_path='/'.join([org_name, repository.name]),
-                repo_hostname=repo_hostname,
-                branch=branch_name,
-                raw_definitions=definitions,
-                override_definitions=override_definitions,
+        verbose('from repo: ' + repo_name + ':' + branch_name)
+        try:
+            definitions = load_yaml(definitions_text, digest=definitions_blob_sha)
+        except BaseException as e:
+            yield DefinitionDescriptor(
+                pipeline_name='<invalid YAML>',
+                pipeline_definition={},
+                main_repo={'path': repo_path, 'branch': branch_name, 'hostname': repo_hostname},
+                concourse_target_cfg=self.cfg_set.concourse(),
+                concourse_target_team=self.job_mapping.team_name(),
+                override_definitions=(),
+                exception=e,
             )
+            return # nothing else to yield in case parsing failed
+
+        # handle inheritance (definitions are copied when wrapped into descriptors)
+        definitions = merge_dicts(definitions, override_definitions, share_unmodified=True)
+
+        yield from self._wrap_into_descriptors(
+            repo_path=repo_path,
+            repo_hostname=repo_hostname,
+            branch=branch_name,
+            raw_definitions=definitions,
+            override_definitions=override_definitions,
+            source_digests={
+                'pipeline_definitions': definitions_blob_sha,
+                'branch_cfg': branch_cfg.blob_sha() if branch_cfg else None,
+            },
+        )
 
 
 class GithubRepositoryDefinitionEnumerator(GithubDefinitionEnumeratorBase):
@@ -294,33 +354,256 @@ class GithubRepositoryDefinitionEnumerator(GithubDefinitionEnumeratorBase):
 
 
 class GithubOrganisationDefinitionEnumerator(GithubDefinitionEnumeratorBase):
-    def __init__(self, job_mapping, cfg_set):
+    def __init__(self, job_mapping, cfg_set, scan_concurrency: int=8):
+        '''
+        @param scan_concurrency: max number of repositories to scan concurrently
+        '''
         self.job_mapping = not_none(job_mapping)
         self.cfg_set = not_none(cfg_set)
+        self.scan_concurrency = scan_concurrency
 
     def enumerate_definition_descriptors(self):
-        executor = ThreadPoolExecutor(max_workers=8)
+        http_requests.ensure_pool_maxsize(self.scan_concurrency)
+
+        with ThreadPoolExecutor(max_workers=self.scan_concurrency) as executor:
+            # scan github repositories
+            for github_org_cfg in self.job_mapping.github_organisations():
+                github_cfg = self.cfg_set.github(github_org_cfg.github_cfg_name())
+                github_org_name = github_org_cfg.org_name()
+                info('scanning github organisation {gho}'.format(gho=github_org_name))
+
+                github_api = _create_github_api_object(github_cfg)
+                github_org = github_api.organization(github_org_name)
+
+                scan_repository_for_definitions = functools.partial(
+                    self._scan_repository_for_definitions,
+                    github_cfg=github_cfg,
+                    org_name=github_org_name,
+                )
 
-        # scan github repositories
+                for definition_descriptors in executor.map(
+                    scan_repository_for_definitions,
+                    github_org.repositories(),
+                ):
+                    yield from definition_descriptors
+
+
+class GithubOrganisationGraphQLDefinitionEnumerator(GithubDefinitionEnumeratorBase):
+    '''
+    Functionally equivalent to `GithubOrganisationDefinitionEnumerator`. However, repositories,
+    branch configurations, branches and pipeline definitions are retrieved using batched
+    GitHub GraphQL queries, rather than issuing several REST requests per repository.
+    '''
+    REPOSITORIES_PAGE_SIZE = 50
+    BRANCHES_PAGE_SIZE = 100
+    DEFINITIONS_BATCH_SIZE = 50
+
+    BLOB_FIELDS = '... on Blob { oid text isTruncated }'
+
+    REPOSITORIES_QUERY = '''
+    query($org: String!, $pageSize: Int!, $branchesPageSize: Int!, $cursor: String) {
+      organization(login: $org) {
+        repositories(first: $pageSize, after: $cursor) {
+          pageInfo { hasNextPage endCursor }
+          nodes {
+            name
+            defaultBranchRef { name }
+            branchCfg: object(expression: "refs/meta/ci:branch.cfg") { %(blob)s }
+            defaultDefinitions: object(expression: "HEAD:.ci/pipeline_definitions") {
+              %(blob)s
+            }
+            refs(refPrefix: "refs/heads/", first: $branchesPageSize) {
+              pageInfo { hasNextPage endCursor }
+              nodes { name }
+            }
+          }
+        }
+      }
+    }
+    ''' % {'blob': BLOB_FIELDS}
+
+    BRANCHES_QUERY = '''
+    query($org: String!, $repo: String!, $pageSize: Int!, $cursor: String) {
+      repository(owner: $org, name: $repo) {
+        refs(refPrefix: "refs/heads/", first: $pageSize, after: $cursor) {
+          pageInfo { hasNextPage endCursor }
+          nodes { name }
+        }
+      }
+    }
+    '''
+
+    def __init__(self, job_mapping, cfg_set):
+        self.job_mapping = not_none(job_mapping)
+        self.cfg_set = not_none(cfg_set)
+
+    def enumerate_definition_descriptors(self):
         for github_org_cfg in self.job_mapping.github_organisations():
             github_cfg = self.cfg_set.github(github_org_cfg.github_cfg_name())
             github_org_name = github_org_cfg.org_name()
             info('scanning github organisation {gho}'.format(gho=github_org_name))
 
             github_api = _create_github_api_object(github_cfg)
-            github_org = github_api.organization(github_org_name)
-
-            scan_repository_for_definitions = functools.partial(
-                self._scan_repository_for_definitions,
+            query = functools.partial(
+                graphql_query,
+                github_api=github_api,
                 github_cfg=github_cfg,
-                org_name=github_org_name,
             )
+            repo_hostname = urlparse(github_cfg.http_url()).hostname
+
+            for repositories in self._repository_pages(query=query, org_name=github_org_name):
+                # (repo_name, branch_name, cfg_entry, branch_cfg, definitions_blob)
+                branch_definitions = []
+                # definitions of branches not yet retrieved
+                pending_branches = []
+
+                for repository in repositories:
+                    branch_cfg = self._branch_cfg_from_blob(
+                        org_name=github_org_name,
+                        repo_name=repository['name'],
+                        blob=repository['branchCfg'],
+                        github_api=github_api,
+                    )
+                    if not branch_cfg:
+                        # fallback for components w/o branch_cfg: use default branch
+                        default_branch = repository['defaultBranchRef'] or {}
+                        branch_definitions.append((
+                            repository['name'],
+                            default_branch.get('name', 'master'),
+                            None,
+                            None,
+                            repository['defaultDefinitions'],
+                        ))
+                        continue
+
+                    for branch_name in self._branch_names(
+                        query=query,
+                        org_name=github_org_name,
+                        repository=repository,
+                    ):
+                        cfg_entry = branch_cfg.cfg_entry_for_branch(branch_name)
+                        if cfg_entry:
+                            pending_branches.append(
+                                (repository['name'], branch_name, cfg_entry, branch_cfg)
+                            )
+
+                branch_definitions.extend(self._retrieve_definitions(
+                    query=query,
+                    org_name=github_org_name,
+                    branches=pending_branches,
+                ))
+
+                # like GithubOrganisationDefinitionEnumerator, stop scanning a repository's
+                # branches once parsing failed
+                failed_repositories = set()
+
+                for repo_name, branch_name, cfg_entry, branch_cfg, blob in branch_definitions:
+                    if not blob:
+                        continue # no pipeline definition for this branch
+                    if repo_name in failed_repositories:
+                        continue
+                    descriptors = list(self._create_definition_descriptors(
+                        org_name=github_org_name,
+                        repo_name=repo_name,
+                        repo_hostname=repo_hostname,
+                        branch_name=branch_name,
+                        cfg_entry=cfg_entry,
+                        branch_cfg=branch_cfg,
+                        definitions_text=self._blob_text(
+                            github_api=github_api,
+                            org_name=github_org_name,
+                            repo_name=repo_name,
+                            path='.ci/pipeline_definitions',
+                            ref=branch_name,
+                            blob=blob,
+                        ),
+                        definitions_blob_sha=blob['oid'],
+                    ))
+                    yield from descriptors
+
+                    if any(descriptor.exception for descriptor in descriptors):
+                        failed_repositories.add(repo_name)
+
+    def _repository_pages(self, query, org_name):
+        cursor = None
+        while True:
+            result = query(
+                query=self.REPOSITORIES_QUERY,
+                variables={
+                    'org': org_name,
+                    'pageSize': self.REPOSITORIES_PAGE_SIZE,
+                    'branchesPageSize': self.BRANCHES_PAGE_SIZE,
+                    'cursor': cursor,
+                },
+            )
+            repositories = result['organization']['repositories']
+            yield repositories['nodes']
+
+            if not repositories['pageInfo']['hasNextPage']:
+                return
+            cursor = repositories['pageInfo']['endCursor']
+
+    def _branch_names(self, query, org_name, repository):
+        refs = repository['refs']
+        while True:
+            yield from (ref['name'] for ref in refs['nodes'])
+
+            if not refs['pageInfo']['hasNextPage']:
+                return
+            refs = query(
+                query=self.BRANCHES_QUERY,
+                variables={
+                    'org': org_name,
+                    'repo': repository['name'],
+                    'pageSize': self.BRANCHES_PAGE_SIZE,
+                    'cursor': refs['pageInfo']['endCursor'],
+                },
+            )['repository']['refs']
+
+    def _retrieve_definitions(self, query, org_name, branches):
+        for idx in range(0, len(branches), self.DEFINITIONS_BATCH_SIZE):
+            batch = branches[idx:idx + self.DEFINITIONS_BATCH_SIZE]
+
+            # use one aliased repository field per branch
+            fields = [
+                f'b{batch_idx}: repository(owner: $org, name: {json.dumps(repo_name)}) {{'
+                f' object(expression: {json.dumps(branch_name + ":.ci/pipeline_definitions")})'
+                f' {{ {self.BLOB_FIELDS} }} }}'
+                for batch_idx, (repo_name, branch_name, _, _) in enumerate(batch)
+            ]
+            result = query(
+                query='query($org: String!) {\n' + '\n'.join(fields) + '\n}',
+                variables={'org': org_name},
+            )
+
+            for batch_idx, (repo_name, branch_name, cfg_entry, branch_cfg) in enumerate(batch):
+                blob = result[f'b{batch_idx}']['object']
+                yield (repo_name, branch_name, cfg_entry, branch_cfg, blob)
+
+    def _branch_cfg_from_blob(self, org_name, repo_name, blob, github_api):
+        if not blob:
+            return None # no branch cfg present
+
+        branch_cfg = self._blob_text(
+            github_api=github_api,
+            org_name=org_name,
+            repo_name=repo_name,
+            path='branch.cfg',
+            ref='refs/meta/ci',
+            blob=blob,
+        )
+        return BranchCfg(
+            raw_dict=load_yaml(branch_cfg, digest=blob['oid']),
+            blob_sha=blob['oid'],
+        )
+
+    def _blob_text(self, github_api, org_name, repo_name, path, ref, blob):
+        if blob['text'] is not None and not blob['isTruncated']:
+            return blob['text']
 
-            for definition_descriptors in executor.map(
-                scan_repository_for_definitions,
-                github_org.repositories(),
-            ):
-                yield from definition_descriptors
+        # GraphQL API does not return contents of large files - fallback to REST API
+        repository = github_api.repository(org_name, repo_name)
+        return repository.file_contents(path=path, ref=ref).decoded.decode('utf-8')
 
 
 class DefinitionDescriptor(object):
@@ -337,7 +620,12 @@ class DefinitionDescriptor(object):
         concourse_target_team,
         override_definitions=[{},],
         exception=None,
+        source_digests=None,
     ):
+        '''
+        @param source_digests: optional dict of digests (e.g. git blob SHAs) identifying the
+            sources this definition was read from. Used to detect unchanged definitions.
+        '''
         self.pipeline_name = not_empty(pipeline_name)
         self.pipeline_definition = not_none(pipeline_definition)
         self.main_repo = not_none(main_repo)
@@ -345,6 +633,7 @@ class DefinitionDescriptor(object):
         self.concourse_target_team = not_none(concourse_target_team)
         self.override_definitions = not_none(override_definitions)
         self.exception = exception
+        self.source_digests = source_digests
 
     def template_name(self):
         return self.pipeline_definition.get('template', 'default')
@@ -373,7 +662,7 @@ class TemplateRetriever(object):
         else:
             self.template_path = template_path
 
-    @functools.lru_cache()
+    @caching.cached(max_size=256)
     def template_file(self, template_name):
         # TODO: do not hard-code file name extension
         template_file_name = template_name + '.yaml'
@@ -388,7 +677,7 @@ class TemplateRetriever(object):
             )
         )
 
-    @functools.lru_cache()
+    @caching.cached(max_size=256)
     def template_contents(self, template_name):
         with open(self.template_file(template_name=template_name)) as f:
             return f.read()
@@ -113,17 +113,30 @@ class DefinitionFactory(object):
         return pipeline_definition
 
     def _create_variants_dict(self, raw_definition_descriptor):
+        '''
+        returns a dict mapping variant names to the variants' raw dicts (i.e. the base definition
+        with the variant-specific arguments merged into it).
+
+        To save time and memory, the variant dicts are not deep copies. Instead, they share all
+        values not changed by a variant with the base definition (and thus with other variants).
+        Shared values must be treated as read-only: values must be copied before they are
+        modified (model elements copy their raw dicts when applying defaults).
+        '''
         variants_dict = normalise_to_dict(deepcopy(raw_definition_descriptor.variants))
 
-        base_dict = deepcopy(raw_definition_descriptor.base_definition)
+        base_dict = raw_definition_descriptor.base_definition
 
         merged_variants = {}
         for variant_name, variant_args in variants_dict.items():
             # optimisation: if there are no variant-specific arguments, we do not need to merge
             if variant_args:
-                merged_variants[variant_name] =  merge_dicts(base_dict, variant_args)
+                merged_variants[variant_name] = merge_dicts(
+                    base_dict,
+                    variant_args,
+                    share_unmodified=True,
+                )
             else:
-                merged_variants[variant_name] = deepcopy(base_dict)
+                merged_variants[variant_name] = dict(base_dict)
 
         return merged_variants
 
@@ -176,15 +189,13 @@ class DefinitionFactory(object):
             transformer.process_pipeline_args(pipeline_def)
 
     def _create_traits(self, raw_dict, variant_name):
-        if 'traits' not in raw_dict:
-            raw_dict['traits'] = {}
-
-        if 'options' not in raw_dict['traits']:
-            raw_dict['traits']['options'] = {}
-        if 'notifications' not in raw_dict['traits']:
-            raw_dict['traits']['notifications'] = {}
+        # copy (traits may be shared with other variants)
+        traits = dict(raw_dict.get('traits', {}))
+        traits.setdefault('options', {})
+        traits.setdefault('notifications', {})
+        raw_dict['traits'] = traits
 
-        traits_args = normalise_to_dict(raw_dict['traits'])
+        traits_args = normalise_to_dict(traits)
         traits_dict = {
                 name: TraitsFactory.create(
                     name=name,
@@ -202,9 +213,12 @@ class DefinitionFactory(object):
         elif not raw_dict['steps']:
             return {}
 
-        for stepname, step in raw_dict['steps'].items():
-            if step is None:
-                raw_dict['steps'][stepname] = {}
+        if None in raw_dict['steps'].values():
+            # copy (steps may be shared with other variants)
+            raw_dict['steps'] = {
+                stepname: {} if step is None else step
+                for stepname, step in raw_dict['steps'].items()
+            }
 
         steps_dict = {
             n: self._create_build_step(name=n, step_dict=sd) for n,sd in raw_dict['steps'].items()
@@ -0,0 +1,327 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+import http_requests
+from util import not_empty
+
+
+def _percentile(sorted_values, percentile):
+    # nearest-rank method
+    if not sorted_values:
+        return 0.0
+    idx = max(math.ceil(percentile / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[idx]
+
+
+class _Timing(object):
+    def __init__(self):
+        self.durations = []
+        self.first_start = None
+        self.last_end = None
+
+    def add(self, start, end):
+        self.durations.append(end - start)
+        if self.first_start is None or start < self.first_start:
+            self.first_start = start
+        if self.last_end is None or end > self.last_end:
+            self.last_end = end
+
+    def as_dict(self):
+        durations = sorted(self.durations)
+        return {
+            'count': len(durations),
+            # accumulated over all workers
+            'total_seconds': sum(durations),
+            # from the first start until the last end
+            'wall_seconds': (self.last_end - self.first_start) if durations else 0.0,
+            'p50_seconds': _percentile(durations, 50),
+            'p90_seconds': _percentile(durations, 90),
+            'p99_seconds': _percentile(durations, 99),
+        }
+
+
+class _QueueDepth(object):
+    def __init__(self):
+        self.samples = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, depth):
+        self.samples += 1
+        self.total += depth
+        self.max = max(self.max, depth)
+
+    def as_dict(self):
+        return {
+            'max': self.max,
+            'mean': self.total / self.samples if self.samples else 0.0,
+        }
+
+
+class ReplicationMetrics(object):
+    '''
+    Collects timings and throughput figures of a pipeline replication: the time spent per
+    replication stage, render and deploy latencies per pipeline, depths of the queues between
+    replication stages, and the number of HTTP requests issued per service (e.g. GitHub and
+    Concourse).
+
+    Instances may safely be shared between threads.
+    '''
+    PROMETHEUS_PREFIX = 'cc_replication'
+
+    def __init__(self, service_hostnames: dict=None):
+        '''
+        @param service_hostnames: optional mapping from service name (e.g. 'github') to the
+            hostnames of that service. HTTP requests to other hosts are reported as 'other'.
+        '''
+        self._service_hostnames = {
+            service: {hostname.lower() for hostname in hostnames}
+            for service, hostnames in (service_hostnames or {}).items()
+        }
+        self._lock = threading.Lock()
+        self._stage_timings = {}
+        self._pipeline_latencies = {}
+        self._queue_depths = {}
+        self._start_time = None
+        self._end_time = None
+        self._initial_request_counts = None
+        self._request_counts = None
+
+    def start(self):
+        self._initial_request_counts = http_requests.request_counts()
+        self._start_time = time.time()
+
+    def stop(self):
+        self._end_time = time.time()
+        request_counts = http_requests.request_counts()
+        self._request_counts = {
+            hostname: count - self._initial_request_counts.get(hostname, 0)
+            for hostname, count in request_counts.items()
+            if count > self._initial_request_counts.get(hostname, 0)
+        }
+
+    def record_stage_timing(self, stage: str, start: float, end: float):
+        with self._lock:
+            self._stage_timings.setdefault(stage, _Timing()).add(start, end)
+
+    @contextlib.contextmanager
+    def stage_timer(self, stage: str):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record_stage_timing(stage, start, time.time())
+
+    def timed_stage(self, stage: str, function):
+        '''
+        returns a wrapper of the given function recording each invocation as a `stage` timing
+        '''
+        def timed(*args, **kwargs):
+            with self.stage_timer(stage):
+                return function(*args, **kwargs)
+        return timed
+
+    def timed_iterable(self, stage: str, iterable):
+        '''
+        returns a generator yielding the elements of the given iterable, recording the time spent
+        to retrieve them as a `stage` timing
+        '''
+        iterator = iter(iterable)
+        while True:
+            with self.stage_timer(stage):
+                element = next(iterator, StopIteration)
+            if element is StopIteration:
+                return
+            yield element
+
+    def record_pipeline_latency(self, stage: str, pipeline_name: str, seconds: float):
+        with self._lock:
+            self._pipeline_latencies.setdefault(stage, {})[pipeline_name] = seconds
+
+    def record_queue_depths(self, queue_depths: dict):
+        '''
+        @param queue_depths: mapping from queue name to current queue depth
+        '''
+        with self._lock:
+            for name, depth in queue_depths.items():
+                self._queue_depths.setdefault(name, _QueueDepth()).add(depth)
+
+    def _service(self, hostname: str):
+        for service, hostnames in self._service_hostnames.items():
+            if hostname and hostname.lower() in hostnames:
+                return service
+        return 'other'
+
+    def summary(self):
+        '''
+        returns a (JSON-serialisable) dict containing all collected metrics
+        '''
+        with self._lock:
+            request_counts = self._request_counts or {}
+            service_request_counts = {}
+            for hostname, count in request_counts.items():
+                service = self._service(hostname)
+                service_request_counts[service] = service_request_counts.get(service, 0) + count
+
+            pipeline_latencies = {}
+            for stage, latencies in self._pipeline_latencies.items():
+                values = sorted(latencies.values())
+                pipeline_latencies[stage] = {
+                    'count': len(values),
+                    'total_seconds': sum(values),
+                    'max_seconds': values[-1] if values else 0.0,
+                    'p50_seconds': _percentile(values, 50),
+                    'p90_seconds': _percentile(values, 90),
+                    'p99_seconds': _percentile(values, 99),
+                    'pipelines': dict(latencies),
+                }
+
+            if self._start_time is not None and self._end_time is not None:
+                duration = self._end_time - self._start_time
+            else:
+                duration = None
+
+            return {
+                'duration_seconds': duration,
+                'stages': {
+                    stage: timing.as_dict() for stage, timing in self._stage_timings.items()
+                },
+                'pipeline_latencies': pipeline_latencies,
+                'queue_depths': {
+                    name: depth.as_dict() for name, depth in self._queue_depths.items()
+                },
+                'http_requests': {
+                    'by_service': service_request_counts,
+                    'by_host': dict(request_counts),
+                },
+            }
+
+    def prometheus_text(self):
+        '''
+        returns all collected metrics in Prometheus' text exposition format
+        '''
+        summary = self.summary()
+        prefix = self.PROMETHEUS_PREFIX
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {metric_type}')
+            for labels, value in samples:
+                label_text = ','.join(
+                    '{k}="{v}"'.format(k=k, v=_escape_label_value(v)) for k, v in labels.items()
+                )
+                label_text = '{' + label_text + '}' if label_text else ''
+                lines.append(f'{prefix}_{name}{label_text} {value}')
+
+        if summary['duration_seconds'] is not None:
+            metric(
+                'duration_seconds', 'gauge', 'duration of the replication',
+                [({}, summary['duration_seconds'])],
+            )
+
+        stages = summary['stages']
+        metric(
+            'stage_seconds_total', 'counter', 'time spent per stage (accumulated over workers)',
+            [({'stage': stage}, t['total_seconds']) for stage, t in stages.items()],
+        )
+        metric(
+            'stage_wall_seconds', 'gauge', 'time from first start until last end per stage',
+            [({'stage': stage}, t['wall_seconds']) for stage, t in stages.items()],
+        )
+        metric(
+            'stage_invocations_total', 'counter', 'number of invocations per stage',
+            [({'stage': stage}, t['count']) for stage, t in stages.items()],
+        )
+
+        latencies = summary['pipeline_latencies']
+        metric(
+            'pipeline_seconds', 'gauge', 'latency per pipeline and stage',
+            [
+                ({'stage': stage, 'pipeline': pipeline_name}, seconds)
+                for stage, l in latencies.items()
+                for pipeline_name, seconds in l['pipelines'].items()
+            ],
+        )
+        metric(
+            'pipeline_seconds_quantile', 'gauge', 'latency quantiles of pipelines per stage',
+            [
+                ({'stage': stage, 'quantile': quantile}, l[f'p{quantile}_seconds'])
+                for stage, l in latencies.items()
+                for quantile in ('50', '90', '99')
+            ],
+        )
+
+        queue_depths = summary['queue_depths']
+        metric(
+            'queue_depth_max', 'gauge', 'max depth of the input queue per stage',
+            [({'queue': name}, d['max']) for name, d in queue_depths.items()],
+        )
+        metric(
+            'queue_depth_mean', 'gauge', 'mean depth of the input queue per stage',
+            [({'queue': name}, d['mean']) for name, d in queue_depths.items()],
+        )
+
+        metric(
+            'http_requests_total', 'counter', 'number of HTTP requests per service',
+            [
+                ({'service': service}, count)
+                for service, count in summary['http_requests']['by_service'].items()
+            ],
+        )
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, metrics_dir: str, name: str='replication_metrics'):
+        '''
+        writes the collected metrics as JSON summary (`<name>.json`) and as Prometheus textfile
+        (`<name>.prom`, e.g. to be picked up by node-exporter's textfile collector) to the given
+        directory. Files are replaced atomically.
+        '''
+        metrics_dir = os.path.abspath(not_empty(metrics_dir))
+        os.makedirs(metrics_dir, exist_ok=True)
+
+        _write_atomically(
+            os.path.join(metrics_dir, f'{name}.json'),
+            json.dumps(self.summary(), indent=2),
+        )
+        _write_atomically(
+            os.path.join(metrics_dir, f'{name}.prom'),
+            self.prometheus_text(),
+        )
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _write_atomically(path: str, contents: str):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(contents)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
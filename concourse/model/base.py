@@ -31,17 +31,27 @@ class AttribSpecMixin(object):
     def _attribute_specs(cls):
         raise NotImplementedError
 
+    @classmethod
+    def _compiled_attribute_specs(cls) -> '_CompiledAttributeSpecs':
+        # compiled on first use (and stored per class), as attribute specs may refer to
+        # names defined after the class
+        compiled = cls.__dict__.get('_attribute_specs_compiled')
+        if compiled is None:
+            compiled = _CompiledAttributeSpecs(cls._attribute_specs())
+            setattr(cls, '_attribute_specs_compiled', compiled)
+        return compiled
+
     @classmethod
     def _defaults_dict(cls):
-        return AttributeSpec.defaults_dict(cls._attribute_specs())
+        return dict(cls._compiled_attribute_specs().defaults)
 
     @classmethod
     def _optional_attributes(cls):
-        return set(AttributeSpec.optional_attr_names(cls._attribute_specs()))
+        return set(cls._compiled_attribute_specs().optional_names)
 
     @classmethod
     def _required_attributes(cls):
-        return set(AttributeSpec.required_attr_names(cls._attribute_specs()))
+        return set(cls._compiled_attribute_specs().required_names)
 
     def _apply_defaults(self, raw_dict):
         self.raw = util.merge_dicts(
@@ -180,6 +190,17 @@ class AttributeSpec(object):
         raise NotImplementedError
 
 
+class _CompiledAttributeSpecs(object):
+    '''
+    the attribute specs of an `AttribSpecMixin` class, along with their defaults and names
+    '''
+    def __init__(self, attribute_specs):
+        self.specs = tuple(attribute_specs)
+        self.defaults = AttributeSpec.defaults_dict(self.specs)
+        self.optional_names = frozenset(AttributeSpec.optional_attr_names(self.specs))
+        self.required_names = frozenset(AttributeSpec.required_attr_names(self.specs))
+
+
 class Trait(ModelBase):
     def __init__(self, name: str, variant_name: str, raw_dict: dict):
         self.name = util.not_none(name)
@@ -19,7 +19,7 @@ from concourse.model.base import (
     ModelBase,
     select_attr,
 )
-from util import not_none
+from util import merge_dicts, not_none
 from concourse.model.resources import RepositoryConfig, ResourceIdentifier
 
 
@@ -34,6 +34,15 @@ class JobVariant(ModelBase):
     def _attribute_specs(cls):
         return ()
 
+    def _apply_defaults(self, raw_dict):
+        # variant dicts share unmodified values with their pipeline's base definition (see
+        # `DefinitionFactory`) - only copy what is changed
+        self.raw = merge_dicts(
+            self._defaults_dict(),
+            raw_dict,
+            share_unmodified=True,
+        )
+
     def _known_attributes(self):
         return {
             'steps',
@@ -113,7 +122,7 @@ class JobVariant(ModelBase):
         return self._steps_dict[name]
 
     def has_step(self, step_name):
-        return step_name in self.step_names()
+        return step_name in self._steps_dict
 
     def pr_repository(self, name):
         pr_repo = self.repository(name)
@@ -108,6 +108,9 @@ class Resource(ModelBase):
 class ResourceRegistry(object):
     def __init__(self):
         self.resources_dict = {}
+        # resources (in order of insertion) by type_name, and by (type_name, qualifier)
+        self._resources_by_type = {}
+        self._resources_by_type_and_qualifier = {}
 
     def __contains__(self, item):
         if isinstance(item, Resource):
@@ -137,17 +140,18 @@ class ResourceRegistry(object):
                 return # nothing to do (resource already existed)
             raise ValueError('insertion conflict: {id}'.format(id=resource_id))
         self.resources_dict[resource_id] = resource
+        type_name = resource_id.type_name()
+        self._resources_by_type.setdefault(type_name, []).append(resource)
+        self._resources_by_type_and_qualifier.setdefault(
+            (type_name, resource_id.qualifier()), []
+        ).append(resource)
 
     def resources(self, type_name, qualifier=None):
-        def filter_expr(resource):
-            id = resource.resource_identifier()
-            if not id.type_name() == type_name:
-                return False
-            if qualifier is not None and id.qualifier() != qualifier:
-                return False
-            return True
-
-        return filter(filter_expr, self.resources_dict.values())
+        if qualifier is None:
+            resources = self._resources_by_type.get(type_name, ())
+        else:
+            resources = self._resources_by_type_and_qualifier.get((type_name, qualifier), ())
+        return iter(resources)
 
     def resource(self, resource_identifier):
         return self[resource_identifier]
@@ -198,18 +198,6 @@ class PipelineStep(ModelBase):
     def _attribute_specs(cls):
         return attrs(cls)
 
-    @classmethod
-    def _defaults_dict(cls):
-        return AttributeSpec.defaults_dict(attrs(cls))
-
-    @classmethod
-    def _optional_attributes(cls):
-        return set(AttributeSpec.optional_attr_names(attrs(cls)))
-
-    @classmethod
-    def _required_attributes(cls):
-        return set(AttributeSpec.required_attr_names(attrs(cls)))
-
     def custom_init(self, raw_dict: dict):
         if not isinstance(raw_dict, dict):
             raise ValueError(f'expected a dict, but received: {type(raw_dict)} ({raw_dict})')
@@ -194,8 +194,9 @@ class NotificationCfgSet(NamedModelElement, AttribSpecMixin):
     def _attribute_specs(cls):
         return NOTIFICATION_CFG_SET_ATTRS
 
-    def _defaults_dict(self):
-        return AttributeSpec.defaults_dict(self._attribute_specs())
+    @classmethod
+    def _defaults_dict(cls):
+        return dict(cls._compiled_attribute_specs().defaults)
 
     def on_error(self):
         return NotificationCfg(self.raw['on_error'])
@@ -88,14 +88,17 @@ class PublishDockerImageDescriptor(NamedModelElement, ModelDefaultsMixin, Attrib
     def _attribute_specs(cls):
         return IMG_DESCRIPTOR_ATTRIBS
 
-    def _defaults_dict(self):
-        return AttributeSpec.defaults_dict(IMG_DESCRIPTOR_ATTRIBS)
+    @classmethod
+    def _defaults_dict(cls):
+        return dict(cls._compiled_attribute_specs().defaults)
 
-    def _optional_attributes(self):
-        return set(AttributeSpec.optional_attr_names(IMG_DESCRIPTOR_ATTRIBS))
+    @classmethod
+    def _optional_attributes(cls):
+        return set(cls._compiled_attribute_specs().optional_names)
 
-    def _required_attributes(self):
-        return set(AttributeSpec.required_attr_names(IMG_DESCRIPTOR_ATTRIBS))
+    @classmethod
+    def _required_attributes(cls):
+        return set(cls._compiled_attribute_specs().required_names)
 
     def _inputs(self):
         return self.raw['inputs']
@@ -12,25 +12,31 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import multiprocessing
 import os
 
 from enum import Enum, IntEnum
-from concurrent.futures import ThreadPoolExecutor
-import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+import hashlib
 import textwrap
 import threading
+import time
 import traceback
 
 import mako.template
 
+import http_requests
 from util import (
+    load_yaml,
     warning,
     existing_dir,
     not_none,
     info,
+    verbose,
     merge_dicts,
-    FluentIterable
 )
+from model import ConfigSetSerialiser
 from mailutil import _send_mail
 from github.util import (
     github_cfg_for_hostname,
@@ -46,9 +52,17 @@ from concourse.enumerator import (
     DefinitionDescriptorPreprocessor,
     TemplateRetriever,
     GithubOrganisationDefinitionEnumerator,
+    GithubOrganisationGraphQLDefinitionEnumerator,
 )
 
 from concourse import client
+from concourse.metrics import ReplicationMetrics
+from concourse.stages import (
+    Completed,
+    Stage,
+    StagedPipeline,
+)
+from concourse.state import ReplicationStateStore
 import concourse.client.model
 
 
@@ -60,11 +74,44 @@ def replicate_pipelines(
     template_include_dir,
     unpause_pipelines: bool=True,
     expose_pipelines: bool=True,
+    template_module_dir: str=None,
+    skip_unchanged_pipelines: bool=False,
+    state_dir: str=None,
+    full_replication: bool=False,
+    graphql_enumeration: bool=False,
+    render_processes: int=None,
+    stage_concurrency: dict=None,
+    metrics_dir: str=None,
 ):
+    '''
+    @param state_dir: if given, the inputs of replicated pipelines are recorded in a persistent
+        state store in this directory. Pipelines with unchanged inputs are skipped in subsequent
+        replications (unless `full_replication` is set). Skipped pipelines that were removed from
+        concourse out-of-band are deployed again by the next replication (or a full one).
+    @param graphql_enumeration: if set, pipeline definitions are enumerated using batched
+        GitHub GraphQL queries
+    @param render_processes: if set, pipelines are rendered in a pool of worker processes of
+        the given size (`0` to use one process per CPU core)
+    @param stage_concurrency: optional mapping from replication stage name to number of worker
+        threads (see `PipelineReplicator.DEFAULT_STAGE_CONCURRENCY`)
+    @param metrics_dir: if given, replication metrics are written to this directory (as JSON
+        summary and Prometheus textfile) at the end of the replication
+    '''
+    state_store = ReplicationStateStore(state_dir=state_dir) if state_dir else None
+
+    if graphql_enumeration:
+        enumerator_type = GithubOrganisationGraphQLDefinitionEnumerator
+    else:
+        enumerator_type = GithubOrganisationDefinitionEnumerator
+
     definition_enumerators = [
-        GithubOrganisationDefinitionEnumerator(
+        enumerator_type(
             job_mapping=job_mapping,
             cfg_set=cfg_set,
+            **_enumerator_kwargs(
+                enumerator_type=enumerator_type,
+                stage_concurrency=stage_concurrency,
+            ),
         ),
     ]
 
@@ -74,15 +121,18 @@ def replicate_pipelines(
         template_retriever=template_retriever,
         template_include_dir=template_include_dir,
         cfg_set=cfg_set,
+        template_module_dir=template_module_dir,
     )
 
     deployer = ConcourseDeployer(
         unpause_pipelines=unpause_pipelines,
         expose_pipelines=expose_pipelines,
+        skip_unchanged=skip_unchanged_pipelines,
     )
 
     result_processor = ReplicationResultProcessor(
         cfg_set=cfg_set,
+        state_store=state_store,
     )
 
     replicator = PipelineReplicator(
@@ -91,20 +141,215 @@ def replicate_pipelines(
         definition_renderer=renderer,
         definition_deployer=deployer,
         result_processor=result_processor,
+        state_store=state_store,
+        full_replication=full_replication,
+        render_processes=render_processes,
+        stage_concurrency=stage_concurrency,
+        metrics=ReplicationMetrics(
+            service_hostnames=_service_hostnames(cfg_set=cfg_set, concourse_cfg=concourse_cfg),
+        ),
+    )
+
+    try:
+        return replicator.replicate()
+    finally:
+        info(_format_metrics_summary(replicator.metrics.summary()))
+        if metrics_dir:
+            replicator.metrics.write(metrics_dir=metrics_dir)
+
+
+def _enumerator_kwargs(enumerator_type, stage_concurrency: dict=None):
+    '''
+    returns the keyword arguments to pass the 'enumerate' stage concurrency to definition
+    enumerators of the given type (if they support concurrent scanning)
+    '''
+    if not issubclass(enumerator_type, GithubOrganisationDefinitionEnumerator):
+        return {}
+    stage_concurrency = {**PipelineReplicator.DEFAULT_STAGE_CONCURRENCY, **(stage_concurrency or {})}
+    return {'scan_concurrency': stage_concurrency['enumerate']}
+
+
+def _service_hostnames(cfg_set, concourse_cfg):
+    github_hostnames = set()
+    for github_cfg in cfg_set._cfg_elements('github'):
+        for url in (github_cfg.http_url(), github_cfg.api_url()):
+            if url:
+                github_hostnames.add(urlparse(url).hostname)
+
+    return {
+        'github': github_hostnames,
+        'concourse': {urlparse(concourse_cfg.external_url()).hostname},
+    }
+
+
+def _format_metrics_summary(summary):
+    stage_timings = ', '.join(
+        f'{stage}: {timing["total_seconds"]:.1f}s'
+        for stage, timing in summary['stages'].items()
+    )
+    http_requests = ', '.join(
+        f'{service}: {count}'
+        for service, count in summary['http_requests']['by_service'].items()
+    )
+    return (
+        f'replication metrics - stage timings: [{stage_timings}], '
+        f'HTTP requests: [{http_requests}]'
     )
 
-    return replicator.replicate()
+
+def _directory_digest(path: str, file_suffix: str=''):
+    '''
+    returns a digest over the relative paths and contents of all files in the given directory
+    (recursively) whose names end with `file_suffix`
+    '''
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith(file_suffix):
+                continue
+            file_path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class CompiledTemplateCache(object):
+    '''
+    Thread-safe cache of compiled mako templates, keyed by template name and a digest of the
+    template contents (thus, changed template contents will always result in recompilation).
+
+    If `module_directory` is given, generated template modules are additionally stored in the
+    filesystem, allowing subsequent processes to skip template compilation.
+    '''
+    def __init__(self, lookup, module_directory: str=None):
+        self.lookup = lookup
+        self.module_directory = module_directory
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def template(self, template_name: str, template_contents: str, template_file: str=None):
+        digest = hashlib.sha1(template_contents.encode('utf-8')).hexdigest()
+        cache_key = (template_name, digest)
+
+        with self._lock:
+            if cache_key not in self._templates:
+                self._templates[cache_key] = self._compile(
+                    template_name=template_name,
+                    template_contents=template_contents,
+                    template_file=template_file,
+                    digest=digest,
+                )
+            return self._templates[cache_key]
+
+    def _compile(self, template_name, template_contents, template_file, digest):
+        if not self.module_directory or not template_file:
+            return mako.template.Template(template_contents, lookup=self.lookup)
+
+        # module file names contain the contents digest, so stale modules are never loaded
+        return mako.template.Template(
+            filename=template_file,
+            uri=template_name,
+            module_filename=os.path.join(
+                self.module_directory,
+                f'{template_name}-{digest}.py',
+            ),
+            lookup=self.lookup,
+        )
 
 
 class Renderer(object):
-    def __init__(self, template_retriever, template_include_dir, cfg_set):
+    def __init__(
+        self,
+        template_retriever,
+        template_include_dir,
+        cfg_set,
+        template_module_dir: str=None,
+    ):
+        '''
+        @param template_module_dir: optional directory to store compiled template modules in
+        '''
         self.template_retriever = template_retriever
+        if template_module_dir:
+            template_module_dir = os.path.abspath(template_module_dir)
+            os.makedirs(template_module_dir, exist_ok=True)
+        self.template_module_dir = template_module_dir
+        self._static_digest = None
         if template_include_dir:
             template_include_dir = os.path.abspath(template_include_dir)
             self.template_include_dir = os.path.abspath(template_include_dir)
-            from mako.lookup import TemplateLookup
-            self.lookup = TemplateLookup([template_include_dir])
             self.cfg_set = cfg_set
+            self._init_templates()
+
+    def _init_templates(self):
+        from mako.lookup import TemplateLookup
+        self.lookup = TemplateLookup(
+            [self.template_include_dir],
+            module_directory=self.template_module_dir,
+        )
+        self.template_cache = CompiledTemplateCache(
+            lookup=self.lookup,
+            module_directory=self.template_module_dir,
+        )
+
+    def __getstate__(self):
+        # template lookup and cache are not picklable (they contain locks); they are re-created
+        # after unpickling (e.g. in render worker processes)
+        state = self.__dict__.copy()
+        state.pop('lookup', None)
+        state.pop('template_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'template_include_dir' in state:
+            self._init_templates()
+
+    def inputs_digest(self, definition_descriptor):
+        '''
+        returns a digest over all inputs used to render the given definition descriptor (the
+        definition's sources, the template, template includes, the pipeline model code and the
+        cfg_set), or `None` if the digests of the definition's sources are not known
+        '''
+        if not definition_descriptor.source_digests:
+            return None
+
+        template_name = definition_descriptor.template_name()
+        template_contents = self.template_retriever.template_contents(template_name)
+
+        digest = hashlib.sha1()
+        for source_name, source_digest in sorted(definition_descriptor.source_digests.items()):
+            digest.update(f'{source_name}:{source_digest}'.encode('utf-8'))
+        digest.update(template_contents.encode('utf-8'))
+        digest.update(self._static_inputs_digest().encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def _static_inputs_digest(self):
+        '''
+        returns a digest over the inputs shared by all definitions (template includes, pipeline
+        model code and cfg_set). It is calculated once per Renderer instance - renderers are
+        thus expected to be created per replication run (so changes are picked up by
+        subsequent runs).
+        '''
+        if self._static_digest:
+            return self._static_digest
+
+        serialiser = ConfigSetSerialiser(
+            cfg_sets=[self.cfg_set],
+            cfg_factory=self.cfg_set.cfg_factory,
+        )
+        digest = hashlib.sha1()
+        digest.update(_directory_digest(self.template_include_dir).encode('utf-8'))
+        digest.update(
+            _directory_digest(os.path.dirname(__file__), file_suffix='.py').encode('utf-8')
+        )
+        digest.update(serialiser.serialise().encode('utf-8'))
+
+        # concurrent calculation yields the same result, so there is no need for locking
+        self._static_digest = digest.hexdigest()
+        return self._static_digest
 
     def render(self, definition_descriptor):
         try:
@@ -130,9 +375,13 @@ class Renderer(object):
     def _render(self, definition_descriptor):
         effective_definition = definition_descriptor.pipeline_definition
 
-        # handle inheritance
+        # handle inheritance (DefinitionFactory copies what it modifies)
         for override in definition_descriptor.override_definitions:
-            effective_definition = merge_dicts(effective_definition, override)
+            effective_definition = merge_dicts(
+                effective_definition,
+                override,
+                share_unmodified=True,
+            )
 
         template_name = definition_descriptor.template_name()
         template_contents = self.template_retriever.template_contents(template_name)
@@ -177,7 +426,11 @@ class Renderer(object):
             pipeline_metadata['pipeline_name'] = pipeline_definition.name
             main_repo = None
 
-        t = mako.template.Template(template_contents, lookup=self.lookup)
+        t = self.template_cache.template(
+            template_name=template_name,
+            template_contents=template_contents,
+            template_file=self.template_retriever.template_file(template_name),
+        )
 
         definition_descriptor.pipeline = t.render(
                 instance_args=generated_model,
@@ -210,6 +463,7 @@ class DeployStatus(IntEnum):
     FAILED = 2
     SKIPPED = 4
     CREATED = 8
+    UNCHANGED = 16
 
 
 class DeployResult(object):
@@ -253,10 +507,16 @@ class ConcourseDeployer(DefinitionDeployer):
     def __init__(
         self,
         unpause_pipelines: bool,
-        expose_pipelines: bool=True
+        expose_pipelines: bool=True,
+        skip_unchanged: bool=False,
     ):
+        '''
+        @param skip_unchanged: if set, pipelines whose deployed configuration is equivalent to
+            the rendered one are neither updated, nor unpaused or exposed
+        '''
         self.unpause_pipelines = unpause_pipelines
         self.expose_pipelines = expose_pipelines
+        self.skip_unchanged = skip_unchanged
 
     def deploy(self, definition_descriptor):
         pipeline_definition = definition_descriptor.pipeline
@@ -268,8 +528,18 @@ class ConcourseDeployer(DefinitionDeployer):
             )
             response = api.set_pipeline(
                 name=pipeline_name,
-                pipeline_definition=pipeline_definition
+                pipeline_definition=pipeline_definition,
+                skip_unchanged=self.skip_unchanged,
             )
+            if response is concourse.client.model.SetPipelineResult.UNCHANGED:
+                info(
+                    'Pipeline unchanged: ' + pipeline_name +
+                    ' in team: ' + definition_descriptor.concourse_target_team
+                )
+                return DeployResult(
+                    definition_descriptor=definition_descriptor,
+                    deploy_status=DeployStatus.SUCCEEDED | DeployStatus.UNCHANGED,
+                )
             info(
                 'Deployed pipeline: ' + pipeline_name +
                 ' to team: ' + definition_descriptor.concourse_target_team
@@ -303,8 +573,20 @@ class ConcourseDeployer(DefinitionDeployer):
 
 
 class ReplicationResultProcessor(object):
-    def __init__(self, cfg_set):
+    def __init__(
+        self,
+        cfg_set,
+        state_store: ReplicationStateStore=None,
+        max_workers: int=8,
+    ):
+        '''
+        @param max_workers: max number of concourse targets to process concurrently (also the
+            max number of concurrent requests issued to initialise new pipelines per target)
+        '''
         self._cfg_set = cfg_set
+        self._state_store = state_store
+        self._max_workers = max_workers
+        http_requests.ensure_pool_maxsize(max_workers)
 
     def process_results(self, results):
         # collect pipelines by concourse target (concourse_cfg, team_name) as key
@@ -316,34 +598,13 @@ class ReplicationResultProcessor(object):
                 concourse_target_results[concourse_target_key] = set()
             concourse_target_results[concourse_target_key].add(result)
 
-        for concourse_target_key, concourse_results in concourse_target_results.items():
-            # TODO: implement eq for concourse_cfg
-            concourse_cfg, concourse_team = next(iter(
-                concourse_results)).definition_descriptor.concourse_target()
-            concourse_results = concourse_target_results[concourse_target_key]
-            concourse_api = client.from_cfg(
-                concourse_cfg=concourse_cfg,
-                team_name=concourse_team,
-            )
-            # find pipelines to remove
-            deployed_pipeline_names = set(map(
-                lambda r: r.definition_descriptor.pipeline_name, concourse_results
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            # consume results to propagate errors
+            list(executor.map(
+                lambda target: self._process_concourse_target_results(*target),
+                concourse_target_results.items(),
             ))
 
-            pipelines_to_remove = set(concourse_api.pipelines()) - deployed_pipeline_names
-
-            for pipeline_name in pipelines_to_remove:
-                info('removing pipeline: {p}'.format(p=pipeline_name))
-                concourse_api.delete_pipeline(pipeline_name)
-
-            # trigger resource checks in new pipelines
-            self._initialise_new_pipeline_resources(concourse_api, concourse_results)
-
-            # order pipelines alphabetically
-            pipeline_names = list(concourse_api.pipelines())
-            pipeline_names.sort()
-            concourse_api.order_pipelines(pipeline_names)
-
         # evaluate results
         failed_descriptors = [
             d for d in results
@@ -351,8 +612,11 @@ class ReplicationResultProcessor(object):
         ]
 
         failed_count = len(failed_descriptors)
+        unchanged_count = len([d for d in results if d.deploy_status & DeployStatus.UNCHANGED])
 
         info('Successfully replicated {d} pipeline(s)'.format(d=len(results) - failed_count))
+        if unchanged_count:
+            info('{d} pipeline(s) were unchanged'.format(d=unchanged_count))
 
         if failed_count == 0:
             return True
@@ -438,32 +702,152 @@ class ReplicationResultProcessor(object):
                 )
             )
 
-    def _initialise_new_pipeline_resources(self, concourse_api, results):
-        newly_deployed_pipeline_names = map(
-            lambda result: result.definition_descriptor.pipeline_name,
-            filter(
-                lambda result: result.deploy_status & DeployStatus.CREATED,
-                results,
-            )
+    def _process_concourse_target_results(self, concourse_target_key, concourse_results):
+        # TODO: implement eq for concourse_cfg
+        concourse_cfg, concourse_team = next(iter(
+            concourse_results)).definition_descriptor.concourse_target()
+        concourse_api = client.from_cfg(
+            concourse_cfg=concourse_cfg,
+            team_name=concourse_team,
         )
-        for pipeline_name in newly_deployed_pipeline_names:
-            info('unpausing new pipeline {p}'.format(p=pipeline_name))
-            concourse_api.unpause_pipeline(pipeline_name)
+        # find pipelines to remove
+        deployed_pipeline_names = set(map(
+            lambda r: r.definition_descriptor.pipeline_name, concourse_results
+        ))
+
+        # all results were deployed before, so the listing already contains all new pipelines
+        existing_pipeline_names = set(concourse_api.pipelines())
+        pipelines_to_remove = existing_pipeline_names - deployed_pipeline_names
+
+        for pipeline_name in pipelines_to_remove:
+            info('removing pipeline: {p}'.format(p=pipeline_name))
+            concourse_api.delete_pipeline(pipeline_name)
+            if self._state_store:
+                self._state_store.remove(
+                    concourse_target=concourse_target_key,
+                    pipeline_name=pipeline_name,
+                )
+
+        if self._state_store:
+            self._forget_missing_pipelines(
+                concourse_target_key=concourse_target_key,
+                concourse_results=concourse_results,
+                existing_pipeline_names=existing_pipeline_names,
+            )
+
+        # trigger resource checks in new pipelines
+        self._initialise_new_pipeline_resources(concourse_api, concourse_results)
+
+        # order pipelines alphabetically
+        pipeline_names = sorted(existing_pipeline_names - pipelines_to_remove)
+        concourse_api.order_pipelines(pipeline_names)
+
+    def _forget_missing_pipelines(
+        self,
+        concourse_target_key,
+        concourse_results,
+        existing_pipeline_names,
+    ):
+        # pipelines skipped because of unchanged inputs, but removed from concourse out-of-band
+        # cannot be restored during this replication run. Forget their recorded state so they
+        # are deployed again during the next one.
+        for result in concourse_results:
+            if not result.deploy_status & DeployStatus.UNCHANGED:
+                continue
+            pipeline_name = result.definition_descriptor.pipeline_name
+            if pipeline_name in existing_pipeline_names:
+                continue
+            warning(f'pipeline {pipeline_name} is missing - it will be deployed again next time')
+            self._state_store.remove(
+                concourse_target=concourse_target_key,
+                pipeline_name=pipeline_name,
+            )
 
-            info('triggering initial resource check for pipeline {p}'.format(p=pipeline_name))
+    def _initialise_new_pipeline_resources(self, concourse_api, results):
+        newly_deployed_descriptors = [
+            result.definition_descriptor for result in results
+            if result.deploy_status & DeployStatus.CREATED
+        ]
+        if not newly_deployed_descriptors:
+            return
 
-            trigger_pipeline_resource_check = functools.partial(
-                concourse_api.trigger_resource_check,
+        def unpause_pipeline(definition_descriptor):
+            pipeline_name = definition_descriptor.pipeline_name
+            info('unpausing new pipeline {p}'.format(p=pipeline_name))
+            concourse_api.unpause_pipeline(pipeline_name)
+            return [
+                (pipeline_name, resource_name)
+                for resource_name in _webhook_resource_names(concourse_api, definition_descriptor)
+            ]
+
+        def trigger_resource_check(pipeline_and_resource_name):
+            pipeline_name, resource_name = pipeline_and_resource_name
+            concourse_api.trigger_resource_check(
                 pipeline_name=pipeline_name,
+                resource_name=resource_name,
             )
 
-            FluentIterable(concourse_api.pipeline_resources(pipeline_name)) \
-            .filter(lambda resource: resource.has_webhook_token()) \
-            .map(lambda resource: trigger_pipeline_resource_check(resource_name=resource.name)) \
-            .as_list()
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            resource_checks = [
+                resource_check
+                for pipeline_resource_checks in executor.map(
+                    unpause_pipeline,
+                    newly_deployed_descriptors,
+                )
+                for resource_check in pipeline_resource_checks
+            ]
+            info('triggering initial resource checks for {n} new pipeline(s)'.format(
+                n=len(newly_deployed_descriptors),
+            ))
+            # consume results to propagate errors
+            list(executor.map(trigger_resource_check, resource_checks))
+
+
+def _webhook_resource_names(concourse_api, definition_descriptor):
+    '''
+    returns the names of the resources with a webhook token of the given pipeline. They are
+    determined from the rendered pipeline definition; the deployed pipeline configuration is
+    only retrieved from concourse if no rendered definition is available.
+    '''
+    pipeline_definition = getattr(definition_descriptor, 'pipeline', None)
+    if not pipeline_definition:
+        return [
+            resource.name for resource
+            in concourse_api.pipeline_resources(definition_descriptor.pipeline_name)
+            if resource.has_webhook_token()
+        ]
+
+    resources = (load_yaml(pipeline_definition) or {}).get('resources') or []
+    return [
+        resource['name'] for resource in resources
+        if resource.get('webhook_token')
+    ]
+
+
+# renderer used by render worker processes (see `PipelineReplicator`)
+_process_renderer = None
+
+
+def _init_render_process(renderer):
+    global _process_renderer
+    _process_renderer = renderer
+
+
+def _render_in_process(definition_descriptor):
+    return _process_renderer.render(definition_descriptor)
 
 
 class PipelineReplicator(object):
+    # default number of worker threads per replication stage ('enumerate' denotes the number of
+    # definition enumerators consumed from concurrently, which replicate_pipelines also passes
+    # to organisation enumerators as the number of repositories to scan concurrently)
+    DEFAULT_STAGE_CONCURRENCY = {
+        'enumerate': 8,
+        'preprocess': 2,
+        'render': 8,
+        'deploy': 8,
+    }
+
     def __init__(
             self,
             definition_enumerators,
@@ -471,12 +855,56 @@ class PipelineReplicator(object):
             definition_renderer,
             definition_deployer,
             result_processor=None,
+            state_store: ReplicationStateStore=None,
+            full_replication: bool=False,
+            render_processes: int=None,
+            stage_concurrency: dict=None,
+            queue_size: int=32,
+            metrics: ReplicationMetrics=None,
         ):
+        '''
+        Definitions are replicated in stages (enumerate, preprocess, render, deploy), each run by
+        a configurable number of worker threads, and connected by queues of bounded size.
+
+        @param stage_concurrency: optional mapping from stage name to number of worker threads,
+            overwriting `DEFAULT_STAGE_CONCURRENCY`
+        @param queue_size: max number of definitions queued between two stages
+        @param metrics: optional `ReplicationMetrics` to record timings and throughput in
+            (exposed as `metrics` attribute - a new instance is created if not given)
+        @param render_processes: if set, pipelines are rendered in a pool of worker processes
+            of the given size (`0` to use one process per CPU core). Render stage concurrency
+            defaults to twice this number. The definition renderer, as well as definition
+            descriptors and render results must be picklable.
+        @param state_store: optional store used to skip pipelines whose inputs did not change
+            since their last successful replication
+        @param full_replication: if set, all pipelines are rendered and deployed, regardless
+            of the state recorded in `state_store`
+        '''
         self.definition_enumerators = definition_enumerators
         self.descriptor_preprocessor = descriptor_preprocessor
         self.definition_renderer = definition_renderer
         self.definition_deployer = definition_deployer
         self.result_processor = result_processor
+        self.state_store = state_store
+        self.full_replication = full_replication
+        if render_processes == 0:
+            render_processes = os.cpu_count()
+        self.render_processes = render_processes
+        self._render_executor = None
+
+        stage_concurrency = stage_concurrency or {}
+        unknown_stages = set(stage_concurrency) - set(self.DEFAULT_STAGE_CONCURRENCY)
+        if unknown_stages:
+            raise ValueError(f'unknown replication stage(s): {", ".join(unknown_stages)}')
+        self.stage_concurrency = dict(self.DEFAULT_STAGE_CONCURRENCY)
+        if render_processes:
+            # render workers mostly wait for render processes - so use more threads than processes
+            self.stage_concurrency['render'] = 2 * render_processes
+        self.stage_concurrency.update(stage_concurrency)
+        # requests (e.g. to GitHub) may be sent from all stages concurrently
+        http_requests.ensure_pool_maxsize(sum(self.stage_concurrency.values()))
+        self.queue_size = queue_size
+        self.metrics = metrics or ReplicationMetrics()
 
         # keep track of generated pipelines to detect conflicts
         self._pipeline_names_lock = threading.Lock()
@@ -489,56 +917,170 @@ class PipelineReplicator(object):
                 return True
             self._pipeline_names.add(pipeline_name)
 
-    def _enumerate_definitions(self):
-        for enumerator in self.definition_enumerators:
-            yield from enumerator.enumerate_definition_descriptors()
+    def _pipeline_name_conflict_result(self, definition_descriptor:DefinitionDescriptor):
+        pipeline_name = definition_descriptor.pipeline_name
+        warning(f'duplicate pipeline name: {pipeline_name}')
+        return DeployResult(
+            definition_descriptor=definition_descriptor,
+            deploy_status=DeployStatus.SKIPPED,
+            error_details=f'duplicate pipeline name: {pipeline_name}',
+        )
 
-    def _process_definition_descriptor(self, definition_descriptor):
+    def _state_key(self, definition_descriptor:DefinitionDescriptor):
+        return {
+            'concourse_target': definition_descriptor.concourse_target_key(),
+            'repo_path': definition_descriptor.main_repo.get('path'),
+            'branch': definition_descriptor.main_repo.get('branch'),
+            'pipeline_name': definition_descriptor.pipeline_name,
+        }
+
+    def _inputs_digest(self, definition_descriptor:DefinitionDescriptor):
+        if not self.state_store:
+            return None
+        return self.definition_renderer.inputs_digest(definition_descriptor)
+
+    def _inputs_unchanged(self, definition_descriptor:DefinitionDescriptor, inputs_digest):
+        if self.full_replication or not inputs_digest:
+            return False
+        recorded_digest = self.state_store.inputs_digest(**self._state_key(definition_descriptor))
+        return recorded_digest == inputs_digest
+
+    def _preprocess(self, definition_descriptor):
         if definition_descriptor.exception:
-            return DeployResult(
+            return Completed(DeployResult(
                 definition_descriptor=definition_descriptor,
                 deploy_status=DeployStatus.SKIPPED,
                 error_details=definition_descriptor.exception,
-            )
+            ))
 
         preprocessed = self.descriptor_preprocessor.process_definition_descriptor(
                 definition_descriptor
         )
-        result = self.definition_renderer.render(preprocessed)
+
+        inputs_digest = self._inputs_digest(preprocessed)
+        if self._inputs_unchanged(preprocessed, inputs_digest):
+            if self._pipeline_name_conflict(definition_descriptor=preprocessed):
+                return Completed(self._pipeline_name_conflict_result(preprocessed))
+            verbose(f'inputs unchanged - skipping pipeline {preprocessed.pipeline_name}')
+            return Completed(DeployResult(
+                definition_descriptor=preprocessed,
+                deploy_status=DeployStatus.SUCCEEDED | DeployStatus.UNCHANGED,
+            ))
+
+        return preprocessed, inputs_digest
+
+    def _render(self, item):
+        preprocessed, inputs_digest = item
+
+        start = time.time()
+        if self._render_executor:
+            result = self._render_executor.submit(_render_in_process, preprocessed).result()
+        else:
+            result = self.definition_renderer.render(preprocessed)
+        self.metrics.record_pipeline_latency(
+            stage='render',
+            pipeline_name=preprocessed.pipeline_name,
+            seconds=time.time() - start,
+        )
 
         if self._pipeline_name_conflict(
             definition_descriptor=result.definition_descriptor,
         ):
             # early exit upon pipeline name conflict
-            pipeline_name = result.definition_descriptor.pipeline_name
-            warning(f'duplicate pipeline name: {pipeline_name}')
-            return DeployResult(
-                definition_descriptor=definition_descriptor,
-                deploy_status=DeployStatus.SKIPPED,
-                error_details=f'duplicate pipeline name: {pipeline_name}',
-            )
+            return Completed(self._pipeline_name_conflict_result(result.definition_descriptor))
 
-        if result.render_status == RenderStatus.SUCCEEDED:
-            deploy_result = self.definition_deployer.deploy(result.definition_descriptor)
-        else:
-            deploy_result = DeployResult(
-                definition_descriptor=definition_descriptor,
+        if result.render_status != RenderStatus.SUCCEEDED:
+            return Completed(DeployResult(
+                definition_descriptor=preprocessed,
                 deploy_status=DeployStatus.SKIPPED,
                 error_details=result.error_details,
+            ))
+
+        return result, inputs_digest
+
+    def _deploy(self, item):
+        result, inputs_digest = item
+
+        start = time.time()
+        deploy_result = self.definition_deployer.deploy(result.definition_descriptor)
+        self.metrics.record_pipeline_latency(
+            stage='deploy',
+            pipeline_name=result.definition_descriptor.pipeline_name,
+            seconds=time.time() - start,
+        )
+
+        if inputs_digest and deploy_result.deploy_status & DeployStatus.SUCCEEDED:
+            self.state_store.store_inputs_digest(
+                **self._state_key(result.definition_descriptor),
+                inputs_digest=inputs_digest,
             )
+
         return deploy_result
 
-    def _replicate(self):
-        executor = ThreadPoolExecutor(max_workers=8)
-        yield from executor.map(
-            self._process_definition_descriptor,
-            self._enumerate_definitions(),
+    def _staged_pipeline(self):
+        return StagedPipeline(
+            sources=(
+                self.metrics.timed_iterable(
+                    'enumerate',
+                    enumerator.enumerate_definition_descriptors(),
+                )
+                for enumerator in self.definition_enumerators
+            ),
+            stages=(
+                Stage(
+                    'preprocess',
+                    self.metrics.timed_stage('preprocess', self._preprocess),
+                    self.stage_concurrency['preprocess'],
+                ),
+                Stage(
+                    'render',
+                    self.metrics.timed_stage('render', self._render),
+                    self.stage_concurrency['render'],
+                ),
+                Stage(
+                    'deploy',
+                    self.metrics.timed_stage('deploy', self._deploy),
+                    self.stage_concurrency['deploy'],
+                ),
+            ),
+            source_concurrency=self.stage_concurrency['enumerate'],
+            queue_size=self.queue_size,
         )
 
-    def replicate(self):
-        results = []
-        for result in self._replicate():
-            results.append(result)
+    def _run_staged_pipeline(self):
+        staged_pipeline = self._staged_pipeline()
+        for result in staged_pipeline.run():
+            self.metrics.record_queue_depths(staged_pipeline.queue_depths())
+            yield result
+
+    def _replicate(self):
+        if not self.render_processes:
+            yield from self._run_staged_pipeline()
+            return
+
+        # do not fork: the replicating process runs several threads (holding locks, e.g. of
+        # connection pools), which would not exist in forked processes
+        with ProcessPoolExecutor(
+            max_workers=self.render_processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_render_process,
+            initargs=(self.definition_renderer,),
+        ) as render_executor:
+            self._render_executor = render_executor
+            try:
+                yield from self._run_staged_pipeline()
+            finally:
+                self._render_executor = None
 
-        if self.result_processor:
-            return self.result_processor.process_results(results)
+    def replicate(self):
+        self.metrics.start()
+        try:
+            results = []
+            for result in self._replicate():
+                results.append(result)
+
+            if self.result_processor:
+                with self.metrics.stage_timer('process_results'):
+                    return self.result_processor.process_results(results)
+        finally:
+            self.metrics.stop()
@@ -0,0 +1,201 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import queue
+import threading
+
+from util import not_empty, not_none
+
+
+class Stage(object):
+    '''
+    a processing stage of a `StagedPipeline`. `function` is called for each item received from
+    the preceding stage (by `concurrency` worker threads). Its return value is passed to the
+    succeeding stage, unless it is wrapped into `Completed` (in which case it is passed directly
+    to the pipeline's output, bypassing all succeeding stages).
+    '''
+    def __init__(self, name: str, function, concurrency: int=1):
+        self.name = not_empty(name)
+        self.function = not_none(function)
+        if concurrency < 1:
+            raise ValueError(f'concurrency of stage {name} must be positive: {concurrency}')
+        self.concurrency = concurrency
+
+
+class Completed(object):
+    '''
+    wraps a stage function's result that is to be passed directly to the pipeline's output
+    '''
+    def __init__(self, result):
+        self.result = result
+
+
+class _Failure(object):
+    def __init__(self, exception):
+        self.exception = exception
+
+
+_END = object()
+
+
+class StagedPipeline(object):
+    '''
+    Processes the items yielded by a set of sources through a sequence of stages. Sources and
+    stages are run concurrently, each by a configurable number of worker threads. Stages are
+    connected through bounded queues (of `queue_size`), so producers are blocked while their
+    consumers lag behind (thus limiting the number of in-flight items).
+
+    Items are processed in no particular order. If a source or stage function raises an
+    exception, processing is cancelled and the exception is re-raised to the consumer of `run`.
+    '''
+    def __init__(
+        self,
+        sources,
+        stages,
+        source_concurrency: int=1,
+        queue_size: int=32,
+    ):
+        '''
+        @param sources: iterable of iterables, each yielding items to process
+        @param stages: sequence of `Stage`s
+        @param source_concurrency: max number of sources to consume from concurrently
+        '''
+        self._sources = list(sources)
+        self._stages = not_empty(list(stages))
+        if source_concurrency < 1:
+            raise ValueError(f'source concurrency must be positive: {source_concurrency}')
+        self._source_concurrency = source_concurrency
+        if queue_size < 1:
+            raise ValueError(f'queue size must be positive: {queue_size}')
+        self._queue_size = queue_size
+        self._queues = None
+
+    def queue_depths(self):
+        '''
+        returns a mapping from stage name to the current number of items queued for that stage
+        (and `output` to those queued for the consumer), or an empty dict if not running
+        '''
+        queues = self._queues
+        if not queues:
+            return {}
+        names = [stage.name for stage in self._stages] + ['output']
+        return {name: q.qsize() for name, q in zip(names, queues)}
+
+    def run(self):
+        '''
+        returns a generator yielding the results of the last stage (and all `Completed` results
+        of preceding stages). Closing the generator early cancels all outstanding processing.
+        '''
+        cancelled = threading.Event()
+        queues = [queue.Queue(maxsize=self._queue_size) for _ in range(len(self._stages) + 1)]
+        output_queue = queues[-1]
+        self._queues = queues
+
+        def put(target_queue, item):
+            # poll, so workers blocked on a full queue notice cancellation
+            while not cancelled.is_set():
+                try:
+                    target_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def fail(exception):
+            put(output_queue, _Failure(exception))
+            cancelled.set()
+
+        # for each group of workers (sources and stages), count those still running; the last
+        # one to finish signals the end of its output to all workers of the succeeding group
+        remaining_workers = [self._source_concurrency] + [s.concurrency for s in self._stages]
+        successor_concurrency = [s.concurrency for s in self._stages] + [1]
+        remaining_lock = threading.Lock()
+
+        def worker_done(group_idx):
+            with remaining_lock:
+                remaining_workers[group_idx] -= 1
+                last_worker = remaining_workers[group_idx] == 0
+            if last_worker:
+                for _ in range(successor_concurrency[group_idx]):
+                    put(queues[group_idx], _END)
+
+        sources = iter(self._sources)
+        sources_lock = threading.Lock()
+
+        def run_sources():
+            try:
+                while not cancelled.is_set():
+                    with sources_lock:
+                        source = next(sources, _END)
+                    if source is _END:
+                        break
+                    for item in source:
+                        if cancelled.is_set():
+                            break
+                        put(queues[0], item)
+            except BaseException as e:
+                fail(e)
+            finally:
+                worker_done(0)
+
+        def run_stage(stage_idx):
+            stage = self._stages[stage_idx]
+            input_queue = queues[stage_idx]
+            target_queue = queues[stage_idx + 1]
+            try:
+                while not cancelled.is_set():
+                    try:
+                        item = input_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if item is _END:
+                        break
+                    result = stage.function(item)
+                    if isinstance(result, Completed):
+                        put(output_queue, result.result)
+                    else:
+                        put(target_queue, result)
+            except BaseException as e:
+                fail(e)
+            finally:
+                worker_done(stage_idx + 1)
+
+        threads = [
+            threading.Thread(target=run_sources, name=f'source-{idx}', daemon=True)
+            for idx in range(self._source_concurrency)
+        ]
+        for stage_idx, stage in enumerate(self._stages):
+            threads.extend(
+                threading.Thread(
+                    target=run_stage,
+                    args=(stage_idx,),
+                    name=f'{stage.name}-{idx}',
+                    daemon=True,
+                )
+                for idx in range(stage.concurrency)
+            )
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = output_queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.exception
+                yield item
+        finally:
+            cancelled.set()
+            self._queues = None
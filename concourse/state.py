@@ -0,0 +1,114 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import threading
+
+from util import not_empty, not_none
+
+
+class ReplicationStateStore(object):
+    '''
+    Persistent (sqlite-backed) store recording the digest of all inputs that were used to render
+    and deploy a given pipeline. It is used to detect pipelines whose inputs did not change since
+    their last successful replication (which thus need not be rendered and deployed again).
+
+    Pipelines are identified by their concourse target (see
+    `DefinitionDescriptor.concourse_target_key`), repository path (org/repo), branch and pipeline
+    name.
+
+    Instances may safely be shared between threads.
+    '''
+    DB_FILE_NAME = 'replication_state.sqlite'
+
+    def __init__(self, state_dir: str):
+        state_dir = os.path.abspath(not_empty(state_dir))
+        os.makedirs(state_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            os.path.join(state_dir, self.DB_FILE_NAME),
+            check_same_thread=False,
+        )
+        with self._lock, self._connection:
+            self._connection.execute(
+                '''
+                CREATE TABLE IF NOT EXISTS deployed_pipelines (
+                    concourse_target TEXT NOT NULL,
+                    repo_path TEXT NOT NULL,
+                    branch TEXT NOT NULL,
+                    pipeline_name TEXT NOT NULL,
+                    inputs_digest TEXT NOT NULL,
+                    PRIMARY KEY (concourse_target, repo_path, branch, pipeline_name)
+                )
+                '''
+            )
+
+    def inputs_digest(
+        self,
+        concourse_target: str,
+        repo_path: str,
+        branch: str,
+        pipeline_name: str,
+    ):
+        '''
+        returns the inputs digest recorded for the given pipeline, or `None` if there is none
+        '''
+        with self._lock:
+            row = self._connection.execute(
+                '''
+                SELECT inputs_digest FROM deployed_pipelines WHERE
+                concourse_target = ? AND repo_path = ? AND branch = ? AND pipeline_name = ?
+                ''',
+                (concourse_target, repo_path, branch, pipeline_name),
+            ).fetchone()
+        return row[0] if row else None
+
+    def store_inputs_digest(
+        self,
+        concourse_target: str,
+        repo_path: str,
+        branch: str,
+        pipeline_name: str,
+        inputs_digest: str,
+    ):
+        not_none(inputs_digest)
+        with self._lock, self._connection:
+            self._connection.execute(
+                '''
+                INSERT OR REPLACE INTO deployed_pipelines
+                (concourse_target, repo_path, branch, pipeline_name, inputs_digest)
+                VALUES (?, ?, ?, ?, ?)
+                ''',
+                (concourse_target, repo_path, branch, pipeline_name, inputs_digest),
+            )
+
+    def remove(self, concourse_target: str, pipeline_name: str):
+        '''
+        removes all records for the given pipeline (e.g. after it was removed from concourse)
+        '''
+        with self._lock, self._connection:
+            self._connection.execute(
+                '''
+                DELETE FROM deployed_pipelines WHERE
+                concourse_target = ? AND pipeline_name = ?
+                ''',
+                (concourse_target, pipeline_name),
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -13,13 +13,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import fcntl
+import hashlib
 import os
 import pathlib
 import requests
 import json
+import tempfile
+import threading
+import time
 import yaml
 
-from util import CliHints, ctx,existing_dir, urljoin
+from util import CliHints, ctx,existing_dir, urljoin, warning
 from model import ConfigFactory, ConfigSetSerialiser as CSS
 
 
@@ -48,11 +53,25 @@ def serialise_cfg(cfg_dir: CliHints.existing_dir(), cfg_sets: [str], out_file: s
 
 
 class SecretsServerClient(object):
+    '''
+    retrieves the (serialised) configuration from the secrets server, optionally using a
+    cache file.
+
+    If a cache TTL is configured, cached secrets are revalidated with the secrets server once
+    they are older than the TTL (using a conditional request if the server sent an ETag). Stale
+    secrets are served while they are refreshed (in a background thread that finishes before
+    the process exits - requests to the secrets server time out after `request_timeout_seconds`
+    so a hanging server cannot block the process from exiting), unless `serve_stale` is
+    `False`. Concurrent refreshes by processes sharing the same cache file are serialised using
+    a lock file. Without TTL, cached secrets never expire. Without endpoint, only the cache file
+    is used.
+    '''
     @staticmethod
     def from_env(
         endpoint_env_var='SECRETS_SERVER_ENDPOINT',
         concourse_secret_env_var='SECRETS_SERVER_CONCOURSE_CFG_NAME',
-        cache_file='SECRETS_SERVER_CACHE'
+        cache_file='SECRETS_SERVER_CACHE',
+        cache_ttl_env_var='SECRETS_SERVER_CACHE_TTL',
     ):
         if cache_file not in os.environ:
             if not all(map(
@@ -63,44 +82,147 @@ class SecretsServerClient(object):
                     v=', '.join((endpoint_env_var, concourse_secret_env_var))
                 ))
         cache_file = os.environ.get(cache_file, None)
+        cache_ttl_seconds = os.environ.get(cache_ttl_env_var, None)
 
         return SecretsServerClient(
                 endpoint_url=os.environ.get(endpoint_env_var),
                 concourse_secret_name=os.environ.get(concourse_secret_env_var),
-                cache_file=cache_file
+                cache_file=cache_file,
+                cache_ttl_seconds=int(cache_ttl_seconds) if cache_ttl_seconds else None,
         )
 
-    def __init__(self, endpoint_url, concourse_secret_name, cache_file=None):
+    def __init__(
+        self,
+        endpoint_url,
+        concourse_secret_name,
+        cache_file=None,
+        cache_ttl_seconds: int=None,
+        serve_stale: bool=True,
+        request_timeout_seconds: float=30,
+    ):
         self.url = endpoint_url
         self.concourse_secret_name = concourse_secret_name
         self.cache_file=cache_file
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.serve_stale = serve_stale
+        self.request_timeout_seconds = request_timeout_seconds
 
     def retrieve_secrets(self):
         if self.cache_file and os.path.isfile(self.cache_file):
-            with open(self.cache_file) as f:
-                return json.load(f)
+            if not self.url or self._is_fresh(self._read_cache_metadata()):
+                return self._read_cache()
+            if self.serve_stale:
+                secrets = self._read_cache()
+                # non-daemon thread: the process waits for the refresh before exiting
+                threading.Thread(
+                    target=self._refresh_cache_or_warn,
+                    name='secrets-server-cache-refresh',
+                ).start()
+                return secrets
+            try:
+                return self._refresh_cache()
+            except Exception as e:
+                warning(f'serving stale secrets (failed to refresh {self.cache_file}: {e})')
+                return self._read_cache()
+
+        if self.cache_file:
+            return self._refresh_cache()
+
+        response = self._request_secrets()
+        return response.json()
 
+    def _request_secrets(self, etag: str=None):
         request_url = urljoin(self.url, self.concourse_secret_name)
-        response = requests.get(request_url)
+        headers = {'If-None-Match': etag} if etag else {}
+        response = requests.get(
+            request_url,
+            headers=headers,
+            timeout=self.request_timeout_seconds,
+        )
         # pylint: disable=no-member
+        if etag and response.status_code == requests.codes.not_modified:
+            return response
         if not response.status_code == requests.codes.ok:
         # pylint: enable=no-member
             raise RuntimeError('secrets_server sent {d}: {m}'.format(
                 d=response.status_code,
                 m=response.content
             ))
+        return response
 
-        if self.cache_file:
-            with open(self.cache_file, 'w') as f:
-                json.dump(response.json(), f)
+    def _metadata_file(self):
+        return self.cache_file + '.meta'
 
-        return response.json()
+    def _read_cache(self):
+        with open(self.cache_file) as f:
+            return json.load(f)
+
+    def _read_cache_metadata(self):
+        try:
+            with open(self._metadata_file()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # cache files w/o metadata (e.g. written by previous versions)
+            return {'fetched': os.path.getmtime(self.cache_file)}
+
+    def _is_fresh(self, metadata: dict):
+        if self.cache_ttl_seconds is None:
+            return True
+        return time.time() - metadata.get('fetched', 0) < self.cache_ttl_seconds
+
+    def _refresh_cache_or_warn(self):
+        try:
+            self._refresh_cache()
+        except Exception as e:
+            warning(f'failed to refresh secrets cache {self.cache_file}: {e}')
+
+    def _refresh_cache(self):
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_file))
+        with open(self.cache_file + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # the cache might have been refreshed by another process meanwhile
+                if os.path.isfile(self.cache_file):
+                    metadata = self._read_cache_metadata()
+                    if self._is_fresh(metadata):
+                        return self._read_cache()
+                else:
+                    metadata = {}
+
+                response = self._request_secrets(etag=metadata.get('etag'))
+                if response.status_code == requests.codes.not_modified: # pylint: disable=no-member
+                    secrets = self._read_cache()
+                else:
+                    secrets = response.json()
+                    digest = hashlib.sha256(response.content).hexdigest()
+                    if digest != metadata.get('digest') or not os.path.isfile(self.cache_file):
+                        _write_atomically(self.cache_file, json.dumps(secrets), cache_dir)
+                    metadata = {'etag': response.headers.get('ETag'), 'digest': digest}
+
+                metadata['fetched'] = time.time()
+                _write_atomically(self._metadata_file(), json.dumps(metadata), cache_dir)
+                return secrets
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_atomically(path: str, contents: str, target_dir: str):
+    fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(contents)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
 def __add_module_command_args(parser):
     parser.add_argument('--server-endpoint', default=None)
     parser.add_argument('--concourse-cfg-name', default=None)
     parser.add_argument('--cache-file', default=None)
+    parser.add_argument('--cache-ttl', type=int, default=None, help='seconds')
 
 
 def _client():
@@ -114,7 +236,8 @@ def _client():
             return SecretsServerClient(
                 endpoint_url=args.server_endpoint,
                 concourse_secret_name=args.concourse_cfg_name,
-                cache_file=args.cache_file
+                cache_file=args.cache_file,
+                cache_ttl_seconds=args.cache_ttl,
             )
     except AttributeError:
         pass # ignore
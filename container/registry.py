@@ -14,10 +14,10 @@
 """This package pulls images from a Docker Registry."""
 
 
-import functools
 import tarfile
 import tempfile
 
+import caching
 import util
 from model.container_registry import Privileges
 
@@ -93,7 +93,7 @@ def _parse_image_reference(image_reference):
   return name
 
 
-@functools.lru_cache()
+@caching.cached(max_size=128, ttl_seconds=3600)
 def _credentials(image_reference: str, privileges:Privileges=None):
     util.check_type(image_reference, str)
 
@@ -126,10 +126,12 @@ def publish_container_image(image_reference: str, image_file_obj):
   image_file_obj.seek(0)
 
 
-def _mk_transport():
+# transports are thread-safe pools of (keep-alive) connections - share them process-wide
+@caching.cached(max_size=4)
+def _mk_transport(size: int=8):
   retry_factory = retry.Factory()
   retry_factory = retry_factory.WithSourceTransportCallable(httplib2.Http)
-  transport = transport_pool.Http(retry_factory.Build, size=8)
+  transport = transport_pool.Http(retry_factory.Build, size=size)
   return transport
 
 
@@ -138,7 +140,7 @@ def _push_image(image_reference: str, image_file: str, threads=8):
   util.not_none(image_reference)
   util.existing_file(image_file)
 
-  transport = _mk_transport()
+  transport = _mk_transport(size=threads)
 
   image_reference = normalise_image_reference(image_reference)
   name = _parse_image_reference(image_reference)
@@ -14,11 +14,11 @@
 # limitations under the License.
 
 import enum
-import functools
 import os
 
 from pathlib import Path
 
+import caching
 import util
 
 from model.base import ModelBase
@@ -43,6 +43,30 @@ class ContextConfig(ConfigBase):
     def config_dir(self):
         return self.raw.get('cfg-dir')
 
+    def config_snapshot_file(self):
+        return self.raw.get('cfg-snapshot-file')
+
+    def cfg_factory_ttl(self):
+        ttl = self.raw.get('cfg-factory-ttl')
+        return float(ttl) if ttl is not None else None
+
+    def http_pool_maxsize(self):
+        pool_maxsize = self.raw.get('http-pool-maxsize')
+        return int(pool_maxsize) if pool_maxsize is not None else None
+
+    def http_metrics(self):
+        return str(self.raw.get('http-metrics', '')).lower() in ('1', 'true', 'yes')
+
+    def http_metrics_file(self):
+        return self.raw.get('http-metrics-file')
+
+    def http_cache_dir(self):
+        return self.raw.get('http-cache-dir')
+
+    def http_cache_max_size(self):
+        max_size = self.raw.get('http-cache-max-size')
+        return int(max_size) if max_size is not None else None
+
 
 class TerminalConfig(ConfigBase):
 
@@ -70,6 +94,20 @@ def load_config_from_env():
     context_config = {}
     if 'CC_CONFIG_DIR' in env:
         context_config['cfg-dir'] = env['CC_CONFIG_DIR']
+    if 'CC_CONFIG_SNAPSHOT_FILE' in env:
+        context_config['cfg-snapshot-file'] = env['CC_CONFIG_SNAPSHOT_FILE']
+    if 'CC_CFG_FACTORY_TTL' in env:
+        context_config['cfg-factory-ttl'] = env['CC_CFG_FACTORY_TTL']
+    if 'CC_HTTP_POOL_MAXSIZE' in env:
+        context_config['http-pool-maxsize'] = env['CC_HTTP_POOL_MAXSIZE']
+    if 'CC_HTTP_METRICS' in env:
+        context_config['http-metrics'] = env['CC_HTTP_METRICS']
+    if 'CC_HTTP_METRICS_FILE' in env:
+        context_config['http-metrics-file'] = env['CC_HTTP_METRICS_FILE']
+    if 'CC_HTTP_CACHE_DIR' in env:
+        context_config['http-cache-dir'] = env['CC_HTTP_CACHE_DIR']
+    if 'CC_HTTP_CACHE_MAX_SIZE' in env:
+        context_config['http-cache-max-size'] = env['CC_HTTP_CACHE_MAX_SIZE']
 
     return {
         'ctx': context_config,
@@ -128,7 +166,10 @@ def _cfg_factory_from_dir():
     cfg_dir = existing_dir(Config.CONTEXT.value.config_dir())
 
     from model import ConfigFactory
-    factory = ConfigFactory.from_cfg_dir(cfg_dir=cfg_dir)
+    factory = ConfigFactory.from_cfg_dir(
+        cfg_dir=cfg_dir,
+        snapshot_file=Config.CONTEXT.value.config_snapshot_file(),
+    )
     return factory
 
 
@@ -137,7 +178,9 @@ def _cfg_factory_from_secrets_server():
     return config._parse_model(config._client().retrieve_secrets())
 
 
-@functools.lru_cache()
+# by default, the cfg_factory is retained for the process' lifetime. Long-running processes
+# may set a TTL (CC_CFG_FACTORY_TTL) in order to pick up changed configuration / credentials.
+@caching.cached(max_size=1, ttl_seconds=Config.CONTEXT.value.cfg_factory_ttl())
 def cfg_factory():
     from util import fail
 
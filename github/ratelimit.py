@@ -0,0 +1,219 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import hashlib
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+import caching
+from model.github import GithubConfig
+
+'''
+Client-side pacing of GitHub API requests, based on the rate limit information GitHub returns
+with each response (`X-RateLimit-*` headers, and `Retry-After` for secondary rate limits).
+
+Requests sent with the same auth token share one `RateLimitScheduler` (see `scheduler`), which
+keeps track of GitHub's separate rate limits per resource (`X-RateLimit-Resource`).
+'''
+
+
+# rate limit resource (as reported by the `X-RateLimit-Resource` header) of most REST requests
+CORE_RESOURCE = 'core'
+
+
+def resource_for_url(url: str) -> str:
+    '''
+    returns the rate limit resource requests to the given GitHub API url count against
+    '''
+    path = urlparse(url).path.rstrip('/')
+    if path.endswith('/graphql'):
+        return 'graphql'
+    if path.startswith('/search/') or '/api/v3/search/' in path:
+        return 'search'
+    return CORE_RESOURCE
+
+
+class _RateLimitBucket(object):
+    '''
+    rate limit state of one rate limit resource, as last reported by GitHub (all `None` if
+    unknown)
+    '''
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.blocked_until = 0
+        self.next_slot = 0
+
+
+class RateLimitScheduler(object):
+    '''
+    paces requests sent with one auth token (token buckets sized from GitHub's rate limit
+    headers). GitHub keeps separate rate limits per resource (e.g. `core` for most REST
+    requests, `graphql` and `search`) - so does the scheduler.
+
+    While plenty of the rate limit budget remains, requests are not delayed. Once less than
+    `pacing_threshold` (fraction of the limit) remains, the remaining budget is spread evenly
+    over the time until the rate limit is reset. If the budget is exhausted, or GitHub asks
+    clients to back off (secondary rate limits, affecting all resources), requests are delayed
+    accordingly (at most by `max_wait_seconds`, after which requests are sent regardless).
+
+    @param clock: returns the current (epoch) time in seconds (for testing purposes)
+    @param sleep: sleeps for the given amount of seconds (for testing purposes)
+    '''
+    # re-check state at least this often while waiting (may be changed by other threads)
+    MAX_SLEEP_SECONDS = 60
+
+    def __init__(
+        self,
+        pacing_threshold: float=0.1,
+        max_wait_seconds: float=None,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        self.pacing_threshold = pacing_threshold
+        self.max_wait_seconds = max_wait_seconds
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._buckets = collections.defaultdict(_RateLimitBucket) # resource: bucket
+        self._blocked_until = 0
+
+    def _delay(self, bucket, now):
+        '''
+        returns the amount of seconds to wait before the next request may be sent
+        (must be called while holding the lock)
+        '''
+        blocked_until = max(self._blocked_until, bucket.blocked_until)
+        if now < blocked_until:
+            return blocked_until - now
+        if bucket.remaining is None:
+            return 0
+        if now >= bucket.reset:
+            # a new rate limit window started; the budget is learnt from the next response
+            bucket.limit = bucket.remaining = bucket.reset = None
+            return 0
+        if bucket.remaining <= 0:
+            return bucket.reset - now
+        if not self._pacing(bucket):
+            return 0
+        return max(0, bucket.next_slot - now)
+
+    def _pacing(self, bucket):
+        if bucket.limit is None:
+            return True
+        return bucket.remaining <= bucket.limit * self.pacing_threshold
+
+    def _consume(self, bucket, now):
+        if bucket.remaining is None:
+            return
+        bucket.remaining -= 1
+        if bucket.remaining > 0 and self._pacing(bucket):
+            interval = (bucket.reset - now) / bucket.remaining
+            bucket.next_slot = max(now, bucket.next_slot) + interval
+
+    def acquire(self, request: requests.PreparedRequest=None):
+        '''
+        blocks until the given request may be sent, and accounts for it (requests are assumed
+        to count against the `core` resource if no request is given)
+        '''
+        resource = resource_for_url(request.url) if request is not None else CORE_RESOURCE
+        waited = 0
+        while True:
+            with self._lock:
+                bucket = self._buckets[resource]
+                now = self._clock()
+                delay = self._delay(bucket, now)
+                if self.max_wait_seconds is not None:
+                    delay = min(delay, self.max_wait_seconds - waited)
+                if delay <= 0:
+                    self._consume(bucket, now)
+                    return
+            delay = min(delay, self.MAX_SLEEP_SECONDS)
+            self._sleep(delay)
+            waited += delay
+
+    def update(self, response: requests.Response):
+        '''
+        updates the rate limit state from the given response's headers
+        '''
+        headers = response.headers
+        resource = headers.get('X-RateLimit-Resource')
+        if not resource:
+            request = response.request
+            resource = resource_for_url(request.url) if request is not None else CORE_RESOURCE
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets[resource]
+            if 'X-RateLimit-Remaining' in headers:
+                try:
+                    limit = int(headers.get('X-RateLimit-Limit', 0)) or None
+                    remaining = int(headers['X-RateLimit-Remaining'])
+                    reset = int(headers['X-RateLimit-Reset'])
+                except (KeyError, ValueError):
+                    limit = remaining = reset = None
+                if remaining is not None:
+                    if reset == bucket.reset and bucket.remaining is not None:
+                        # responses may arrive out of order; also account for requests sent
+                        # in the meantime
+                        remaining = min(remaining, bucket.remaining)
+                    bucket.limit = limit
+                    bucket.remaining = remaining
+                    bucket.reset = reset
+
+            if response.status_code in (403, 429):
+                retry_after = headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    self._blocked_until = max(self._blocked_until, now + int(retry_after))
+                elif bucket.remaining == 0 and bucket.reset:
+                    bucket.blocked_until = max(bucket.blocked_until, bucket.reset)
+
+    def remaining(self, resource: str=CORE_RESOURCE) -> float:
+        '''
+        returns the (estimated) remaining rate limit budget of the given resource (infinity if
+        unknown, zero if clients are asked to back off)
+        '''
+        with self._lock:
+            bucket = self._buckets[resource]
+            now = self._clock()
+            if now < max(self._blocked_until, bucket.blocked_until):
+                return 0
+            if bucket.remaining is None or now >= bucket.reset:
+                return float('inf')
+            return bucket.remaining
+
+
+# schedulers of tokens no longer in use are eventually evicted
+_schedulers = caching.Cache(max_size=64, name='github.ratelimit.schedulers')
+_schedulers_lock = threading.Lock()
+
+
+def scheduler(github_cfg: GithubConfig) -> RateLimitScheduler:
+    '''
+    returns the (process-wide) scheduler for requests sent with the given github_cfg's auth token
+    '''
+    token = github_cfg.credentials().auth_token() or ''
+    key = (github_cfg.api_url(), hashlib.sha256(token.encode('utf-8')).hexdigest())
+    # serialise creation, so there is only one scheduler per token at a time
+    with _schedulers_lock:
+        token_scheduler = _schedulers.get(key)
+        if token_scheduler is None:
+            token_scheduler = RateLimitScheduler()
+            _schedulers.put(key, token_scheduler)
+        return token_scheduler
@@ -31,11 +31,17 @@ from github3.repos.release import Release
 from github3.exceptions import NotFoundError, ForbiddenError
 from github3.orgs import Team
 
+import caching
+import github.ratelimit
 import util
 import product.model
 import version
 
-from http_requests import mount_default_adapter, log_stack_trace_information
+from http_requests import (
+    ConditionalRequestCache,
+    log_stack_trace_information,
+    mount_default_adapter,
+)
 from product.model import DependencyBase
 from model.github import GithubConfig
 
@@ -492,16 +498,55 @@ def github_api_ctor(github_url: str, verify_ssl: bool=True):
         return functools.partial(GitHubEnterprise, url=github_url, verify=verify_ssl)
 
 
-@functools.lru_cache()
-def github_cfg_for_hostname(cfg_factory, host_name):
+@caching.cached(max_size=32)
+def _github_cfgs_for_hostname(cfg_factory, host_name):
+    return tuple(
+        github_cfg for github_cfg in cfg_factory._cfg_elements(cfg_type_name='github')
+        if github_cfg.matches_hostname(host_name=host_name)
+    )
+
+
+def github_cfg_for_hostname(cfg_factory, host_name, balance_load: bool=False):
+    '''
+    returns the (first) github_cfg matching the given hostname
+
+    @param balance_load: if `True` and there are multiple matching github_cfgs (i.e. technical
+        users), the one with the most remaining rate limit budget is returned. Should only be
+        used for requests that may be issued by either technical user (e.g. read-only access).
+    '''
     util.not_none(host_name)
-    for github_cfg in cfg_factory._cfg_elements(cfg_type_name='github'):
-        if github_cfg.matches_hostname(host_name=host_name):
-            return github_cfg
-    raise RuntimeError('no github_cfg for {h}'.format(h=host_name))
+    github_cfgs = _github_cfgs_for_hostname(cfg_factory, host_name)
+    if not github_cfgs:
+        raise RuntimeError('no github_cfg for {h}'.format(h=host_name))
+    if not balance_load:
+        return github_cfgs[0]
+
+    # max returns the first github_cfg in case of equal budgets
+    return max(
+        github_cfgs,
+        key=lambda github_cfg: github.ratelimit.scheduler(github_cfg).remaining(),
+    )
 
 
 @functools.lru_cache()
+def _github_http_cache():
+    '''
+    returns the (process-wide) cache for GitHub API responses, or `None` if no cache directory
+    is configured (`CC_HTTP_CACHE_DIR`)
+    '''
+    context_cfg = util.ctx().Config.CONTEXT.value
+    cache_dir = context_cfg.http_cache_dir()
+    if not cache_dir:
+        return None
+
+    max_size = context_cfg.http_cache_max_size()
+    if max_size is None:
+        return ConditionalRequestCache(cache_dir=cache_dir)
+    return ConditionalRequestCache(cache_dir=cache_dir, max_size_bytes=max_size)
+
+
+# renew API objects (and thus credentials) after some time
+@caching.cached(max_size=32, ttl_seconds=3600)
 def _create_github_api_object(
     github_cfg: 'GithubConfig',
 ):
@@ -518,7 +563,11 @@ def _create_github_api_object(
     if not github_api:
         util.fail("Could not connect to GitHub-instance {url}".format(url=github_url))
 
-    session = mount_default_adapter(github_api.session)
+    session = mount_default_adapter(
+        github_api.session,
+        cache=_github_http_cache(),
+        scheduler=github.ratelimit.scheduler(github_cfg),
+    )
 
     if log_github_access:
         session.hooks['response'] = log_stack_trace_information
@@ -526,6 +575,43 @@ def _create_github_api_object(
     return github_api
 
 
+def graphql_url(github_cfg: GithubConfig):
+    '''returns the URL of the GitHub GraphQL API endpoint for the given github_cfg
+    '''
+    api_url = github_cfg.api_url().rstrip('/')
+    if api_url.endswith('/api/v3'):
+        # GitHub Enterprise
+        return api_url[:-len('/v3')] + '/graphql'
+    return api_url + '/graphql'
+
+
+def graphql_query(
+    github_api: GitHub,
+    github_cfg: GithubConfig,
+    query: str,
+    variables: dict=None,
+):
+    '''issues the given GraphQL query using the given github api object's session
+
+    @returns: the `data` attribute of the query result
+    @raises: `requests.HTTPError` on unsuccessful HTTP requests, `RuntimeError` if the query
+             result contains errors
+    '''
+    if variables is None:
+        variables = {}
+
+    response = github_api.session.post(
+        graphql_url(github_cfg=github_cfg),
+        json={'query': query, 'variables': variables},
+    )
+    response.raise_for_status()
+
+    result = response.json()
+    if result.get('errors'):
+        raise RuntimeError(f'GraphQL query failed: {result["errors"]}')
+    return result['data']
+
+
 def branches(
     github_cfg,
     repo_owner: str,
@@ -0,0 +1,245 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import collections
+import json
+import re
+import threading
+from urllib.parse import urlparse
+
+'''
+Instrumentation of HTTP requests sent through the default adapter (see
+`http_requests.mount_default_adapter`). Metrics are recorded per host, HTTP method and route
+template (the URL path with variable parts, such as ids or repository names, replaced), and can
+be exported as JSON or in Prometheus text exposition format.
+'''
+
+# upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+# (pattern, replacement) pairs applied (in order) to URL paths to determine route templates
+ROUTE_TEMPLATES = (
+    (re.compile(r'/repos/[^/]+/[^/]+'), '/repos/{owner}/{repo}'),
+    (re.compile(r'/(contents|raw|archive|tarball|zipball)/.*'), r'/\1/{path}'),
+    (re.compile(r'/git/(refs|ref|matching-refs)/.*'), r'/git/\1/{ref}'),
+    (
+        re.compile(
+            r'/(orgs|users|teams|pipelines|resources|resource-types|jobs|builds|branches|'
+            r'labels|products|groups|manifests|blobs|tags)/[^/]+'
+        ),
+        r'/\1/{name}',
+    ),
+    (re.compile(r'/[0-9a-fA-F]{7,}(?=/|$)'), '/{sha}'),
+    (re.compile(r'/\d+(?=/|$)'), '/{id}'),
+    (re.compile(r'/sha256:[0-9a-f]+'), '/{digest}'),
+)
+
+
+def route_template(url: str) -> str:
+    path = urlparse(url).path or '/'
+    for pattern, replacement in ROUTE_TEMPLATES:
+        path = pattern.sub(replacement, path)
+    return path
+
+
+class _RouteMetrics(object):
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.status_codes = collections.Counter()
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': self.errors,
+            'status_codes': {str(code): count for code, count in self.status_codes.items()},
+            'latency_seconds': {
+                'sum': self.latency_sum,
+                'buckets': {
+                    _bucket_label(bound): count
+                    for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)
+                },
+            },
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+        }
+
+
+def _bucket_label(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+class HTTPMetrics(object):
+    '''
+    thread-safe collection of HTTP request metrics (by host, method and route template)
+
+    @param max_routes_per_host: if more distinct route templates are recorded for a host, all
+        further ones are recorded as `{other}` (bounding memory usage)
+    '''
+    OTHER_ROUTE = '{other}'
+
+    def __init__(self, max_routes_per_host: int=200):
+        self.max_routes_per_host = max_routes_per_host
+        self._lock = threading.Lock()
+        self._metrics = {} # {(host, method, route): _RouteMetrics}
+        self._routes_per_host = collections.Counter()
+
+    def _route_metrics(self, host, method, url):
+        # must be called while holding the lock
+        key = (host, method, route_template(url))
+        if key in self._metrics:
+            return self._metrics[key]
+        if self._routes_per_host[host] >= self.max_routes_per_host:
+            key = (host, method, self.OTHER_ROUTE)
+            if key in self._metrics:
+                return self._metrics[key]
+        self._routes_per_host[host] += 1
+        metrics = self._metrics[key] = _RouteMetrics()
+        return metrics
+
+    def record_request(
+        self,
+        host: str,
+        method: str,
+        url: str,
+        latency_seconds: float,
+        status_code: int=None,
+        bytes_sent: int=0,
+        bytes_received: int=0,
+    ):
+        '''
+        records a sent request. `status_code` is `None` if no response was received.
+        '''
+        with self._lock:
+            metrics = self._route_metrics(host, method, url)
+            metrics.requests += 1
+            if status_code is None:
+                metrics.errors += 1
+            else:
+                metrics.status_codes[status_code] += 1
+            # buckets are cumulative (as in Prometheus)
+            for idx in range(bisect.bisect_left(LATENCY_BUCKETS, latency_seconds),
+                             len(LATENCY_BUCKETS)):
+                metrics.latency_buckets[idx] += 1
+            metrics.latency_sum += latency_seconds
+            metrics.bytes_sent += bytes_sent
+            metrics.bytes_received += bytes_received
+
+    def record_retry(self, host: str, method: str, url: str):
+        with self._lock:
+            self._route_metrics(host, method, url).retries += 1
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+            self._routes_per_host.clear()
+
+    def as_dict(self) -> dict:
+        '''
+        returns the recorded metrics as a dict {host: {'<method> <route>': metrics}}
+        '''
+        result = {}
+        with self._lock:
+            for (host, method, route), metrics in sorted(self._metrics.items()):
+                result.setdefault(host, {})[f'{method} {route}'] = metrics.as_dict()
+        return result
+
+    def as_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def as_prometheus_text(self) -> str:
+        '''
+        returns the recorded metrics in Prometheus text exposition format
+        '''
+        with self._lock:
+            items = [
+                (key, metrics.as_dict()) for key, metrics in sorted(self._metrics.items())
+            ]
+
+        lines = []
+
+        def metric(name, type_name, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {type_name}')
+            for suffix, labels, value in samples:
+                label_str = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f'{name}{suffix}{{{label_str}}} {value}')
+
+        def labels(key, *additional_labels):
+            host, method, route = key
+            return (('host', host), ('method', method), ('route', route)) + additional_labels
+
+        metric(
+            'http_client_requests_total', 'counter', 'HTTP requests sent',
+            [('', labels(key), m['requests']) for key, m in items],
+        )
+        metric(
+            'http_client_responses_total', 'counter', 'HTTP responses received by status code',
+            [
+                ('', labels(key, ('code', code)), count)
+                for key, m in items for code, count in sorted(m['status_codes'].items())
+            ],
+        )
+        metric(
+            'http_client_errors_total', 'counter', 'HTTP requests failed without response',
+            [('', labels(key), m['errors']) for key, m in items],
+        )
+        metric(
+            'http_client_retries_total', 'counter', 'HTTP request retries',
+            [('', labels(key), m['retries']) for key, m in items],
+        )
+        latency_samples = []
+        for key, m in items:
+            latency = m['latency_seconds']
+            for bound, count in latency['buckets'].items():
+                latency_samples.append(('_bucket', labels(key, ('le', bound)), count))
+            latency_samples.append(('_sum', labels(key), latency['sum']))
+            latency_samples.append(('_count', labels(key), m['requests']))
+        metric(
+            'http_client_request_duration_seconds', 'histogram', 'HTTP request latency',
+            latency_samples,
+        )
+        metric(
+            'http_client_sent_bytes_total', 'counter', 'HTTP request body bytes sent',
+            [('', labels(key), m['bytes_sent']) for key, m in items],
+        )
+        metric(
+            'http_client_received_bytes_total', 'counter', 'HTTP response body bytes received',
+            [('', labels(key), m['bytes_received']) for key, m in items],
+        )
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        '''
+        writes the recorded metrics to the given file (in Prometheus text format if the file
+        name ends with `.prom`, as JSON otherwise)
+        '''
+        if path.endswith('.prom'):
+            contents = self.as_prometheus_text()
+        else:
+            contents = self.as_json()
+        with open(path, 'w') as f:
+            f.write(contents)
+
+
+def _escape(label_value: str) -> str:
+    return str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -12,16 +12,31 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from functools import wraps
-
+from functools import lru_cache, partial, wraps
+from urllib.parse import urlparse
+
+import atexit
+import collections
+import hashlib
+import json
+import os
+import queue
+import tempfile
 import traceback
 import datetime
+import threading
+import time
 import requests
+import urllib3
 from requests.auth import HTTPBasicAuth
 from requests.adapters import HTTPAdapter
+from requests.exceptions import InvalidURL
+from requests.utils import select_proxy
+from requests.structures import CaseInsensitiveDict
 from urllib3.util.retry import Retry
 
 import ccc.elasticsearch
+from http_metrics import HTTPMetrics
 from util import warning, info, ctx
 
 
@@ -45,17 +60,465 @@ class LoggingRetry(Retry):
             f'HTTP request (host: {host}, url: {url}, method: {method}) unsuccessful. '
             f'Retries so far: {num_retries}. Retrying ...'
         )
+        if _http_metrics:
+            _http_metrics.record_retry(host=host, method=method, url=url)
         return retry
 
 
+_http_metrics = None
+
+
+def http_metrics() -> HTTPMetrics:
+    '''
+    returns the metrics recorded for requests sent through sessions with the default adapter
+    mounted (see `mount_default_adapter`), or `None` if instrumentation is not enabled
+    '''
+    return _http_metrics
+
+
+def enable_http_metrics(
+    metrics: HTTPMetrics=None,
+) -> HTTPMetrics:
+    '''
+    enables instrumentation of requests sent through sessions with the default adapter mounted
+    (process-wide). Instrumentation is enabled upon import if configured (`CC_HTTP_METRICS` or
+    `CC_HTTP_METRICS_FILE`, see `ctx`).
+
+    @param metrics: the metrics instance to record into (a new one is created if not given)
+    '''
+    global _http_metrics
+    _http_metrics = metrics or HTTPMetrics()
+    return _http_metrics
+
+
+def disable_http_metrics():
+    global _http_metrics
+    _http_metrics = None
+
+
+def _enable_configured_http_metrics():
+    context_cfg = ctx().Config.CONTEXT.value
+    metrics_file = context_cfg.http_metrics_file()
+    if not (context_cfg.http_metrics() or metrics_file):
+        return
+    metrics = enable_http_metrics()
+    if metrics_file:
+        atexit.register(metrics.write, metrics_file)
+
+
+_request_counts = collections.Counter()
+_request_counts_lock = threading.Lock()
+
+
+def request_counts():
+    '''
+    returns a snapshot of the number of HTTP requests sent (by hostname) through sessions with
+    the default adapter mounted (see `mount_default_adapter`) since the start of the process.
+    Retries are not counted separately.
+    '''
+    with _request_counts_lock:
+        return dict(_request_counts)
+
+
+class ConnectionPoolRegistry(object):
+    '''
+    hands out (process-wide) urllib3 pool managers keeping per-host pools of keep-alive
+    connections, so connections (and TLS sessions) are reused across `requests.Session`s
+    (see `mount_default_adapter`).
+
+    There is one pool manager per TLS setting (`verify` and `cert`, as passed to
+    `requests.Session.send`), as `requests` configures connection pools according to the
+    settings of the request being sent. Thus, connections are never shared between requests
+    with different TLS settings.
+
+    Per-host pools retain up to `pool_maxsize` idle connections. This should be at least the
+    number of threads concurrently sending requests to the same host (otherwise, surplus
+    connections are discarded after use); it is raised using `ensure_pool_maxsize`.
+    '''
+    def __init__(self, pool_maxsize: int=10, num_pools: int=32):
+        self._pool_maxsize = pool_maxsize
+        self._num_pools = num_pools
+        self._pool_managers = {}
+        self._lock = threading.Lock()
+
+    def pool_maxsize(self) -> int:
+        return self._pool_maxsize
+
+    def pool_manager(self, verify=True, cert=None) -> urllib3.PoolManager:
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        key = (verify, cert)
+        with self._lock:
+            pool_manager = self._pool_managers.get(key)
+            if not pool_manager:
+                pool_manager = urllib3.PoolManager(
+                    num_pools=self._num_pools,
+                    maxsize=self._pool_maxsize,
+                )
+                self._pool_managers[key] = pool_manager
+            return pool_manager
+
+    def ensure_pool_maxsize(self, pool_maxsize: int):
+        '''
+        raises the per-host pool size to (at least) the given size (also for existing pools)
+        '''
+        with self._lock:
+            if pool_maxsize <= self._pool_maxsize:
+                return
+            self._pool_maxsize = pool_maxsize
+            for pool_manager in self._pool_managers.values():
+                pool_manager.connection_pool_kw['maxsize'] = pool_maxsize
+                for key in pool_manager.pools.keys():
+                    pool = pool_manager.pools.get(key)
+                    if pool:
+                        _grow_connection_pool(pool, pool_maxsize)
+
+
+def _grow_connection_pool(pool: urllib3.HTTPConnectionPool, maxsize: int):
+    # urllib3 pools cannot be resized - so add (empty) slots to the underlying queue. This relies
+    # on urllib3 (1.26 - 2.x) internals; other pools keep their size (new pools are created
+    # with the raised size nevertheless).
+    connections = getattr(pool, 'pool', None)
+    if connections is None:
+        return # closed
+    if not isinstance(connections, queue.LifoQueue) or not isinstance(connections.queue, list):
+        return
+    with connections.mutex:
+        additional_slots = maxsize - connections.maxsize
+        if additional_slots <= 0:
+            return
+        connections.maxsize = maxsize
+        # LIFO queue: prefer existing (idle) connections over empty slots
+        connections.queue[:0] = [None] * additional_slots
+        connections.not_empty.notify(additional_slots)
+
+
+def _default_pool_maxsize():
+    pool_maxsize = ctx().Config.CONTEXT.value.http_pool_maxsize()
+    return pool_maxsize if pool_maxsize is not None else 10 # requests-library default
+
+
+_connection_pool_registry = ConnectionPoolRegistry(pool_maxsize=_default_pool_maxsize())
+
+
+def connection_pool_registry() -> ConnectionPoolRegistry:
+    return _connection_pool_registry
+
+
+def ensure_pool_maxsize(pool_maxsize: int):
+    '''
+    ensures shared connection pools retain (at least) the given amount of connections per
+    host. Should be called by components sending requests from the given amount of threads.
+    '''
+    _connection_pool_registry.ensure_pool_maxsize(pool_maxsize)
+
+
+# requests < 2.32 does not pass TLS settings when retrieving connections (so pools cannot be
+# chosen according to them)
+_SHARED_CONNECTIONS_SUPPORTED = hasattr(HTTPAdapter, 'get_connection_with_tls_context')
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    def __init__(self, *args, scheduler=None, pool_registry=None, **kwargs):
+        self.scheduler = scheduler
+        self.pool_registry = pool_registry
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        # may be called before __init__ has run (also when unpickling)
+        pool_registry = getattr(self, 'pool_registry', None)
+        if not pool_registry or block or pool_kwargs:
+            return super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+        # save these values for pickling (see super().init_poolmanager)
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+
+        pool_registry.ensure_pool_maxsize(maxsize)
+        self.poolmanager = pool_registry.pool_manager()
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        if not getattr(self, 'pool_registry', None) or select_proxy(request.url, proxies):
+            return super().get_connection_with_tls_context(
+                request,
+                verify,
+                proxies=proxies,
+                cert=cert,
+            )
+
+        # requests configures pools according to the TLS settings of the request being sent (see
+        # HTTPAdapter.cert_verify) - so use separate pools per TLS setting
+        try:
+            host_params, pool_kwargs = self.build_connection_pool_key_attributes(
+                request,
+                verify,
+                cert,
+            )
+        except ValueError as e:
+            raise InvalidURL(e, request=request)
+        pool_manager = self.pool_registry.pool_manager(verify=verify, cert=cert)
+        return pool_manager.connection_from_host(**host_params, pool_kwargs=pool_kwargs)
+
+    def close(self):
+        if not getattr(self, 'pool_registry', None):
+            return super().close()
+        # do not close shared connections
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
+
+    def send(self, request, stream=False, *args, **kwargs):
+        hostname = urlparse(request.url).hostname
+        with _request_counts_lock:
+            _request_counts[hostname] += 1
+
+        if self.scheduler:
+            self.scheduler.acquire(request)
+        metrics = _http_metrics
+        if metrics:
+            response = self._send_instrumented(metrics, hostname, request, stream, *args, **kwargs)
+        else:
+            response = super().send(request, stream, *args, **kwargs)
+        if self.scheduler:
+            self.scheduler.update(response)
+        return response
+
+    def _send_instrumented(self, metrics, hostname, request, stream, *args, **kwargs):
+        body = request.body
+        if isinstance(body, (str, bytes)):
+            bytes_sent = len(body)
+        else:
+            bytes_sent = int(request.headers.get('Content-Length', 0))
+
+        start = time.monotonic()
+        try:
+            response = super().send(request, stream, *args, **kwargs)
+        except Exception:
+            metrics.record_request(
+                host=hostname,
+                method=request.method,
+                url=request.url,
+                latency_seconds=time.monotonic() - start,
+                bytes_sent=bytes_sent,
+            )
+            raise
+
+        if stream:
+            bytes_received = int(response.headers.get('Content-Length', 0))
+        else:
+            # read response body (would be done by requests.Session anyway)
+            bytes_received = len(response.content)
+        metrics.record_request(
+            host=hostname,
+            method=request.method,
+            url=request.url,
+            latency_seconds=time.monotonic() - start,
+            status_code=response.status_code,
+            bytes_sent=bytes_sent,
+            bytes_received=bytes_received,
+        )
+        return response
+
+
+class ConditionalRequestCache(object):
+    '''
+    Size-bounded on-disk cache of HTTP responses carrying validators (`ETag` and/or
+    `Last-Modified` headers). Cached responses are revalidated using conditional requests
+    (see `mount_default_adapter`); servers respond with `304 Not Modified` if they did not
+    change (which, in case of GitHub, do not count against the rate limit).
+
+    Entries are keyed by URL and the `Authorization` and `Accept` request headers. If the
+    cache grows beyond `max_size_bytes`, least recently used entries are evicted. The cache
+    directory may be shared between processes.
+    '''
+    # request headers responses may vary on
+    VARY_HEADERS = ('Authorization', 'Accept')
+    # response headers not to be stored (cached bodies are stored decoded)
+    IGNORED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+    def __init__(self, cache_dir: str, max_size_bytes: int=256 * 1024 * 1024):
+        self.cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = self._disk_size()
+
+    def _entries(self):
+        '''
+        returns (path, mtime, size) of all cache entries
+        '''
+        entries = []
+        with os.scandir(self.cache_dir) as dir_entries:
+            for dir_entry in dir_entries:
+                if dir_entry.name.startswith('.'):
+                    continue # temporary file
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue # removed concurrently
+                entries.append((dir_entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _disk_size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def key(self, request: requests.PreparedRequest):
+        digest = hashlib.sha256(request.url.encode('utf-8'))
+        for header in self.VARY_HEADERS:
+            digest.update(b'\0' + request.headers.get(header, '').encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        '''
+        returns the cached entry (a dict with `headers` and `content`) or `None`
+        '''
+        path = os.path.join(self.cache_dir, key)
+        try:
+            with open(path, 'rb') as f:
+                metadata = json.loads(f.readline().decode('utf-8'))
+                content = f.read()
+            # mark as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return {'headers': metadata['headers'], 'content': content}
+
+    def put(self, key: str, response: requests.Response):
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in self.IGNORED_HEADERS
+        }
+        data = json.dumps({'url': response.url, 'headers': headers}).encode('utf-8') + b'\n'
+        data += response.content
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.cache_dir, key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._size += len(data)
+            if self._size > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self):
+        # other processes may share the cache directory - so re-determine actual size
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        size = sum(size for _, _, size in entries)
+        # evict down to 90% of the max size, so eviction does not happen upon each insertion
+        target_size = self.max_size_bytes * 0.9
+        for path, _, entry_size in entries:
+            if size <= target_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue # removed concurrently
+            size -= entry_size
+        self._size = size
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+class _ConditionalCachingHTTPAdapter(_CountingHTTPAdapter):
+    def __init__(self, cache: ConditionalRequestCache, *args, **kwargs):
+        self.cache = cache
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, stream=False, *args, **kwargs):
+        # only plain GET requests are cached; requests that are already conditional are left
+        # to the caller
+        if request.method != 'GET' or stream or \
+                'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers:
+            return super().send(request, stream, *args, **kwargs)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry:
+            cached_headers = CaseInsensitiveDict(entry['headers'])
+            if 'ETag' in cached_headers:
+                request.headers['If-None-Match'] = cached_headers['ETag']
+            if 'Last-Modified' in cached_headers:
+                request.headers['If-Modified-Since'] = cached_headers['Last-Modified']
+
+        response = super().send(request, stream, *args, **kwargs)
+
+        if response.status_code == 304 and entry:
+            self.cache.record(hit=True)
+            return self._cached_response(request, response, entry)
+
+        self.cache.record(hit=False)
+        if response.status_code == 200 and \
+                ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self.cache.put(key, response)
+
+        return response
+
+    def _cached_response(self, request, not_modified_response, entry):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        # pass on current (e.g. rate limit) headers
+        for name, value in not_modified_response.headers.items():
+            if name.lower() not in ConditionalRequestCache.IGNORED_HEADERS:
+                response.headers[name] = value
+        response._content = entry['content']
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = not_modified_response.elapsed
+        response.from_cache = True
+        not_modified_response.close()
+        return response
+
+
 def mount_default_adapter(
     session: requests.Session,
     connection_pool_cache_size=10, # requests-library default
     max_pool_size=10, # requests-library default
+    cache: ConditionalRequestCache=None,
+    scheduler=None,
+    share_connections: bool=True,
 ):
-    default_http_adapter = HTTPAdapter(
+    '''
+    mounts an adapter with retry-semantics to the given session.
+
+    By default, connections are pooled process-wide (see `ConnectionPoolRegistry`), so they are
+    kept alive and shared between sessions (requires requests >= 2.32). In this case,
+    `max_pool_size` is the minimum per-host pool size (also affecting other sessions), and
+    `connection_pool_cache_size` is ignored.
+
+    @param cache: if given, responses of GET requests are cached and revalidated using
+        conditional requests
+    @param scheduler: if given, requests are paced by it (an object offering `acquire(request)`,
+        which is called before each request, and `update(response)`, e.g.
+        `github.ratelimit.RateLimitScheduler`)
+    '''
+    if not _SHARED_CONNECTIONS_SUPPORTED:
+        share_connections = False
+    if cache:
+        adapter_type = partial(_ConditionalCachingHTTPAdapter, cache)
+    else:
+        adapter_type = _CountingHTTPAdapter
+    default_http_adapter = adapter_type(
         pool_connections = connection_pool_cache_size,
         pool_maxsize = max_pool_size,
+        scheduler = scheduler,
+        pool_registry = _connection_pool_registry if share_connections else None,
         max_retries = LoggingRetry(
             total=3,
             connect=3,
@@ -74,19 +537,39 @@ def mount_default_adapter(
     return session
 
 
+_STACK_TRACE_ELS_INDEX = 'github_access_stacktrace'
+_STACK_TRACE_ELS_CFG_NAME = 'sap_internal'
+
+
+@lru_cache()
+def _stack_trace_shipper():
+    '''
+    returns the (process-wide) shipper for stack trace information, or `None` if there is no
+    elasticsearch cfg
+    '''
+    try:
+        elastic_cfg = ctx().cfg_factory().elasticsearch(_STACK_TRACE_ELS_CFG_NAME)
+    except KeyError:
+        # do nothing: external concourse does not have els config
+        return None
+
+    shipper = ccc.elasticsearch.BulkDocumentShipper(
+        client=ccc.elasticsearch.from_cfg(elasticsearch_cfg=elastic_cfg),
+        index=_STACK_TRACE_ELS_INDEX,
+    )
+    atexit.register(shipper.close)
+    return shipper
+
+
 def log_stack_trace_information(resp, *args, **kwargs):
     '''
-    This function stores the current stacktrace in elastic search.
+    This function stores the current stacktrace in elastic search (asynchronously, see
+    `ccc.elasticsearch.BulkDocumentShipper`).
     It must not return anything, otherwise the return value is assumed to replace the response
     '''
     try:
-        els_index = "github_access_stacktrace"
-        els_config = "sap_internal"
-
-        try:
-            elastic_cfg = ctx().cfg_factory().elasticsearch(els_config)
-        except KeyError:
-            # do nothing: external concourse does not have els config
+        shipper = _stack_trace_shipper()
+        if not shipper:
             return
 
         now = datetime.datetime.utcnow()
@@ -97,11 +580,7 @@ def log_stack_trace_information(resp, *args, **kwargs):
             'stacktrace': traceback.format_stack()
         }
 
-        elastic_client = ccc.elasticsearch.from_cfg(elasticsearch_cfg=elastic_cfg)
-        elastic_client.store_document(
-            index=els_index,
-            body=json_body
-        )
+        shipper.submit(json_body)
 
     except Exception as e:
         info(f'Could not log stack trace information: {e}')
@@ -223,3 +702,6 @@ class AuthenticatedRequestBuilder(object):
                 return_type=None,
                 **kwargs
         )
+
+
+_enable_configured_http_metrics()
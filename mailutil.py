@@ -237,6 +237,7 @@ def _codeowners_parser_from_component_name(component_name: str, branch_name='mas
     github_cfg = github.util.github_cfg_for_hostname(
         cfg_factory=ctx().cfg_factory(),
         host_name=component_name.github_host(),
+        balance_load=True,
     )
     github_api = github.util._create_github_api_object(github_cfg=github_cfg)
 
@@ -15,9 +15,12 @@
 
 import functools
 import os
+import pickle
 import sys
 import json
 import pkgutil
+import tempfile
+import threading
 
 from model.base import (
     ConfigElementNotFoundError,
@@ -29,6 +32,7 @@ from util import (
     existing_dir,
     not_none,
     not_empty,
+    warning,
 )
 
 '''
@@ -63,29 +67,55 @@ class ConfigFactory(object):
     CFG_TYPES = 'cfg_types'
 
     @staticmethod
-    def from_cfg_dir(cfg_dir: str, cfg_types_file='config_types.yaml'):
+    def from_cfg_dir(
+        cfg_dir: str,
+        cfg_types_file='config_types.yaml',
+        snapshot_file: str=None,
+    ):
+        '''
+        creates a `ConfigFactory` from the given configuration directory. The cfg file of a
+        cfg_type is parsed lazily (i.e. when the cfg_type is first used).
+
+        @param snapshot_file: optional path of a (binary) snapshot of the fully parsed
+            configuration. If the snapshot is valid for the current sizes and modification
+            times of all cfg files, it is read instead of parsing them. Otherwise, all cfg
+            files are parsed and the snapshot is rewritten. Only use trusted snapshot files
+            (snapshots are pickled).
+        '''
         cfg_dir = existing_dir(os.path.abspath(cfg_dir))
-        cfg_types_dict = parse_yaml_file(os.path.join(cfg_dir, cfg_types_file))
+        cfg_types_path = os.path.join(cfg_dir, cfg_types_file)
+
+        if snapshot_file:
+            raw = _read_cfg_snapshot(snapshot_file, cfg_types_path)
+            if raw is not None:
+                return ConfigFactory(raw_dict=raw)
+
+        cfg_types_dict = parse_yaml_file(cfg_types_path)
         raw = {}
 
         raw[ConfigFactory.CFG_TYPES] = cfg_types_dict
 
-        def parse_cfg(cfg_type):
+        def cfg_file(cfg_type):
             # assume for now that there is exactly one cfg source (file)
             cfg_sources = list(cfg_type.sources())
             if not len(cfg_sources) == 1:
                 raise ValueError('currently, only exactly one cfg file is supported per type')
 
-            cfg_file = cfg_sources[0].file()
-            parsed_cfg =  parse_yaml_file(os.path.join(cfg_dir, cfg_file))
-            return parsed_cfg
+            return os.path.join(cfg_dir, cfg_sources[0].file())
+
+        cfg_files = {
+            cfg_type.cfg_type_name(): cfg_file(cfg_type)
+            for cfg_type in map(ConfigType, cfg_types_dict.values())
+        }
 
-        # parse all configurations
-        for cfg_type in map(ConfigType, cfg_types_dict.values()):
-            cfg_name = cfg_type.cfg_type_name()
-            raw[cfg_name] = parse_cfg(cfg_type)
+        if snapshot_file:
+            # parse all configurations
+            for cfg_name, cfg_path in cfg_files.items():
+                raw[cfg_name] = parse_yaml_file(cfg_path)
+            _write_cfg_snapshot(snapshot_file, cfg_types_path, cfg_files.values(), raw)
+            return ConfigFactory(raw_dict=raw)
 
-        return ConfigFactory(raw_dict=raw)
+        return ConfigFactory(raw_dict=raw, cfg_files=cfg_files)
 
     @staticmethod
     def from_dict(raw_dict: dict):
@@ -93,19 +123,53 @@ class ConfigFactory(object):
 
         return ConfigFactory(raw_dict=raw)
 
-    def __init__(self, raw_dict: dict):
+    def __init__(self, raw_dict: dict, cfg_files: dict=None):
+        '''
+        @param cfg_files: optional mapping from cfg_type names to the cfg files to parse (on
+            first use) for cfg_types absent from `raw_dict`
+        '''
         self.raw = not_none(raw_dict)
         if self.CFG_TYPES not in self.raw:
             raise ValueError('missing required attribute: {ct}'.format(ct=self.CFG_TYPES))
+        self._cfg_files = cfg_files or {}
+        self._init_caches()
+
+    def _init_caches(self):
+        # {(cfg_type_name, cfg_name): (raw_dict, element)}
+        self._elements = {}
+        # (raw cfg_types dict, {cfg_type_name: ConfigType})
+        self._cfg_types_cache = (None, None)
+        self._cfg_files_lock = threading.Lock()
+
+    def __getstate__(self):
+        # do not pickle memoised elements
+        state = dict(self.__dict__)
+        del state['_elements']
+        del state['_cfg_types_cache']
+        del state['_cfg_files_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_caches()
 
     def _configs(self, cfg_name: str):
+        if cfg_name not in self.raw and cfg_name in self._cfg_files:
+            with self._cfg_files_lock:
+                if cfg_name not in self.raw:
+                    self.raw[cfg_name] = parse_yaml_file(self._cfg_files[cfg_name])
         return self.raw[cfg_name]
 
     def _cfg_types(self):
-        return {
-            cfg.cfg_type_name(): cfg for
-            cfg in map(ConfigType, self.raw[self.CFG_TYPES].values())
-        }
+        cfg_types_raw = self.raw[self.CFG_TYPES]
+        cached_raw, cfg_types = self._cfg_types_cache
+        if cached_raw is not cfg_types_raw:
+            cfg_types = {
+                cfg.cfg_type_name(): cfg for
+                cfg in map(ConfigType, cfg_types_raw.values())
+            }
+            self._cfg_types_cache = (cfg_types_raw, cfg_types)
+        return cfg_types
 
     def _cfg_types_raw(self):
         return self.raw[self.CFG_TYPES]
@@ -134,45 +198,7 @@ class ConfigFactory(object):
         if not cfg_type:
             raise ValueError('unknown cfg_type: ' + str(cfg_type_name))
 
-        # retrieve model class c'tor - search module and sub-modules
-        # TODO: switch to fully-qualified type names
-        own_module = sys.modules[__name__]
-
-        # python3.5 returns a three-tuple; python3.6+ returns a ModuleInfo
-        if sys.version_info.minor <= 5:
-            class ModuleInfo(object):
-                def __init__(self, module_tuple):
-                    self.path, self.name, _ = module_tuple
-
-            def to_module_info(mi):
-                return ModuleInfo(mi)
-        else:
-            def to_module_info(mi):
-                return mi
-
-        submodule_names = [
-            own_module.__name__ + '.' + m.name
-            for m in map(to_module_info, pkgutil.iter_modules(own_module.__path__))
-        ]
-        for module_name in [__name__] + submodule_names:
-            submodule_name = module_name.split('.')[-1]
-            if module_name != __name__:
-                module = getattr(__import__(module_name), submodule_name)
-            else:
-                module = sys.modules[submodule_name]
-
-            # skip if module does not define our type
-            if not hasattr(module, cfg_type.cfg_type()):
-                continue
-
-            # if type is defined, validate
-            element_type = getattr(module, cfg_type.cfg_type())
-            if not type(element_type) == type:
-                raise ValueError()
-            # found it
-            break
-        else:
-            raise ValueError('failed to find cfg type: ' + str(cfg_type.cfg_type()))
+        element_type = _element_type(cfg_type.cfg_type())
 
         # for now, let's assume all of our model element types are subtypes of NamedModelElement
         # (with the exception of ConfigurationSet)
@@ -183,7 +209,15 @@ class ConfigFactory(object):
                 es=', '.join(configs.keys())
             )
             )
-        kwargs = {'raw_dict': configs[cfg_name]}
+        raw_dict = configs[cfg_name]
+
+        # elements are memoised as long as their raw dict is not replaced
+        cache_key = (cfg_type_name, cfg_name)
+        cached = self._elements.get(cache_key)
+        if cached and cached[0] is raw_dict:
+            return cached[1]
+
+        kwargs = {'raw_dict': raw_dict}
 
         if element_type == ConfigurationSet:
             kwargs.update({'cfg_name': cfg_name, 'cfg_factory': self})
@@ -192,6 +226,7 @@ class ConfigFactory(object):
 
         element_instance = element_type(**kwargs)
         element_instance.validate()
+        self._elements[cache_key] = (raw_dict, element_instance)
         return element_instance
 
     def _cfg_elements(self, cfg_type_name: str):
@@ -243,12 +278,15 @@ class ConfigFactory(object):
                 c = cfg_type_name,
                 k = ', '.join(known_types.keys()),
             ))
-        if cfg_type_name in self.raw:
-            return set(self.raw[cfg_type_name].keys())
+        if cfg_type_name in self.raw or cfg_type_name in self._cfg_files:
+            return set(self._configs(cfg_type_name).keys())
         else:
             return set()
 
     def __getattr__(self, cfg_type_name):
+        if cfg_type_name.startswith('__'):
+            # do not resolve special attributes (e.g. looked up by pickle before unpickling)
+            raise AttributeError(cfg_type_name)
         for cfg_type in self._cfg_types().values():
             if cfg_type.factory_method() == cfg_type_name:
                 break
@@ -258,6 +296,104 @@ class ConfigFactory(object):
         return functools.partial(self._cfg_element, cfg_type_name)
 
 
+_CFG_SNAPSHOT_VERSION = 1
+
+
+def _cfg_files_stats(paths):
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append((path, stat.st_mtime_ns, stat.st_size))
+    return stats
+
+
+def _read_cfg_snapshot(snapshot_file: str, cfg_types_path: str):
+    '''
+    returns the raw configuration stored in the given snapshot file, or `None` if it is absent,
+    unreadable or outdated
+    '''
+    try:
+        with open(snapshot_file, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot['version'] != _CFG_SNAPSHOT_VERSION:
+            return None
+        if snapshot['cfg_types_path'] != cfg_types_path:
+            return None
+        paths = [path for path, _, _ in snapshot['stats']]
+        if _cfg_files_stats(paths) != snapshot['stats']:
+            return None
+        return snapshot['raw']
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        warning(f'ignoring unreadable cfg snapshot {snapshot_file}: {e}')
+        return None
+
+
+def _write_cfg_snapshot(snapshot_file: str, cfg_types_path: str, cfg_paths, raw: dict):
+    paths = [cfg_types_path] + sorted(set(cfg_paths))
+    snapshot = {
+        'version': _CFG_SNAPSHOT_VERSION,
+        'cfg_types_path': cfg_types_path,
+        'stats': _cfg_files_stats(paths),
+        'raw': raw,
+    }
+    snapshot_dir = os.path.dirname(os.path.abspath(snapshot_file))
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, snapshot_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        warning(f'failed to write cfg snapshot {snapshot_file}: {e}')
+
+
+def _model_module_names():
+    # python3.5 returns a three-tuple; python3.6+ returns a ModuleInfo
+    def module_name(module_info):
+        if sys.version_info.minor <= 5:
+            return module_info[1]
+        return module_info.name
+
+    own_module = sys.modules[__name__]
+    return [__name__] + [
+        own_module.__name__ + '.' + module_name(m)
+        for m in pkgutil.iter_modules(own_module.__path__)
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _element_type(type_name: str):
+    '''
+    returns the model element type of the given name, searching this module and its sub-modules
+    (resolved types are memoised, so modules are searched and imported only once per type)
+    '''
+    # TODO: switch to fully-qualified type names
+    for module_name in _model_module_names():
+        submodule_name = module_name.split('.')[-1]
+        if module_name != __name__:
+            module = getattr(__import__(module_name), submodule_name)
+        else:
+            module = sys.modules[submodule_name]
+
+        # skip if module does not define our type
+        if not hasattr(module, type_name):
+            continue
+
+        # if type is defined, validate
+        element_type = getattr(module, type_name)
+        if not type(element_type) == type:
+            raise ValueError()
+        return element_type
+
+    raise ValueError('failed to find cfg type: ' + str(type_name))
+
+
 class ConfigType(ModelBase):
     '''
     represents a configuration type (used for serialisation and deserialisation)
@@ -413,6 +549,9 @@ class ConfigurationSet(NamedModelElement):
             return cfg_name
 
     def __getattr__(self, cfg_type_name):
+        if cfg_type_name.startswith('__'):
+            # do not resolve special attributes (e.g. looked up by pickle before unpickling)
+            raise AttributeError(cfg_type_name)
         if not hasattr(self.cfg_factory, cfg_type_name):
             raise AttributeError(cfg_type_name)
         factory_method = getattr(self.cfg_factory, cfg_type_name)
@@ -54,7 +54,8 @@ class ModelValidationMixin(object):
             )
 
     def _validate_known_attributes(self):
-        unknown_attributes = [a for a in self.raw if a not in self._known_attributes()]
+        known_attributes = self._known_attributes()
+        unknown_attributes = [a for a in self.raw if a not in known_attributes]
         if unknown_attributes:
             raise ModelValidationError(
                 '{c}:{e}: the following attributes are unknown: {m}'.format(
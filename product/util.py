@@ -22,8 +22,14 @@ import semver
 import typing
 import yaml
 
+import caching
 import version
-from github.util import GitHubRepositoryHelper, github_api_ctor
+from github.util import (
+    GitHubRepositoryHelper,
+    _create_github_api_object,
+    github_api_ctor,
+    github_cfg_for_hostname,
+)
 from util import not_none, check_type, FluentIterable
 from .model import (
     COMPONENT_DESCRIPTOR_ASSET_NAME,
@@ -33,6 +39,14 @@ from .model import (
 )
 
 
+@caching.cached(max_size=32)
+def _anonymous_github_api(host_name):
+    # hard-code schema to https
+    url = 'https://' + host_name
+    ctor = github_api_ctor(github_url=url)
+    return ctor()
+
+
 class ComponentResolutionException(Exception):
     def __init__(self, msg, component_reference):
         self.msg = msg
@@ -52,21 +66,19 @@ class ResolverBase(object):
     ):
         self.cfg_factory=cfg_factory
 
-    @functools.lru_cache()
     def _github_cfg_for_hostname(self, host_name):
-        not_none(host_name)
-        for github_cfg in self.cfg_factory._cfg_elements(cfg_type_name='github'):
-            if github_cfg.matches_hostname(host_name=host_name):
-                return github_cfg
-        raise RuntimeError('no github_cfg for {h}'.format(host_name))
+        # component resolution is read-only - so any technical user will do
+        return github_cfg_for_hostname(
+            cfg_factory=self.cfg_factory,
+            host_name=host_name,
+            balance_load=True,
+        )
 
-    @functools.lru_cache()
     def _github_api_for_hostname(self, host_name):
         not_none(host_name)
-        # hard-code schema to https
-        url = 'https://' + host_name
-        ctor = github_api_ctor(github_url=url)
-        return ctor()
+        if self.cfg_factory:
+            return _create_github_api_object(self._github_cfg_for_hostname(host_name=host_name))
+        return _anonymous_github_api(host_name=host_name)
 
     def _repository_helper(self, component_reference):
         if isinstance(component_reference, tuple):
@@ -79,18 +91,11 @@ class ResolverBase(object):
                 name=component_reference.github_repo(),
         )
 
-        if self.cfg_factory:
-            return gh_helper_ctor(
-                github_cfg=self._github_cfg_for_hostname(
-                    host_name=component_reference.github_host(),
-                )
-            )
-        else:
-            return gh_helper_ctor(
-                github_api=self._github_api_for_hostname(
-                    host_name=component_reference.github_host(),
-                )
+        return gh_helper_ctor(
+            github_api=self._github_api_for_hostname(
+                host_name=component_reference.github_host(),
             )
+        )
 
 
 class ComponentDescriptorResolver(ResolverBase):
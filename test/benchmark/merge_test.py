@@ -0,0 +1,29 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from benchmark.merge import run_benchmark
+
+
+class MergeBenchmarkTest(unittest.TestCase):
+    def test_benchmark_smoke(self):
+        # raises if results differ from the legacy implementation
+        result = run_benchmark(variants=3, steps=3, list_length=5, iterations=1)
+
+        self.assertEqual(
+            set(result['results']),
+            {'legacy', 'merge_dicts', 'merge_dicts_shared'},
+        )
@@ -0,0 +1,65 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import unittest
+import unittest.mock
+
+import util
+
+from benchmark.replication import run_benchmark, synthetic_organisations
+
+
+class SyntheticOrganisationsTest(unittest.TestCase):
+    def test_synthetic_organisations(self):
+        organisations = synthetic_organisations(
+            organisations=2,
+            repositories=3,
+            branches=3,
+            branch_cfg_ratio=1.0,
+        )
+
+        self.assertEqual(set(organisations), {'org-0', 'org-1'})
+        repository = organisations['org-0']['repo-0']
+        self.assertIsNotNone(repository['branch_cfg'])
+        self.assertEqual(set(repository['branches']), {'feature', 'master', 'rel-1', 'rel-2'})
+
+
+@unittest.skipUnless(shutil.which('openssl'), 'openssl required for fake concourse')
+class ReplicationBenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        # other tests may leave incomplete cli args behind (which are consulted e.g. by
+        # `util._verbose`)
+        ctx_args_patcher = unittest.mock.patch.object(util.ctx(), 'args', None)
+        ctx_args_patcher.start()
+        self.addCleanup(ctx_args_patcher.stop)
+
+    def test_benchmark_smoke(self):
+        for graphql_enumeration in (False, True):
+            result = run_benchmark(
+                repositories=2,
+                branches=2,
+                variants=1,
+                branch_cfg_ratio=1.0,
+                runs=2,
+                graphql_enumeration=graphql_enumeration,
+            )
+
+            self.assertEqual(len(result['runs']), 2)
+            for run in result['runs']:
+                # master and rel-1 for each repository
+                self.assertEqual(run['pipelines'], 4)
+                self.assertGreater(run['pipelines_per_second'], 0)
+                self.assertEqual(run['pipeline_latencies']['deploy']['count'], 4)
@@ -0,0 +1,162 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+
+import caching as examinee
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class CacheTest(unittest.TestCase):
+    def test_get_and_put(self):
+        cache = examinee.Cache(max_size=2)
+
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b', 'default'), 'default')
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 2, 1))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = examinee.Cache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats().evictions, 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = examinee.Cache(ttl_seconds=10, clock=clock)
+        cache.put('a', 1)
+
+        clock.now = 9
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 10
+        self.assertIsNone(cache.get('a'))
+
+        stats = cache.stats()
+        self.assertEqual((stats.expirations, stats.size), (1, 0))
+
+    def test_invalidate(self):
+        cache = examinee.Cache()
+        cache.put('a', 1)
+
+        self.assertTrue(cache.invalidate('a'))
+        self.assertFalse(cache.invalidate('a'))
+        self.assertIsNone(cache.get('a'))
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            examinee.Cache(max_size=0)
+        with self.assertRaises(ValueError):
+            examinee.Cache(ttl_seconds=0)
+
+    def test_named_caches_are_registered(self):
+        cache = examinee.Cache(name='caching_test.named')
+        cache.put('a', 1)
+        cache.get('a')
+
+        self.assertIs(examinee.caches()['caching_test.named'], cache)
+        self.assertEqual(examinee.stats()['caching_test.named'].hits, 1)
+
+    def test_concurrent_access(self):
+        cache = examinee.Cache(max_size=10)
+
+        def access():
+            for i in range(1000):
+                cache.put(i % 20, i)
+                cache.get((i + 1) % 20)
+
+        threads = [threading.Thread(target=access) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        self.assertEqual(stats.hits + stats.misses, 4000)
+        self.assertEqual(stats.size, 10)
+
+
+class CachedTest(unittest.TestCase):
+    def test_results_are_cached_per_arguments(self):
+        calls = []
+
+        @examinee.cached(max_size=8)
+        def square(x, offset=0):
+            calls.append((x, offset))
+            return x * x + offset
+
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(2, offset=1), 5)
+        self.assertEqual(square(2, offset=1), 5)
+        self.assertEqual(calls, [(2, 0), (2, 1)])
+
+        stats = square.cache_info()
+        self.assertEqual((stats.hits, stats.misses), (2, 2))
+        self.assertIn(square.__qualname__, ''.join(examinee.caches().keys()))
+
+    def test_cache_invalidate_and_clear(self):
+        calls = []
+
+        @examinee.cached()
+        def identity(x):
+            calls.append(x)
+            return x
+
+        identity(1)
+        identity(2)
+        self.assertTrue(identity.cache_invalidate(1))
+        identity(1)
+        identity(2)
+        self.assertEqual(calls, [1, 2, 1])
+
+        identity.cache_clear()
+        identity(2)
+        self.assertEqual(calls, [1, 2, 1, 2])
+
+    def test_methods(self):
+        class Examinee(object):
+            def __init__(self):
+                self.calls = 0
+
+            @examinee.cached(max_size=4)
+            def value(self):
+                self.calls += 1
+                return self.calls
+
+        first = Examinee()
+        second = Examinee()
+        self.assertEqual(first.value(), 1)
+        self.assertEqual(first.value(), 1)
+        self.assertEqual(second.value(), 1)
+        self.assertEqual(first.calls + second.calls, 2)
@@ -0,0 +1,95 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+
+import ccc.elasticsearch as examinee
+
+
+class FakeClient(object):
+    def __init__(self, block: threading.Event=None, fail: bool=False):
+        self.batches = []
+        self.block = block
+        self.fail = fail
+
+    def store_documents(self, index, body):
+        if self.block:
+            self.block.wait()
+        if self.fail:
+            raise RuntimeError('unavailable')
+        self.batches.append((index, list(body)))
+
+
+class BulkDocumentShipperTest(unittest.TestCase):
+    def test_documents_are_shipped_in_batches(self):
+        client = FakeClient()
+        shipper = examinee.BulkDocumentShipper(
+            client=client,
+            index='idx',
+            batch_size=2,
+            flush_interval_seconds=60,
+        )
+        for i in range(5):
+            self.assertTrue(shipper.submit({'i': i}))
+        shipper.close()
+
+        self.assertEqual({index for index, _ in client.batches}, {'idx'})
+        self.assertEqual(
+            [document['i'] for _, batch in client.batches for document in batch],
+            list(range(5)),
+        )
+        self.assertTrue(all(len(batch) <= 2 for _, batch in client.batches))
+        self.assertEqual(shipper.stats()['shipped'], 5)
+
+    def test_documents_are_shipped_after_flush_interval(self):
+        client = FakeClient()
+        shipper = examinee.BulkDocumentShipper(
+            client=client,
+            index='idx',
+            flush_interval_seconds=0.01,
+        )
+        shipper.submit({'i': 0})
+        shipper._thread.join(timeout=0.5) # never finishes (unless closed)
+
+        self.assertEqual(client.batches, [('idx', [{'i': 0}])])
+        shipper.close()
+
+    def test_documents_are_dropped_if_queue_is_full(self):
+        block = threading.Event()
+        client = FakeClient(block=block)
+        shipper = examinee.BulkDocumentShipper(
+            client=client,
+            index='idx',
+            max_queue_size=2,
+            batch_size=1,
+            flush_interval_seconds=0.01,
+        )
+        accepted = [shipper.submit({'i': i}) for i in range(10)]
+        block.set()
+        shipper.close()
+
+        stats = shipper.stats()
+        self.assertEqual(stats['dropped'], accepted.count(False))
+        self.assertGreater(stats['dropped'], 0)
+        self.assertEqual(stats['shipped'], accepted.count(True))
+
+    def test_failures_are_counted(self):
+        shipper = examinee.BulkDocumentShipper(client=FakeClient(fail=True), index='i')
+        shipper.submit({})
+        shipper.close()
+
+        self.assertEqual(shipper.stats()['failed'], 1)
+        self.assertFalse(shipper.submit({}))
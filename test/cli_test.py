@@ -39,3 +39,22 @@ def test_smoke():
     assert result.returncode == 0
     assert result.stderr.strip() == ''
     assert result.stdout.strip().startswith('usage: cli.py config')
+
+
+def test_invoked_module():
+    import cli
+    module_names = {'config', 'githubutil'}
+
+    assert cli.invoked_module(['config', 'attribute'], module_names) == 'config'
+    assert cli.invoked_module(['--cfg-dir', 'x', '--quiet', 'config'], module_names) == 'config'
+    assert cli.invoked_module(['-h'], module_names) is None
+    assert cli.invoked_module(['unknown'], module_names) is None
+
+
+def test_cli_module_manifest():
+    import cli
+    manifest = cli.cli_module_manifest(os.path.join(SRC_DIR, 'cli'))
+
+    assert 'config' in manifest
+    assert 'model_element' in manifest['config']
+    assert '__add_module_command_args' not in manifest['config']
@@ -13,9 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import threading
+import time
 import unittest
+from unittest.mock import MagicMock, patch
 
+import concourse.client.api
 from concourse.client import routes
+from concourse.client.api import ConcourseApiBase, _normalise_pipeline_cfg
+from concourse.client.model import SetPipelineResult
+from http_requests import AuthenticatedRequestBuilder
 
 
 class ConcourseApiRoutesBaseTest(unittest.TestCase):
@@ -127,3 +135,178 @@ class ConcourseApiRoutesV4Test(unittest.TestCase):
             self.examinee.login(),
             'https://cc.v4/sky/token'
         )
+
+
+class NormalisePipelineCfgTest(unittest.TestCase):
+    def test_empty_values_are_removed(self):
+        cfg = {
+            'resources': [{'name': 'foo', 'check_every': '', 'webhook_token': None}],
+            'jobs': [{'name': 'bar', 'serial': False, 'plan': [{'get': 'foo', 'trigger': True}]}],
+            'groups': [],
+        }
+        self.assertEqual(
+            _normalise_pipeline_cfg(cfg),
+            {
+                'resources': [{'name': 'foo'}],
+                'jobs': [{'name': 'bar', 'plan': [{'get': 'foo', 'trigger': True}]}],
+            },
+        )
+
+    def test_verbatim_attributes_are_retained(self):
+        cfg = {'resources': [{'name': 'foo', 'source': {'branch': '', 'disable_ci_skip': False}}]}
+
+        self.assertEqual(_normalise_pipeline_cfg(cfg), cfg)
+
+
+class SetPipelineTest(unittest.TestCase):
+    PIPELINE_CFG = {'jobs': [{'name': 'job', 'plan': [{'get': 'repo'}]}]}
+
+    def examinee(self, deployed_cfg):
+        response = MagicMock()
+        if deployed_cfg is None:
+            response.status_code = 404
+        else:
+            response.status_code = 200
+            response.json.return_value = {'config': deployed_cfg}
+            response.headers = {'X-Concourse-Config-Version': '42'}
+
+        self.request_builder = MagicMock(spec=AuthenticatedRequestBuilder)
+        self.request_builder.get.return_value = response
+        return ConcourseApiBase(
+            routes=routes.ConcourseApiRoutesBase(base_url='https://concourse', team='foo'),
+            request_builder=self.request_builder,
+        )
+
+    def test_unchanged_pipeline_is_not_updated(self):
+        # deployed configs contain empty values omitted in rendered pipeline definitions
+        deployed_cfg = {'jobs': [{'name': 'job', 'plan': [{'get': 'repo', 'params': {}}]}]}
+        examinee = self.examinee(deployed_cfg=deployed_cfg)
+
+        result = examinee.set_pipeline(
+            name='pipeline',
+            pipeline_definition=json.dumps(self.PIPELINE_CFG),
+            skip_unchanged=True,
+        )
+
+        self.assertIs(result, SetPipelineResult.UNCHANGED)
+        self.request_builder.put.assert_not_called()
+
+    def test_changed_pipeline_is_updated(self):
+        examinee = self.examinee(deployed_cfg={'jobs': []})
+
+        result = examinee.set_pipeline(
+            name='pipeline',
+            pipeline_definition=json.dumps(self.PIPELINE_CFG),
+            skip_unchanged=True,
+        )
+
+        self.assertIs(result, SetPipelineResult.UPDATED)
+        self.request_builder.put.assert_called_once_with(
+            'https://concourse/api/v1/teams/foo/pipelines/pipeline/config',
+            body=json.dumps(self.PIPELINE_CFG),
+            headers={'x-concourse-config-version': '42'},
+        )
+
+    def test_missing_pipeline_is_created(self):
+        examinee = self.examinee(deployed_cfg=None)
+
+        result = examinee.set_pipeline(
+            name='pipeline',
+            pipeline_definition=json.dumps(self.PIPELINE_CFG),
+            skip_unchanged=True,
+        )
+
+        self.assertIs(result, SetPipelineResult.CREATED)
+        self.request_builder.put.assert_called_once()
+
+
+class FakeRequestBuilder(AuthenticatedRequestBuilder):
+    def __init__(self, pipeline_cfgs):
+        super().__init__()
+        self.pipeline_cfgs = pipeline_cfgs
+        self.lock = threading.Lock()
+        self.concurrent_requests = 0
+        self.max_concurrent_requests = 0
+
+    def get(self, url, return_type='json', **kwargs):
+        pipeline_name = url.split('/')[-2]
+        with self.lock:
+            self.concurrent_requests += 1
+            self.max_concurrent_requests = max(
+                self.max_concurrent_requests,
+                self.concurrent_requests,
+            )
+        try:
+            # later pipelines are retrieved faster (results must be ordered nevertheless)
+            time.sleep(0.001 * (len(self.pipeline_cfgs) - int(pipeline_name.split('-')[1])))
+            cfg = self.pipeline_cfgs[pipeline_name]
+            if isinstance(cfg, Exception):
+                raise cfg
+            return {'config': cfg}
+        finally:
+            with self.lock:
+                self.concurrent_requests -= 1
+
+
+class PipelineResourcesTest(unittest.TestCase):
+    def setUp(self):
+        self.pipeline_cfgs = {
+            f'p-{idx}': {
+                'resources': [
+                    {'name': f'git-{idx}', 'type': 'git', 'source': {}},
+                    {'name': f'pr-{idx}', 'type': 'pull-request', 'source': {}},
+                ],
+            } for idx in range(20)
+        }
+        self.pipeline_names = [f'p-{idx}' for idx in range(20)]
+
+    def examinee(self):
+        self.request_builder = FakeRequestBuilder(self.pipeline_cfgs)
+        return ConcourseApiBase(
+            routes=routes.ConcourseApiRoutesBase(base_url='https://concourse', team='foo'),
+            request_builder=self.request_builder,
+        )
+
+    def test_resources_are_retrieved_concurrently_and_in_order(self):
+        resources = list(self.examinee().pipeline_resources(self.pipeline_names, max_workers=4))
+
+        self.assertEqual(
+            [resource.name for resource in resources],
+            [f'{t}-{idx}' for idx in range(20) for t in ('git', 'pr')],
+        )
+        self.assertGreater(self.request_builder.max_concurrent_requests, 1)
+        self.assertLessEqual(self.request_builder.max_concurrent_requests, 4)
+
+    def test_resource_types(self):
+        resources = self.examinee().pipeline_resources(
+            self.pipeline_names,
+            resource_types='pull-request',
+        )
+
+        self.assertEqual(
+            [resource.name for resource in resources],
+            [f'pr-{idx}' for idx in range(20)],
+        )
+
+    def test_errors_are_isolated(self):
+        self.pipeline_cfgs['p-3'] = RuntimeError('not found')
+        self.pipeline_cfgs['p-5'] = {'resources': []}
+
+        with patch.object(concourse.client.api, 'warning') as warning_mock:
+            resources = list(self.examinee().pipeline_resources(
+                self.pipeline_names,
+                resource_types=['git'],
+                isolate_errors=True,
+            ))
+
+        self.assertEqual(
+            [resource.name for resource in resources],
+            [f'git-{idx}' for idx in range(20) if idx not in (3, 5)],
+        )
+        self.assertEqual(warning_mock.call_count, 2)
+
+    def test_errors_are_raised_by_default(self):
+        self.pipeline_cfgs['p-3'] = RuntimeError('not found')
+
+        with self.assertRaises(RuntimeError):
+            list(self.examinee().pipeline_resources(self.pipeline_names))
@@ -0,0 +1,103 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import types
+import unittest
+from unittest.mock import MagicMock, patch
+
+from concourse.enumerator import (
+    GithubOrganisationDefinitionEnumerator,
+    GithubOrganisationGraphQLDefinitionEnumerator,
+)
+
+BRANCH_CFG = 'cfgs: {default: {branches: [master, rel-1]}}'
+DEFINITIONS = {
+    'master': 'invalid: [',
+    'rel-1': 'pipeline: {jobs: {}}',
+}
+
+
+class GithubOrganisationEnumeratorTest(unittest.TestCase):
+    def setUp(self):
+        self.github_cfg = MagicMock()
+        self.github_cfg.http_url.return_value = 'https://github.example.org'
+        self.cfg_set = MagicMock()
+        self.cfg_set.github.return_value = self.github_cfg
+        github_org_cfg = MagicMock()
+        github_org_cfg.org_name.return_value = 'org'
+        self.job_mapping = MagicMock()
+        self.job_mapping.github_organisations.return_value = [github_org_cfg]
+        self.job_mapping.team_name.return_value = 'team'
+
+    def examinee(self, enumerator_type):
+        return enumerator_type(job_mapping=self.job_mapping, cfg_set=self.cfg_set)
+
+    def test_invalid_definitions_stop_repository_scan(self):
+        def file_contents(path, ref):
+            contents = BRANCH_CFG if path == 'branch.cfg' else DEFINITIONS[ref]
+            return types.SimpleNamespace(decoded=contents.encode('utf-8'), sha=f'{path}-{ref}')
+
+        repository = MagicMock()
+        repository.name = 'repo'
+        repository.file_contents.side_effect = file_contents
+        repository.branches.return_value = [
+            types.SimpleNamespace(name=branch_name) for branch_name in DEFINITIONS
+        ]
+        github_api = MagicMock()
+        github_api.organization.return_value.repositories.return_value = [repository]
+
+        with patch('concourse.enumerator._create_github_api_object', return_value=github_api):
+            descriptors = list(
+                self.examinee(GithubOrganisationDefinitionEnumerator)
+                .enumerate_definition_descriptors()
+            )
+
+        self.assertEqual([d.pipeline_name for d in descriptors], ['<invalid YAML>'])
+        self.assertEqual(descriptors[0].main_repo['branch'], 'master')
+
+    def test_graphql_invalid_definitions_stop_repository_scan(self):
+        def blob(oid, text):
+            return {'oid': oid, 'text': text, 'isTruncated': False}
+
+        def graphql_query(query, variables, **kwargs):
+            if query == GithubOrganisationGraphQLDefinitionEnumerator.REPOSITORIES_QUERY:
+                return {'organization': {'repositories': {
+                    'pageInfo': {'hasNextPage': False},
+                    'nodes': [{
+                        'name': 'repo',
+                        'defaultBranchRef': {'name': 'master'},
+                        'branchCfg': blob('branch-cfg', BRANCH_CFG),
+                        'defaultDefinitions': None,
+                        'refs': {
+                            'pageInfo': {'hasNextPage': False},
+                            'nodes': [{'name': branch_name} for branch_name in DEFINITIONS],
+                        },
+                    }],
+                }}}
+            # batched pipeline definitions (one aliased field per branch)
+            return {
+                f'b{idx}': {'object': blob(branch_name, text)}
+                for idx, (branch_name, text) in enumerate(DEFINITIONS.items())
+            }
+
+        with patch('concourse.enumerator._create_github_api_object'), \
+                patch('concourse.enumerator.graphql_query', side_effect=graphql_query):
+            descriptors = list(
+                self.examinee(GithubOrganisationGraphQLDefinitionEnumerator)
+                .enumerate_definition_descriptors()
+            )
+
+        self.assertEqual([d.pipeline_name for d in descriptors], ['<invalid YAML>'])
+        self.assertEqual(descriptors[0].main_repo['branch'], 'master')
@@ -1,4 +1,5 @@
 import unittest
+from copy import deepcopy
 
 from model.base import ModelValidationError
 from concourse.factory import (
@@ -106,3 +107,31 @@ class DefinitionFactoryTest(unittest.TestCase):
         main_repo_from_registry = registry.resource(main_repo.resource_identifier())
 
         self.assertTrue(main_repo_from_registry.should_trigger())
+
+    def test_variants_share_base_definition_without_modifying_it(self):
+        base_def = {
+            'repo': {'name': 'main_repo', 'branch': 'dontcare', 'path': 'foo/bar'},
+            'steps': {'build': None, 'test': {'depends': ['build']}},
+            'traits': {'version': {}},
+        }
+        variants = {
+            'variant_a': {},
+            'variant_b': {'steps': {'test': {'depends': ['lint']}, 'lint': None}},
+        }
+        expected_base_def = deepcopy(base_def)
+        descriptor = DefDescriptor(name='foo', base_definition=base_def, variants=variants)
+        factory = DefinitionFactory(raw_definition_descriptor=descriptor)
+
+        result = factory.create_pipeline_definition()
+
+        self.assertEqual(base_def, expected_base_def)
+        self.assertEqual(
+            set(result.variant('variant_a').step_names()),
+            {'build', 'test', 'version'},
+        )
+        self.assertEqual(
+            result.variant('variant_b').step('test').depends(),
+            {'build', 'lint', 'version'},
+        )
+        self.assertEqual(result.variant('variant_a').step('test').depends(), {'build', 'version'})
+        self.assertNotIn('notifications', base_def['traits'])
@@ -0,0 +1,99 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from concourse.metrics import ReplicationMetrics
+
+
+class ReplicationMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.examinee = ReplicationMetrics(
+            service_hostnames={'github': ['GitHub.com'], 'concourse': ['concourse.example.org']},
+        )
+
+    def test_stage_timings(self):
+        self.examinee.record_stage_timing('render', 10, 12)
+        self.examinee.record_stage_timing('render', 11, 14)
+        timed = self.examinee.timed_stage('deploy', lambda x: x * 2)
+        self.assertEqual(timed(21), 42)
+        self.assertEqual(list(self.examinee.timed_iterable('enumerate', range(3))), [0, 1, 2])
+
+        stages = self.examinee.summary()['stages']
+
+        self.assertEqual(stages['render']['count'], 2)
+        self.assertEqual(stages['render']['total_seconds'], 5)
+        self.assertEqual(stages['render']['wall_seconds'], 4)
+        self.assertEqual(stages['render']['p50_seconds'], 2)
+        self.assertEqual(stages['deploy']['count'], 1)
+        # one timing per retrieved element, plus the final (exhausting) one
+        self.assertEqual(stages['enumerate']['count'], 4)
+
+    def test_pipeline_latencies_and_queue_depths(self):
+        for idx in range(10):
+            self.examinee.record_pipeline_latency('render', f'p{idx}', float(idx))
+        self.examinee.record_queue_depths({'render': 2})
+        self.examinee.record_queue_depths({'render': 4})
+
+        summary = self.examinee.summary()
+
+        render_latencies = summary['pipeline_latencies']['render']
+        self.assertEqual(render_latencies['count'], 10)
+        self.assertEqual(render_latencies['max_seconds'], 9.0)
+        self.assertEqual(render_latencies['p50_seconds'], 4.0)
+        self.assertEqual(render_latencies['pipelines']['p3'], 3.0)
+        self.assertEqual(summary['queue_depths']['render'], {'max': 4, 'mean': 3.0})
+
+    def test_http_request_counts(self):
+        with patch('http_requests.request_counts', return_value={'github.com': 3, 'foo': 1}):
+            self.examinee.start()
+        with patch(
+            'http_requests.request_counts',
+            return_value={'github.com': 10, 'concourse.example.org': 2, 'foo': 1, 'bar': 5},
+        ):
+            self.examinee.stop()
+
+        http_requests = self.examinee.summary()['http_requests']
+
+        self.assertEqual(
+            http_requests['by_service'],
+            {'github': 7, 'concourse': 2, 'other': 5},
+        )
+
+    def test_write(self):
+        self.examinee.record_stage_timing('render', 10, 12)
+        self.examinee.record_pipeline_latency('deploy', 'my-"pipeline"', 1.5)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.examinee.write(metrics_dir=tmp_dir)
+
+            self.assertEqual(
+                sorted(os.listdir(tmp_dir)),
+                ['replication_metrics.json', 'replication_metrics.prom'],
+            )
+            with open(os.path.join(tmp_dir, 'replication_metrics.json')) as f:
+                self.assertEqual(json.load(f)['stages']['render']['total_seconds'], 2)
+            with open(os.path.join(tmp_dir, 'replication_metrics.prom')) as f:
+                prometheus_text = f.read()
+
+        self.assertIn('cc_replication_stage_seconds_total{stage="render"} 2', prometheus_text)
+        self.assertIn(
+            'cc_replication_pipeline_seconds{stage="deploy",pipeline="my-\\"pipeline\\""} 1.5',
+            prometheus_text,
+        )
@@ -1,6 +1,10 @@
 import unittest
 
-from concourse.model.resources import ResourceIdentifier
+from concourse.model.resources import (
+    Resource,
+    ResourceIdentifier,
+    ResourceRegistry,
+)
 
 
 class ResourceIdentifierTest(unittest.TestCase):
@@ -43,3 +47,33 @@ class ResourceIdentifierTest(unittest.TestCase):
         self.assertNotEqual(left, examinee(type_name='type1', base_name='base2', qualifier='qual1'))
         self.assertNotEqual(left, examinee(type_name='type1', base_name='base1', qualifier='qual2'))
         self.assertNotEqual(left, examinee(type_name='type1', base_name='base1'))
+
+
+class ResourceRegistryTest(unittest.TestCase):
+    def _resource(self, type_name, base_name, qualifier=None):
+        return Resource(
+            resource_identifier=ResourceIdentifier(
+                type_name=type_name,
+                base_name=base_name,
+                qualifier=qualifier,
+            ),
+            raw_dict={},
+        )
+
+    def test_resources(self):
+        examinee = ResourceRegistry()
+        git_a = self._resource('git', 'a')
+        meta_a = self._resource('meta', 'a')
+        git_b_pr = self._resource('git', 'b', qualifier='pr')
+        git_c = self._resource('git', 'c')
+        for resource in (git_a, meta_a, git_b_pr, git_c):
+            examinee.add_resource(resource)
+        # duplicates are discarded
+        examinee.add_resource(self._resource('git', 'a'))
+
+        self.assertEqual(list(examinee.resources('git')), [git_a, git_b_pr, git_c])
+        self.assertEqual(list(examinee.resources('git', qualifier='pr')), [git_b_pr])
+        self.assertEqual(list(examinee.resources('git', qualifier='')), [git_a, git_c])
+        self.assertEqual(list(examinee.resources('meta')), [meta_a])
+        self.assertEqual(list(examinee.resources('unknown')), [])
+        self.assertIs(examinee.resource(git_c.resource_identifier()), git_c)
@@ -71,3 +71,18 @@ class PipelineStepTest(unittest.TestCase):
         # whitespace must be quoted
         examinee = self._examinee(execute=['e x', 'a r g'])
         self.assertEqual(examinee.execute(), ' '.join(map(shlex.quote, ('e x', 'a r g'))))
+
+    def test_defaults_are_not_shared_between_steps(self):
+        first = self._examinee(name='first')
+        second = self._examinee(name='second')
+
+        first._add_dependency(second)
+        first.raw['inputs']['an_input'] = 'an_output'
+
+        self.assertEqual(second.depends(), set())
+        self.assertEqual(second.raw['inputs'], {})
+        self.assertEqual(PipelineStep._defaults_dict()['inputs'], {})
+        self.assertIs(
+            PipelineStep._compiled_attribute_specs(),
+            PipelineStep._compiled_attribute_specs(),
+        )
@@ -0,0 +1,430 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pickle
+import tempfile
+import types
+import unittest
+from unittest.mock import MagicMock, patch
+
+from mako.lookup import TemplateLookup
+
+from concourse.enumerator import (
+    GithubOrganisationDefinitionEnumerator,
+    GithubOrganisationGraphQLDefinitionEnumerator,
+)
+
+from concourse.client.model import SetPipelineResult
+from concourse.replicator import (
+    CompiledTemplateCache,
+    ConcourseDeployer,
+    DeployResult,
+    DeployStatus,
+    PipelineReplicator,
+    RenderResult,
+    RenderStatus,
+    Renderer,
+    ReplicationResultProcessor,
+    _enumerator_kwargs,
+)
+from concourse.state import ReplicationStateStore
+
+
+class CompiledTemplateCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lookup = TemplateLookup([self.tmp_dir.name])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_templates_are_compiled_once(self):
+        examinee = CompiledTemplateCache(lookup=self.lookup)
+
+        template = examinee.template(template_name='foo', template_contents='${x}')
+        self.assertIs(template, examinee.template(template_name='foo', template_contents='${x}'))
+        self.assertEqual(template.render(x=42), '42')
+
+    def test_changed_contents_cause_recompilation(self):
+        examinee = CompiledTemplateCache(lookup=self.lookup)
+
+        template = examinee.template(template_name='foo', template_contents='${x}')
+        changed = examinee.template(template_name='foo', template_contents='x=${x}')
+
+        self.assertIsNot(template, changed)
+        self.assertEqual(changed.render(x=42), 'x=42')
+
+    def test_module_directory(self):
+        template_file = os.path.join(self.tmp_dir.name, 'foo.yaml')
+        with open(template_file, 'w') as f:
+            f.write('${x}')
+        module_dir = os.path.join(self.tmp_dir.name, 'modules')
+
+        examinee = CompiledTemplateCache(lookup=self.lookup, module_directory=module_dir)
+        template = examinee.template(
+            template_name='foo',
+            template_contents='${x}',
+            template_file=template_file,
+        )
+
+        self.assertEqual(template.render(x=42), '42')
+        self.assertEqual(len(os.listdir(module_dir)), 1)
+
+
+class RendererTest(unittest.TestCase):
+    def test_pickling(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            examinee = Renderer(
+                template_retriever=None,
+                template_include_dir=tmp_dir,
+                cfg_set=None,
+            )
+
+            unpickled = pickle.loads(pickle.dumps(examinee))
+
+            self.assertEqual(unpickled.template_include_dir, examinee.template_include_dir)
+            self.assertIsNot(unpickled.template_cache, examinee.template_cache)
+            template = unpickled.template_cache.template(
+                template_name='foo',
+                template_contents='${x}',
+            )
+            self.assertEqual(template.render(x=42), '42')
+
+
+class ConcourseDeployerTest(unittest.TestCase):
+    def deploy(self, set_pipeline_result):
+        definition_descriptor = MagicMock()
+        definition_descriptor.pipeline_name = 'pipeline'
+        definition_descriptor.concourse_target_team = 'team'
+        self.concourse_api = MagicMock()
+        self.concourse_api.set_pipeline.return_value = set_pipeline_result
+        examinee = ConcourseDeployer(unpause_pipelines=True, skip_unchanged=True)
+
+        with patch('concourse.client.from_cfg', return_value=self.concourse_api):
+            return examinee.deploy(definition_descriptor)
+
+    def test_unchanged_pipeline(self):
+        result = self.deploy(SetPipelineResult.UNCHANGED)
+
+        self.assertEqual(result.deploy_status, DeployStatus.SUCCEEDED | DeployStatus.UNCHANGED)
+        self.concourse_api.set_pipeline.assert_called_once()
+        self.assertTrue(self.concourse_api.set_pipeline.call_args.kwargs['skip_unchanged'])
+        self.concourse_api.unpause_pipeline.assert_not_called()
+        self.concourse_api.expose_pipeline.assert_not_called()
+
+    def test_updated_pipeline(self):
+        result = self.deploy(SetPipelineResult.UPDATED)
+
+        self.assertEqual(result.deploy_status, DeployStatus.SUCCEEDED)
+        self.concourse_api.unpause_pipeline.assert_called_once_with(pipeline_name='pipeline')
+        self.concourse_api.expose_pipeline.assert_called_once_with(pipeline_name='pipeline')
+
+
+class _TemplateRenderer(Renderer):
+    # renders a (compiled) template, but no actual pipeline definitions
+    def _render(self, definition_descriptor):
+        template = self.template_cache.template(
+            template_name='pipeline',
+            template_contents='${name}',
+        )
+        definition_descriptor.pipeline = template.render(name=definition_descriptor.pipeline_name)
+        definition_descriptor.render_pid = os.getpid()
+        return definition_descriptor
+
+
+class RenderProcessesTest(unittest.TestCase):
+    def replicate(self, template_include_dir, render_processes):
+        def descriptor(name):
+            return types.SimpleNamespace(pipeline_name=name, exception=None)
+
+        examinee = PipelineReplicator(
+            definition_enumerators=[types.SimpleNamespace(
+                enumerate_definition_descriptors=lambda: (descriptor(f'p{i}') for i in range(8))
+            )],
+            descriptor_preprocessor=types.SimpleNamespace(process_definition_descriptor=lambda d: d),
+            definition_renderer=_TemplateRenderer(
+                template_retriever=None,
+                template_include_dir=template_include_dir,
+                cfg_set=None,
+            ),
+            definition_deployer=types.SimpleNamespace(
+                deploy=lambda d: DeployResult(
+                    definition_descriptor=d,
+                    deploy_status=DeployStatus.SUCCEEDED,
+                ),
+            ),
+            render_processes=render_processes,
+        )
+        return sorted(
+            (r.definition_descriptor for r in examinee._replicate()),
+            key=lambda d: d.pipeline_name,
+        )
+
+    def test_render_processes_yield_same_results(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_process = self.replicate(template_include_dir=tmp_dir, render_processes=None)
+            in_processes = self.replicate(template_include_dir=tmp_dir, render_processes=2)
+
+        def summary(descriptors):
+            return [(d.pipeline_name, d.pipeline) for d in descriptors]
+
+        self.assertEqual(len(in_process), 8)
+        self.assertEqual(summary(in_processes), summary(in_process))
+        self.assertEqual({d.render_pid for d in in_process}, {os.getpid()})
+        self.assertNotIn(os.getpid(), {d.render_pid for d in in_processes})
+
+
+class PipelineReplicatorTest(unittest.TestCase):
+    def setUp(self):
+        def descriptor(name, exception=None):
+            return types.SimpleNamespace(pipeline_name=name, exception=exception)
+
+        self.enumerators = [
+            types.SimpleNamespace(
+                enumerate_definition_descriptors=lambda: (descriptor(f'a{i}') for i in range(20))
+            ),
+            types.SimpleNamespace(
+                enumerate_definition_descriptors=lambda: iter((
+                    descriptor('b0'),
+                    descriptor('b1', exception='invalid'),
+                    descriptor('a0'),
+                ))
+            ),
+        ]
+        self.preprocessor = types.SimpleNamespace(process_definition_descriptor=lambda d: d)
+        self.renderer = types.SimpleNamespace(
+            render=lambda d: RenderResult(
+                definition_descriptor=d,
+                render_status=RenderStatus.SUCCEEDED,
+            ),
+        )
+        self.deployer = types.SimpleNamespace(
+            deploy=lambda d: DeployResult(
+                definition_descriptor=d,
+                deploy_status=DeployStatus.SUCCEEDED,
+            ),
+        )
+
+    def test_replicate(self):
+        examinee = PipelineReplicator(
+            definition_enumerators=self.enumerators,
+            descriptor_preprocessor=self.preprocessor,
+            definition_renderer=self.renderer,
+            definition_deployer=self.deployer,
+            stage_concurrency={'render': 3},
+            queue_size=2,
+        )
+
+        results = list(examinee._replicate())
+
+        self.assertEqual(len(results), 23)
+        succeeded = {
+            r.definition_descriptor.pipeline_name for r in results
+            if r.deploy_status == DeployStatus.SUCCEEDED
+        }
+        self.assertEqual(succeeded, {f'a{i}' for i in range(20)} | {'b0'})
+        skipped = [r for r in results if r.deploy_status == DeployStatus.SKIPPED]
+        self.assertEqual(
+            sorted(r.definition_descriptor.pipeline_name for r in skipped),
+            ['a0', 'b1'],
+        )
+
+    def test_unknown_stage(self):
+        with self.assertRaises(ValueError):
+            PipelineReplicator(
+                definition_enumerators=self.enumerators,
+                descriptor_preprocessor=self.preprocessor,
+                definition_renderer=self.renderer,
+                definition_deployer=self.deployer,
+                stage_concurrency={'foo': 3},
+            )
+
+
+class EnumeratorKwargsTest(unittest.TestCase):
+    def test_scan_concurrency_follows_enumerate_stage_concurrency(self):
+        self.assertEqual(
+            _enumerator_kwargs(
+                enumerator_type=GithubOrganisationDefinitionEnumerator,
+                stage_concurrency={'enumerate': 3},
+            ),
+            {'scan_concurrency': 3},
+        )
+        self.assertEqual(
+            _enumerator_kwargs(enumerator_type=GithubOrganisationDefinitionEnumerator),
+            {'scan_concurrency': PipelineReplicator.DEFAULT_STAGE_CONCURRENCY['enumerate']},
+        )
+        self.assertEqual(
+            _enumerator_kwargs(
+                enumerator_type=GithubOrganisationGraphQLDefinitionEnumerator,
+                stage_concurrency={'enumerate': 3},
+            ),
+            {},
+        )
+
+
+class PipelineReplicatorStateStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.state_store = ReplicationStateStore(state_dir=self.tmp_dir.name)
+        self.addCleanup(self.state_store.close)
+
+        self.preprocessor = types.SimpleNamespace(process_definition_descriptor=lambda d: d)
+        self.renderer = MagicMock()
+        self.renderer.inputs_digest.return_value = 'digest'
+        self.renderer.render.side_effect = lambda d: RenderResult(
+            definition_descriptor=d,
+            render_status=RenderStatus.SUCCEEDED,
+        )
+        self.deployer = MagicMock()
+        self.deployer.deploy.side_effect = lambda d: DeployResult(
+            definition_descriptor=d,
+            deploy_status=DeployStatus.FAILED if d.pipeline_name == 'failing'
+                else DeployStatus.SUCCEEDED,
+        )
+
+    def examinee(self, *pipeline_names, full_replication=False):
+        def descriptor(name):
+            return types.SimpleNamespace(
+                pipeline_name=name,
+                exception=None,
+                main_repo={'path': 'org/repo', 'branch': 'master'},
+                concourse_target_key=lambda: 'target',
+            )
+
+        return PipelineReplicator(
+            definition_enumerators=[types.SimpleNamespace(
+                enumerate_definition_descriptors=lambda: map(descriptor, pipeline_names),
+            )],
+            descriptor_preprocessor=self.preprocessor,
+            definition_renderer=self.renderer,
+            definition_deployer=self.deployer,
+            state_store=self.state_store,
+            full_replication=full_replication,
+        )
+
+    def recorded_digest(self, pipeline_name):
+        return self.state_store.inputs_digest(
+            concourse_target='target',
+            repo_path='org/repo',
+            branch='master',
+            pipeline_name=pipeline_name,
+        )
+
+    def record_digest(self, pipeline_name, inputs_digest):
+        self.state_store.store_inputs_digest(
+            concourse_target='target',
+            repo_path='org/repo',
+            branch='master',
+            pipeline_name=pipeline_name,
+            inputs_digest=inputs_digest,
+        )
+
+    def test_unchanged_inputs_are_skipped(self):
+        self.record_digest('a', 'digest')
+
+        results = list(self.examinee('a')._replicate())
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(
+            results[0].deploy_status,
+            DeployStatus.SUCCEEDED | DeployStatus.UNCHANGED,
+        )
+        self.renderer.render.assert_not_called()
+        self.deployer.deploy.assert_not_called()
+
+    def test_changed_inputs_are_replicated(self):
+        self.record_digest('a', 'outdated-digest')
+
+        results = list(self.examinee('a')._replicate())
+
+        self.assertEqual([r.deploy_status for r in results], [DeployStatus.SUCCEEDED])
+        self.deployer.deploy.assert_called_once()
+        self.assertEqual(self.recorded_digest('a'), 'digest')
+
+    def test_digest_is_stored_after_successful_deploy_only(self):
+        list(self.examinee('a', 'failing')._replicate())
+
+        self.assertEqual(self.recorded_digest('a'), 'digest')
+        self.assertIsNone(self.recorded_digest('failing'))
+
+    def test_full_replication_ignores_recorded_digests(self):
+        self.record_digest('a', 'digest')
+
+        results = list(self.examinee('a', full_replication=True)._replicate())
+
+        self.assertEqual([r.deploy_status for r in results], [DeployStatus.SUCCEEDED])
+        self.renderer.render.assert_called_once()
+        self.deployer.deploy.assert_called_once()
+
+
+class ReplicationResultProcessorTest(unittest.TestCase):
+    def result(self, pipeline_name, deploy_status, pipeline=None):
+        definition_descriptor = MagicMock()
+        definition_descriptor.pipeline_name = pipeline_name
+        definition_descriptor.pipeline = pipeline
+        definition_descriptor.concourse_target_key.return_value = 'target'
+        definition_descriptor.concourse_target.return_value = ('concourse_cfg', 'team')
+        return DeployResult(
+            definition_descriptor=definition_descriptor,
+            deploy_status=deploy_status,
+        )
+
+    def test_process_results(self):
+        concourse_api = MagicMock()
+        concourse_api.pipelines.return_value = iter(['b', 'new', 'obsolete', 'a'])
+        new_pipeline = '''
+        resources:
+        - name: with-token
+          webhook_token: foo
+        - name: without-token
+        '''
+        results = [
+            self.result('a', DeployStatus.SUCCEEDED),
+            self.result('b', DeployStatus.SUCCEEDED | DeployStatus.UNCHANGED),
+            self.result('new', DeployStatus.SUCCEEDED | DeployStatus.CREATED, new_pipeline),
+        ]
+        examinee = ReplicationResultProcessor(cfg_set=None)
+
+        with patch('concourse.client.from_cfg', return_value=concourse_api):
+            self.assertTrue(examinee.process_results(results))
+
+        concourse_api.pipelines.assert_called_once_with()
+        concourse_api.delete_pipeline.assert_called_once_with('obsolete')
+        concourse_api.unpause_pipeline.assert_called_once_with('new')
+        concourse_api.trigger_resource_check.assert_called_once_with(
+            pipeline_name='new',
+            resource_name='with-token',
+        )
+        concourse_api.pipeline_resources.assert_not_called()
+        concourse_api.order_pipelines.assert_called_once_with(['a', 'b', 'new'])
+
+    def test_missing_unchanged_pipelines_are_forgotten(self):
+        concourse_api = MagicMock()
+        concourse_api.pipelines.return_value = iter(['a'])
+        state_store = MagicMock()
+        results = [
+            self.result('a', DeployStatus.SUCCEEDED | DeployStatus.UNCHANGED),
+            # removed from concourse out-of-band
+            self.result('b', DeployStatus.SUCCEEDED | DeployStatus.UNCHANGED),
+        ]
+        examinee = ReplicationResultProcessor(cfg_set=None, state_store=state_store)
+
+        with patch('concourse.client.from_cfg', return_value=concourse_api):
+            self.assertTrue(examinee.process_results(results))
+
+        state_store.remove.assert_called_once_with(concourse_target='target', pipeline_name='b')
+        concourse_api.order_pipelines.assert_called_once_with(['a'])
@@ -0,0 +1,90 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+
+from concourse.stages import (
+    Completed,
+    Stage,
+    StagedPipeline,
+)
+
+
+class StagedPipelineTest(unittest.TestCase):
+    def test_items_pass_all_stages(self):
+        examinee = StagedPipeline(
+            sources=[range(0, 50), range(50, 100)],
+            stages=[
+                Stage('double', lambda i: i * 2, concurrency=3),
+                Stage('increment', lambda i: i + 1, concurrency=2),
+            ],
+            source_concurrency=2,
+            queue_size=4,
+        )
+
+        self.assertEqual(sorted(examinee.run()), [i * 2 + 1 for i in range(100)])
+
+    def test_completed_results_bypass_succeeding_stages(self):
+        examinee = StagedPipeline(
+            sources=[range(10)],
+            stages=[
+                Stage('filter', lambda i: Completed(-i) if i % 2 else i),
+                Stage('increment', lambda i: i + 1),
+            ],
+        )
+
+        self.assertEqual(sorted(examinee.run()), [-9, -7, -5, -3, -1, 1, 3, 5, 7, 9])
+
+    def test_exceptions_are_propagated(self):
+        def fail_on_5(i):
+            if i == 5:
+                raise RuntimeError('5')
+            return i
+
+        examinee = StagedPipeline(
+            sources=[range(1000)],
+            stages=[Stage('fail', fail_on_5, concurrency=2)],
+            queue_size=2,
+        )
+
+        with self.assertRaises(RuntimeError):
+            list(examinee.run())
+
+    def test_queues_are_bounded(self):
+        consumed = threading.Event()
+        produced = []
+
+        def source():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        examinee = StagedPipeline(
+            sources=[source()],
+            stages=[Stage('identity', lambda i: i)],
+            queue_size=2,
+        )
+        results = examinee.run()
+        next(results)
+        consumed.wait(0.5)
+
+        # at most one item per queue, and one per worker may be in-flight
+        self.assertLess(len(produced), 10)
+        results.close()
+
+    def test_invalid_concurrency(self):
+        with self.assertRaises(ValueError):
+            Stage('foo', lambda i: i, concurrency=0)
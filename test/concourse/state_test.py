@@ -0,0 +1,58 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+from concourse.state import ReplicationStateStore
+
+
+class ReplicationStateStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.examinee = ReplicationStateStore(state_dir=self.tmp_dir.name)
+        self.key = {
+            'concourse_target': 'concourse:team',
+            'repo_path': 'org/repo',
+            'branch': 'master',
+            'pipeline_name': 'foo-master',
+        }
+
+    def tearDown(self):
+        self.examinee.close()
+        self.tmp_dir.cleanup()
+
+    def test_unknown_pipeline(self):
+        self.assertIsNone(self.examinee.inputs_digest(**self.key))
+
+    def test_store_and_retrieve(self):
+        self.examinee.store_inputs_digest(**self.key, inputs_digest='abc')
+        self.assertEqual(self.examinee.inputs_digest(**self.key), 'abc')
+
+        self.examinee.store_inputs_digest(**self.key, inputs_digest='def')
+        self.assertEqual(self.examinee.inputs_digest(**self.key), 'def')
+
+    def test_state_is_persistent(self):
+        self.examinee.store_inputs_digest(**self.key, inputs_digest='abc')
+
+        other = ReplicationStateStore(state_dir=self.tmp_dir.name)
+        self.assertEqual(other.inputs_digest(**self.key), 'abc')
+        other.close()
+
+    def test_remove(self):
+        self.examinee.store_inputs_digest(**self.key, inputs_digest='abc')
+        self.examinee.remove(concourse_target='concourse:team', pipeline_name='foo-master')
+
+        self.assertIsNone(self.examinee.inputs_digest(**self.key))
@@ -0,0 +1,139 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import http.server
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from config import SecretsServerClient
+
+
+class _SecretsHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        time.sleep(self.server.delay)
+        body = json.dumps(self.server.secrets).encode('utf-8')
+        etag = '"{v}"'.format(v=len(self.server.requests) if self.server.volatile else 1)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SecretsServerClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _SecretsHandler)
+        self.server.secrets = {'version': 1}
+        self.server.requests = []
+        self.server.volatile = False
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'secrets.json')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def _client(self, **kwargs):
+        return SecretsServerClient(
+            endpoint_url='http://127.0.0.1:{p}'.format(p=self.server.server_address[1]),
+            concourse_secret_name='concourse_cfg',
+            cache_file=self.cache_file,
+            **kwargs
+        )
+
+    def _expire_cache(self):
+        with open(self.cache_file + '.meta') as f:
+            metadata = json.load(f)
+        metadata['fetched'] = time.time() - 3600
+        with open(self.cache_file + '.meta', 'w') as f:
+            json.dump(metadata, f)
+
+    def test_cache_without_ttl_never_expires(self):
+        client = self._client()
+
+        self.assertEqual(client.retrieve_secrets(), {'version': 1})
+        self.server.secrets = {'version': 2}
+        self._expire_cache()
+
+        self.assertEqual(client.retrieve_secrets(), {'version': 1})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_expired_cache_is_revalidated(self):
+        client = self._client(cache_ttl_seconds=60, serve_stale=False)
+
+        client.retrieve_secrets()
+        # fresh
+        self.assertEqual(client.retrieve_secrets(), {'version': 1})
+        self.assertEqual(len(self.server.requests), 1)
+
+        self._expire_cache()
+        self.assertEqual(client.retrieve_secrets(), {'version': 1})
+        self.assertEqual(self.server.requests[1]['If-None-Match'], '"1"')
+
+        # revalidation renews the cache
+        self.assertEqual(client.retrieve_secrets(), {'version': 1})
+        self.assertEqual(len(self.server.requests), 2)
+
+        self.server.volatile = True
+        self.server.secrets = {'version': 2}
+        self._expire_cache()
+        self.assertEqual(client.retrieve_secrets(), {'version': 2})
+
+    def test_stale_cache_is_served_while_refreshing(self):
+        client = self._client(cache_ttl_seconds=60)
+        client.retrieve_secrets()
+        self.server.volatile = True
+        self.server.secrets = {'version': 2}
+        self._expire_cache()
+
+        self.assertEqual(client.retrieve_secrets(), {'version': 1})
+
+        for thread in threading.enumerate():
+            if thread.name == 'secrets-server-cache-refresh':
+                thread.join()
+        self.assertEqual(client.retrieve_secrets(), {'version': 2})
+
+    def test_requests_to_hanging_server_time_out(self):
+        client = self._client(
+            cache_ttl_seconds=60,
+            serve_stale=False,
+            request_timeout_seconds=0.1,
+        )
+        client.retrieve_secrets()
+        self._expire_cache()
+        self.server.delay = 1
+
+        start = time.time()
+        self.assertEqual(client.retrieve_secrets(), {'version': 1})
+        self.assertLess(time.time() - start, 1)
@@ -18,6 +18,7 @@ import unittest
 
 import github.util as ghu
 import product.model as pm
+from model.github import GithubConfig
 
 
 # test gear
@@ -126,3 +127,20 @@ class UpgradePullRequestTest(unittest.TestCase):
         self.assertTrue(
             examinee.target_matches(pm.WebDependencyReference.create(name='red', version='2.0.0'))
         )
+
+
+class GraphQLUrlTest(unittest.TestCase):
+    def github_cfg(self, api_url):
+        return GithubConfig(name='foo', raw_dict={'apiUrl': api_url})
+
+    def test_github_com(self):
+        self.assertEqual(
+            ghu.graphql_url(github_cfg=self.github_cfg('https://api.github.com')),
+            'https://api.github.com/graphql',
+        )
+
+    def test_github_enterprise(self):
+        self.assertEqual(
+            ghu.graphql_url(github_cfg=self.github_cfg('https://github.example.com/api/v3/')),
+            'https://github.example.com/api/graphql',
+        )
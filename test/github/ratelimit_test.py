@@ -0,0 +1,199 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import requests
+
+import github.ratelimit as examinee
+import github.util as ghu
+from model.github import GithubConfig
+
+
+class FakeTime(object):
+    def __init__(self, now=1000):
+        self.now = now
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def response(status_code=200, **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    return response
+
+
+def rate_limit_response(limit, remaining, reset, status_code=200, **headers):
+    return response(
+        status_code=status_code,
+        **{
+            'X-RateLimit-Limit': str(limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': str(reset),
+        },
+        **headers,
+    )
+
+
+class RateLimitSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.time = FakeTime()
+        self.examinee = examinee.RateLimitScheduler(
+            pacing_threshold=0.1,
+            clock=self.time.clock,
+            sleep=self.time.sleep,
+        )
+
+    def test_requests_are_not_delayed_while_budget_remains(self):
+        self.examinee.acquire()
+        self.examinee.update(rate_limit_response(limit=5000, remaining=4000, reset=4600))
+        for _ in range(100):
+            self.examinee.acquire()
+
+        self.assertEqual(self.time.sleeps, [])
+        self.assertEqual(self.examinee.remaining(), 3900)
+
+    def test_requests_are_paced_if_budget_is_low(self):
+        self.examinee.update(rate_limit_response(limit=5000, remaining=100, reset=2000))
+        for _ in range(10):
+            self.examinee.acquire()
+
+        # remaining budget is spread over the time until reset (~10s per request)
+        self.assertGreaterEqual(self.time.now, 1080)
+        self.assertLess(self.time.now, 1000 + 10 * 12)
+
+    def test_requests_wait_for_reset_if_budget_is_exhausted(self):
+        self.examinee.update(rate_limit_response(limit=5000, remaining=0, reset=1300))
+        self.examinee.acquire()
+
+        self.assertEqual(self.time.now, 1300)
+        self.assertEqual(self.examinee.remaining(), float('inf'))
+
+    def test_max_wait(self):
+        self.examinee.max_wait_seconds = 30
+        self.examinee.update(rate_limit_response(limit=5000, remaining=0, reset=1300))
+        self.examinee.acquire()
+
+        self.assertEqual(self.time.now, 1030)
+
+    def test_secondary_rate_limit(self):
+        self.examinee.update(response(status_code=403, **{'Retry-After': '90'}))
+
+        self.assertEqual(self.examinee.remaining(), 0)
+        self.examinee.acquire()
+        self.assertEqual(self.time.now, 1090)
+
+    def test_outdated_responses_do_not_increase_budget(self):
+        self.examinee.update(rate_limit_response(limit=5000, remaining=4000, reset=4600))
+        self.examinee.update(rate_limit_response(limit=5000, remaining=4010, reset=4600))
+
+        self.assertEqual(self.examinee.remaining(), 4000)
+
+        # .. unless a new window started
+        self.examinee.update(rate_limit_response(limit=5000, remaining=4999, reset=8200))
+        self.assertEqual(self.examinee.remaining(), 4999)
+
+    def test_rate_limits_are_tracked_per_resource(self):
+        graphql_request = requests.Request('POST', 'https://api.github.com/graphql').prepare()
+        core_request = requests.Request('GET', 'https://api.github.com/repos/o/r').prepare()
+
+        self.examinee.update(rate_limit_response(
+            limit=5000, remaining=4000, reset=4600, **{'X-RateLimit-Resource': 'core'},
+        ))
+        self.examinee.update(rate_limit_response(
+            limit=5000, remaining=0, reset=1300, **{'X-RateLimit-Resource': 'graphql'},
+        ))
+
+        # exhausted graphql budget must neither delay nor overwrite core budget
+        self.examinee.acquire(core_request)
+        self.assertEqual(self.time.sleeps, [])
+        self.assertEqual(self.examinee.remaining(), 3999)
+        self.assertEqual(self.examinee.remaining('graphql'), 0)
+
+        self.examinee.acquire(graphql_request)
+        self.assertEqual(self.time.now, 1300)
+
+    def test_resource_for_url(self):
+        self.assertEqual(examinee.resource_for_url('https://api.github.com/graphql'), 'graphql')
+        self.assertEqual(examinee.resource_for_url('https://ghe.example/api/graphql'), 'graphql')
+        self.assertEqual(
+            examinee.resource_for_url('https://api.github.com/search/code?q=x'), 'search',
+        )
+        self.assertEqual(
+            examinee.resource_for_url('https://ghe.example/api/v3/search/issues'), 'search',
+        )
+        self.assertEqual(examinee.resource_for_url('https://api.github.com/repos/o/r'), 'core')
+
+
+class SchedulerRegistryTest(unittest.TestCase):
+    def github_cfg(self, name, token):
+        return GithubConfig(
+            name=name,
+            raw_dict={
+                'apiUrl': 'https://api.example.com',
+                'httpUrl': 'https://example.com',
+                'technicalUser': {'authToken': token},
+            },
+        )
+
+    def test_schedulers_are_shared_per_token(self):
+        self.assertIs(
+            examinee.scheduler(self.github_cfg('a', 'token-1')),
+            examinee.scheduler(self.github_cfg('b', 'token-1')),
+        )
+        self.assertIsNot(
+            examinee.scheduler(self.github_cfg('a', 'token-1')),
+            examinee.scheduler(self.github_cfg('a', 'token-2')),
+        )
+
+    def test_schedulers_are_bounded(self):
+        max_size = examinee._schedulers.max_size
+        for idx in range(max_size + 1):
+            examinee.scheduler(self.github_cfg('a', f'bounded-token-{idx}'))
+
+        self.assertEqual(len(examinee._schedulers), max_size)
+
+    def test_load_is_balanced_across_technical_users(self):
+        first = self.github_cfg('first', 'balance-token-1')
+        second = self.github_cfg('second', 'balance-token-2')
+
+        class CfgFactory(object):
+            def _cfg_elements(self, cfg_type_name):
+                return [first, second]
+
+        cfg_factory = CfgFactory()
+
+        def cfg_for_hostname(**kwargs):
+            return ghu.github_cfg_for_hostname(
+                cfg_factory=cfg_factory,
+                host_name='example.com',
+                **kwargs
+            )
+
+        self.assertIs(cfg_for_hostname(), first)
+        self.assertIs(cfg_for_hostname(balance_load=True), first)
+
+        examinee.scheduler(first).update(
+            rate_limit_response(limit=5000, remaining=10, reset=2**40)
+        )
+        self.assertIs(cfg_for_hostname(), first)
+        self.assertIs(cfg_for_hostname(balance_load=True), second)
@@ -0,0 +1,126 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+
+import http_metrics as examinee
+
+
+class RouteTemplateTest(unittest.TestCase):
+    def test_route_template(self):
+        for url, expected in (
+            (
+                'https://api.github.com/repos/gardener/cc-utils/pulls/42',
+                '/repos/{owner}/{repo}/pulls/{id}',
+            ),
+            (
+                'https://api.github.com/repos/o/r/contents/a/b.yaml?ref=master',
+                '/repos/{owner}/{repo}/contents/{path}',
+            ),
+            (
+                'https://api.github.com/repos/o/r/commits/0123abcd9',
+                '/repos/{owner}/{repo}/commits/{sha}',
+            ),
+            ('https://api.github.com/orgs/gardener/repos', '/orgs/{name}/repos'),
+            (
+                'https://concourse.example.com/api/v1/teams/main/pipelines/p/resources/r/check',
+                '/api/v1/teams/{name}/pipelines/{name}/resources/{name}/check',
+            ),
+            ('/v2/foo/blobs/sha256:abcdef', '/v2/foo/blobs/{name}'),
+            ('https://example.com', '/'),
+        ):
+            self.assertEqual(examinee.route_template(url), expected)
+
+
+class HTTPMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.examinee = examinee.HTTPMetrics()
+
+    def test_record_request(self):
+        for latency, status_code in ((0.01, 200), (0.3, 200), (20, 502), (1, None)):
+            self.examinee.record_request(
+                host='api.github.com',
+                method='GET',
+                url='https://api.github.com/repos/o/r',
+                latency_seconds=latency,
+                status_code=status_code,
+                bytes_sent=1,
+                bytes_received=10,
+            )
+        self.examinee.record_retry(host='api.github.com', method='GET', url='/repos/o/r')
+
+        metrics = self.examinee.as_dict()['api.github.com']['GET /repos/{owner}/{repo}']
+        self.assertEqual(metrics['requests'], 4)
+        self.assertEqual(metrics['retries'], 1)
+        self.assertEqual(metrics['errors'], 1)
+        self.assertEqual(metrics['status_codes'], {'200': 2, '502': 1})
+        self.assertEqual(metrics['bytes_sent'], 4)
+        self.assertEqual(metrics['bytes_received'], 40)
+        buckets = metrics['latency_seconds']['buckets']
+        self.assertEqual(buckets['0.05'], 1)
+        self.assertEqual(buckets['0.5'], 2)
+        self.assertEqual(buckets['1'], 3)
+        self.assertEqual(buckets['+Inf'], 4)
+
+    def test_routes_per_host_are_bounded(self):
+        metrics = examinee.HTTPMetrics(max_routes_per_host=2)
+        for name in ('a', 'b', 'c', 'd'):
+            metrics.record_request(
+                host='h', method='GET', url=f'/{name}', latency_seconds=0, status_code=200,
+            )
+
+        routes = metrics.as_dict()['h']
+        self.assertEqual(set(routes), {'GET /a', 'GET /b', 'GET {other}'})
+        self.assertEqual(routes['GET {other}']['requests'], 2)
+
+    def test_prometheus_text(self):
+        self.examinee.record_request(
+            host='h', method='GET', url='/x', latency_seconds=0.2, status_code=200,
+        )
+        text = self.examinee.as_prometheus_text()
+
+        self.assertIn('# TYPE http_client_request_duration_seconds histogram', text)
+        self.assertIn(
+            'http_client_responses_total{host="h",method="GET",route="/x",code="200"} 1',
+            text,
+        )
+        self.assertIn(
+            'http_client_request_duration_seconds_bucket{host="h",method="GET",route="/x",'
+            'le="0.25"} 1',
+            text,
+        )
+        self.assertIn(
+            'http_client_request_duration_seconds_bucket{host="h",method="GET",route="/x",'
+            'le="0.1"} 0',
+            text,
+        )
+
+    def test_write(self):
+        self.examinee.record_request(
+            host='h', method='GET', url='/x', latency_seconds=0.2, status_code=200,
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_file = os.path.join(tmp_dir, 'metrics.json')
+            prom_file = os.path.join(tmp_dir, 'metrics.prom')
+            self.examinee.write(json_file)
+            self.examinee.write(prom_file)
+
+            with open(json_file) as f:
+                self.assertEqual(json.load(f)['h']['GET /x']['requests'], 1)
+            with open(prom_file) as f:
+                self.assertIn('http_client_requests_total', f.read())
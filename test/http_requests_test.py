@@ -0,0 +1,241 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+
+import requests
+
+import http_requests
+from http_requests import (
+    ConditionalRequestCache,
+    ConnectionPoolRegistry,
+    mount_default_adapter,
+)
+
+
+class _ETagHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        self.server.client_ports.add(self.client_address[1])
+        etag = '"v{v}"'.format(v=self.server.version)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('X-RateLimit-Remaining', '42')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = 'version {v}'.format(v=self.server.version).encode('utf-8')
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConditionalRequestCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _ETagHandler)
+        self.server.version = 1
+        self.server.requests = []
+        self.server.client_ports = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{p}/resource'.format(p=self.server.server_address[1])
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = ConditionalRequestCache(cache_dir=self.cache_dir.name)
+        self.session = mount_default_adapter(requests.Session(), cache=self.cache)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache_dir.cleanup()
+
+    def test_not_modified_responses_are_served_from_cache(self):
+        first = self.session.get(self.url)
+        second = self.session.get(self.url)
+
+        self.assertEqual(first.text, 'version 1')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.text, 'version 1')
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.headers['X-RateLimit-Remaining'], '42')
+        self.assertNotIn('If-None-Match', self.server.requests[0])
+        self.assertEqual(self.server.requests[1]['If-None-Match'], '"v1"')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_modified_responses_replace_cache_entries(self):
+        self.session.get(self.url)
+        self.server.version = 2
+
+        self.assertEqual(self.session.get(self.url).text, 'version 2')
+        response = self.session.get(self.url)
+        self.assertEqual(response.text, 'version 2')
+        self.assertTrue(response.from_cache)
+
+    def test_entries_vary_on_authorization(self):
+        self.session.get(self.url, headers={'Authorization': 'token a'})
+        self.session.get(self.url, headers={'Authorization': 'token b'})
+
+        self.assertNotIn('If-None-Match', self.server.requests[1])
+
+    def test_eviction(self):
+        cache = ConditionalRequestCache(cache_dir=self.cache_dir.name, max_size_bytes=400)
+        session = mount_default_adapter(requests.Session(), cache=cache)
+        for idx in range(10):
+            session.get(self.url + str(idx))
+
+        entries = [n for n in os.listdir(self.cache_dir.name) if not n.startswith('.')]
+        self.assertLess(len(entries), 10)
+        self.assertLessEqual(
+            sum(os.path.getsize(os.path.join(self.cache_dir.name, n)) for n in entries),
+            400,
+        )
+
+    def test_scheduler(self):
+        class Scheduler(object):
+            def __init__(self):
+                self.calls = []
+
+            def acquire(self, request):
+                self.calls.append('acquire')
+
+            def update(self, response):
+                self.calls.append(response.status_code)
+
+        scheduler = Scheduler()
+        session = mount_default_adapter(requests.Session(), cache=self.cache, scheduler=scheduler)
+        session.get(self.url)
+        session.get(self.url)
+
+        # scheduler sees actual responses (not the ones served from cache)
+        self.assertEqual(scheduler.calls, ['acquire', 200, 'acquire', 304])
+
+
+class ConnectionPoolRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _ETagHandler)
+        self.server.version = 1
+        self.server.requests = []
+        self.server.client_ports = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{p}/resource'.format(p=self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_shared_between_sessions(self):
+        for _ in range(3):
+            with mount_default_adapter(requests.Session()) as session:
+                session.get(self.url)
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_connections_are_not_shared_if_disabled(self):
+        for _ in range(3):
+            with mount_default_adapter(requests.Session(), share_connections=False) as session:
+                session.get(self.url)
+
+        self.assertEqual(len(self.server.client_ports), 3)
+
+    def test_connections_are_shared_per_tls_setting(self):
+        def connection(verify):
+            adapter = mount_default_adapter(requests.Session()).get_adapter('https://example.org')
+            request = requests.Request('GET', 'https://example.org/').prepare()
+            return adapter.get_connection_with_tls_context(request, verify=verify)
+
+        verified = connection(verify=True)
+        unverified = connection(verify=False)
+
+        self.assertIs(connection(verify=True), verified)
+        self.assertIs(connection(verify=False), unverified)
+        self.assertIsNot(verified, unverified)
+        self.assertEqual(verified.cert_reqs, 'CERT_REQUIRED')
+        self.assertEqual(unverified.cert_reqs, 'CERT_NONE')
+
+    def test_ensure_pool_maxsize(self):
+        registry = ConnectionPoolRegistry(pool_maxsize=2)
+        pool = registry.pool_manager().connection_from_url(self.url)
+        self.assertEqual(pool.pool.maxsize, 2)
+
+        registry.ensure_pool_maxsize(1)
+        self.assertEqual(registry.pool_maxsize(), 2)
+
+        registry.ensure_pool_maxsize(5)
+        self.assertEqual(registry.pool_maxsize(), 5)
+        # existing and new pools are grown
+        self.assertEqual((pool.pool.maxsize, pool.pool.qsize()), (5, 5))
+        other_pool = registry.pool_manager().connection_from_url('http://localhost:1')
+        self.assertEqual(other_pool.pool.maxsize, 5)
+
+        # surplus connections are retained
+        connections = [pool._get_conn() for _ in range(5)]
+        for connection in connections:
+            pool._put_conn(connection)
+        self.assertEqual(pool.num_connections, 5)
+        self.assertEqual(pool.pool.qsize(), 5)
+
+
+class HTTPMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _ETagHandler)
+        self.server.version = 1
+        self.server.requests = []
+        self.server.client_ports = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{p}/resource/12'.format(p=self.server.server_address[1])
+        self.metrics = http_requests.enable_http_metrics()
+
+    def tearDown(self):
+        http_requests.disable_http_metrics()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_requests_are_recorded(self):
+        session = mount_default_adapter(requests.Session())
+        session.get(self.url)
+        session.get(self.url, headers={'If-None-Match': '"v1"'})
+
+        metrics = self.metrics.as_dict()['127.0.0.1']['GET /resource/{id}']
+        self.assertEqual(metrics['requests'], 2)
+        self.assertEqual(metrics['status_codes'], {'200': 1, '304': 1})
+        self.assertEqual(metrics['bytes_received'], len('version 1'))
+        self.assertEqual(metrics['errors'], 0)
+
+    def test_connection_errors_are_recorded(self):
+        session = mount_default_adapter(requests.Session(), share_connections=False)
+        session.get_adapter('http://').max_retries = http_requests.LoggingRetry(
+            total=1,
+            backoff_factor=0,
+        )
+        with self.assertRaises(requests.ConnectionError):
+            session.get('http://127.0.0.1:1/x')
+
+        metrics = self.metrics.as_dict()['127.0.0.1']['GET /x']
+        self.assertEqual(metrics['errors'], 1)
+        # connection errors are retried
+        self.assertEqual(metrics['retries'], 1)
@@ -14,7 +14,9 @@
 # limitations under the License.
 
 import os
+import pickle
 import unittest
+import unittest.mock
 from textwrap import dedent
 
 from tempfile import TemporaryDirectory
@@ -117,6 +119,27 @@ class ConfigFactorySmokeTestsMixin(object):
         # compare the dictionaries here
         self.assertEqual(cfg_elem.raw, {'some_value':123})
 
+    def test_cfg_elements_are_memoised(self):
+        element = self.examinee._cfg_element('a_type', 'first_value_of_a')
+
+        self.assertIs(self.examinee._cfg_element('a_type', 'first_value_of_a'), element)
+        self.assertIsNot(self.examinee._cfg_element('a_type', 'second_value_of_a'), element)
+
+        # replacing the raw dict invalidates the memoised element
+        self.examinee.raw['a_type']['first_value_of_a'] = {'some_value': 1}
+        replaced_element = self.examinee._cfg_element('a_type', 'first_value_of_a')
+
+        self.assertIsNot(replaced_element, element)
+        self.assertEqual(replaced_element.raw, {'some_value': 1})
+
+    def test_pickling_drops_memoised_elements(self):
+        element = self.examinee._cfg_element('a_type', 'first_value_of_a')
+
+        unpickled = pickle.loads(pickle.dumps(self.examinee))
+
+        self.assertEqual(unpickled._elements, {})
+        self.assertEqual(unpickled._cfg_element('a_type', 'first_value_of_a').raw, element.raw)
+
 
 class ConfigFactoryCfgDirDeserialisationTest(unittest.TestCase, ConfigFactorySmokeTestsMixin):
     '''
@@ -207,6 +230,45 @@ class ConfigFactoryCfgDirDeserialisationTest(unittest.TestCase, ConfigFactorySmo
                 cfg_types_file='another absent file'
             )
 
+    def test_cfg_files_are_parsed_lazily(self):
+        self.assertNotIn('a_type', self.examinee.raw)
+
+        self.examinee._cfg_element('a_type', 'first_value_of_a')
+
+        self.assertIn('a_type', self.examinee.raw)
+        self.assertNotIn('defined_but_unused_type', self.examinee.raw)
+
+    def test_snapshot(self):
+        snapshot_file = os.path.join(self.tmpdir.name, 'snapshot', 'cfg.pickle')
+
+        def from_cfg_dir():
+            return ConfigFactory.from_cfg_dir(
+                cfg_dir=self.tmpdir.name,
+                cfg_types_file=self.types_file,
+                snapshot_file=snapshot_file,
+            )
+
+        factory = from_cfg_dir()
+        self.assertTrue(os.path.isfile(snapshot_file))
+        self.assertEqual(factory.raw['defined_but_unused_type'], {'unused': {'some_value': 7}})
+
+        # valid snapshots are read instead of parsing cfg files
+        with unittest.mock.patch.object(model, 'parse_yaml_file') as parse_mock:
+            factory = from_cfg_dir()
+            parse_mock.assert_not_called()
+        self.assertEqual(factory._cfg_element('a_type', 'second_value_of_a').raw['some_value'], 42)
+
+        # changed cfg files invalidate the snapshot
+        self._file('a_type_values.xxx', '''
+        second_value_of_a:
+            some_value: 4711
+        ''')
+        factory = from_cfg_dir()
+        self.assertEqual(
+            factory._cfg_element('a_type', 'second_value_of_a').raw['some_value'],
+            4711,
+        )
+
 
 class ConfigFactoryDictDeserialisationTest(unittest.TestCase, ConfigFactorySmokeTestsMixin):
     '''
@@ -14,6 +14,8 @@
 # limitations under the License.
 
 import unittest
+from unittest.mock import patch
+
 import pytest
 
 import product.util as util
@@ -33,6 +35,22 @@ def cref():
     return component_ref
 
 
+class ResolverBaseTest(unittest.TestCase):
+    def test_github_api_for_hostname_balances_load(self):
+        examinee = util.ResolverBase(cfg_factory='cfg_factory')
+
+        with patch.object(util, 'github_cfg_for_hostname', return_value='cfg') as cfg_mock, \
+                patch.object(util, '_create_github_api_object', return_value='api') as api_mock:
+            self.assertEqual(examinee._github_api_for_hostname(host_name='gh.com'), 'api')
+
+        cfg_mock.assert_called_once_with(
+            cfg_factory='cfg_factory',
+            host_name='gh.com',
+            balance_load=True,
+        )
+        api_mock.assert_called_once_with('cfg')
+
+
 class ProductUtilTest(unittest.TestCase):
     def setUp(self):
         self.cref1 = component_ref(name='c1', version='1.2.3')
@@ -123,3 +123,45 @@ class UtilTest(unittest.TestCase):
             merged,
             {1: [3, 1, 0, 2, 4]},
         )
+
+    def test_merge_dicts_does_not_modify_arguments(self):
+        left = {1: {2: [3]}, 4: {5: 6}}
+        right = {1: {2: [7], 8: {9: 10}}}
+
+        for share_unmodified in (False, True):
+            merged = examinee.merge_dicts(left, right, share_unmodified=share_unmodified)
+
+            self.assertEqual(merged, {1: {2: [3, 7], 8: {9: 10}}, 4: {5: 6}})
+            self.assertEqual(left, {1: {2: [3]}, 4: {5: 6}})
+            self.assertEqual(right, {1: {2: [7], 8: {9: 10}}})
+
+        merged = examinee.merge_dicts(left, right)
+        self.assertIsNot(merged[4], left[4])
+        self.assertIsNot(merged[1][8], right[1][8])
+
+    def test_merge_dicts_list_semantics(self):
+        left = {1: [{2: 3}, 4, 4], 5: [6]}
+        right = {1: [{2: 3}, {7: 8}, 9, 9, 4], 5: 'override'}
+
+        self.assertEqual(
+            examinee.merge_dicts(left, right),
+            {1: [{2: 3}, 4, 4, {7: 8}, 9, 9], 5: 'override'},
+        )
+        self.assertEqual(
+            examinee.merge_dicts(left, right, list_semantics=None),
+            {1: [{2: 3}, {7: 8}, 9, 9, 4], 5: 'override'},
+        )
+        with self.assertRaises(NotImplementedError):
+            examinee.merge_dicts(left, right, list_semantics='append')
+
+    def test_load_yaml_caches_parse_results_by_digest(self):
+        first = examinee.load_yaml('a: [1, 2]', digest='test-digest')
+        first['a'].append(3)
+
+        # cached result must not be affected by modifications of returned instances
+        self.assertEqual(examinee.load_yaml('ignored', digest='test-digest'), {'a': [1, 2]})
+        self.assertEqual(examinee.load_yaml('b: 1'), {'b': 1})
+
+    def test_load_yaml_rejects_unsafe_tags(self):
+        with self.assertRaises(examinee.yaml.YAMLError):
+            examinee.load_yaml('!!python/object/apply:os.getcwd []')
@@ -13,10 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import copy
+import hashlib
 import os
 import pathlib
 import shutil
 import sys
+import threading
 import yaml
 
 import termcolor
@@ -179,20 +183,55 @@ def none(value):
     return value
 
 
+# use libyaml-based implementation, if available
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+YAML_PARSE_CACHE_SIZE = 1024
+_yaml_parse_cache = collections.OrderedDict()
+_yaml_parse_cache_lock = threading.Lock()
+
+
+def load_yaml(text, digest: str=None):
+    '''
+    parses the given YAML document (str, bytes or file object) using a safe loader.
+
+    @param digest: optional digest uniquely identifying the document's contents (e.g. a git
+        blob SHA). If given, parse results are cached (per process), and a copy of the cached
+        result is returned for documents with the same digest.
+    '''
+    if digest is None:
+        return yaml.load(text, Loader=_YAML_LOADER)
+
+    with _yaml_parse_cache_lock:
+        if digest in _yaml_parse_cache:
+            _yaml_parse_cache.move_to_end(digest)
+            parsed = _yaml_parse_cache[digest]
+            # do not hand out cached instances (callers may modify them)
+            return _copy_value(parsed)
+
+    parsed = yaml.load(text, Loader=_YAML_LOADER)
+
+    with _yaml_parse_cache_lock:
+        _yaml_parse_cache[digest] = parsed
+        while len(_yaml_parse_cache) > YAML_PARSE_CACHE_SIZE:
+            _yaml_parse_cache.popitem(last=False)
+    return _copy_value(parsed)
+
+
 def is_yaml_file(path: CliHints.existing_file()):
-    with open(path) as f:
-        try:
-            if yaml.load(f):
-                return True
-        except Exception:
-            warning('an error occurred whilst trying to parse {f}'.format(f=path))
-            raise
+    try:
+        if parse_yaml_file(path):
+            return True
+    except Exception:
+        warning('an error occurred whilst trying to parse {f}'.format(f=path))
+        raise
     return False
 
 
 def parse_yaml_file(path: CliHints.existing_file()):
-    with open(path) as f:
-            return yaml.load(f)
+    with open(path, 'rb') as f:
+        contents = f.read()
+    return load_yaml(contents, digest='sha256:' + hashlib.sha256(contents).hexdigest())
 
 
 def random_str(prefix=None, length=12):
@@ -266,42 +305,121 @@ def which(cmd_name: str) -> str:
     return cmd_path
 
 
-def merge_dicts(base: dict, other: dict, list_semantics='merge'):
-    '''
-    merges copies of the given dict instances and returns the merge result.
-    The arguments remain unmodified. However, it must be possible to copy them
-    using `copy.deepcopy`.
+def _copy_value(value):
+    # cheaper than `copy.deepcopy` for the plain (YAML / JSON-like) structures merged here
+    value_type = type(value)
+    if value_type is dict:
+        return {k: _copy_value(v) for k, v in value.items()}
+    if value_type is list:
+        return [_copy_value(e) for e in value]
+    if value_type in _IMMUTABLE_TYPES:
+        return value
+    return copy.deepcopy(value)
+
 
-    Merging is done using the `deepmerge` module. In case of merge conflicts, values from
-    `other` overwrite values from `base`.
+_IMMUTABLE_TYPES = frozenset((str, int, float, bool, bytes, type(None)))
 
-    By default, different from the original implementation, a merge will be applied to
-    lists. This results in deduplication retaining element order. The elements from `other` are
-    appended to those from `base`.
 
+def _share_value(value):
+    return value
+
+
+class _MergeStrategy(object):
     '''
-    not_none(base)
-    not_none(other)
+    structural merge of (nested) dicts (and optionally lists). Only containers that are actually
+    merged are rebuilt; the arguments are never modified.
+    '''
+    def __init__(self, merge_lists: bool):
+        self._merge_lists = merge_lists
+
+    def merge(self, base, other, share_unmodified: bool):
+        take = _share_value if share_unmodified else _copy_value
+        return self._merge_values(base, other, take)
+
+    def _merge_values(self, base, other, take):
+        if not (isinstance(base, type(other)) or isinstance(other, type(base))):
+            # type conflict: values from `other` win
+            return take(other)
+        if self._merge_lists and isinstance(other, list):
+            return self._merge_list(base, other, take)
+        if isinstance(other, dict):
+            return self._merge_dict(base, other, take)
+        return take(other)
+
+    def _merge_dict(self, base, other, take):
+        merged = base.copy()
+        for key, value in other.items():
+            if key in base:
+                merged[key] = self._merge_values(base[key], value, take)
+            else:
+                merged[key] = take(value)
+        if take is not _share_value:
+            for key, value in base.items():
+                if key not in other:
+                    merged[key] = take(value)
+        return merged
+
+    def _merge_list(self, base, other, take):
+        # append elements from `other` not contained in `base` (retaining order). Membership
+        # is checked using a set for hashable elements (falling back to comparing against
+        # unhashable ones, e.g. dicts).
+        hashable_elements = set()
+        unhashable_elements = []
+        for element in base:
+            try:
+                hashable_elements.add(element)
+            except TypeError:
+                unhashable_elements.append(element)
+
+        merged = [take(element) for element in base]
+        for element in other:
+            try:
+                contained = element in hashable_elements
+            except TypeError:
+                contained = False
+            if not contained and unhashable_elements:
+                contained = element in unhashable_elements
+            if not contained:
+                merged.append(take(element))
+        return merged
+
+
+_MERGE_STRATEGIES = {
+    'merge': _MergeStrategy(merge_lists=True),
+    None: _MergeStrategy(merge_lists=False),
+}
+
+
+def merge_dicts(
+    base: dict,
+    other: dict,
+    list_semantics='merge',
+    share_unmodified: bool=False,
+):
+    '''
+    merges the given dict instances and returns the merge result. The arguments remain
+    unmodified. In case of merge conflicts, values from `other` overwrite values from `base`.
 
-    from deepmerge import Merger
+    By default, lists are merged as well. This results in deduplication retaining element
+    order. The elements from `other` that are not contained in the list from `base` are
+    appended to it. If `list_semantics` is `None`, lists from `other` overwrite those from
+    `base`.
 
-    if list_semantics == 'merge':
-        # monkey-patch merge-strategy for lists
-        list_merge_strategy = Merger.PROVIDED_TYPE_STRATEGIES[list]
-        list_merge_strategy.strategy_merge = lambda c, p, base, other: \
-            list(base) + [e for e in other if e not in base]
+    @param share_unmodified: if `True`, the result may share values (including nested
+        dicts and lists) that were not changed by the merge with the arguments. This avoids
+        copying them, but callers must then not modify the result in place.
+    '''
+    not_none(base)
+    not_none(other)
 
-        strategy_cfg = [(list, ['merge']), (dict, ['merge'])]
-        merger = Merger(strategy_cfg, ['override'], ['override'])
-    elif list_semantics is None:
-        strategy_cfg = [(dict, ['merge'])]
-        merger = Merger(strategy_cfg, ['override'], ['override'])
-    else:
+    if list_semantics not in _MERGE_STRATEGIES:
         raise NotImplementedError
 
-    from copy import deepcopy
-    # copy dicts, so they remain unmodified
-    return merger.merge(deepcopy(base), deepcopy(other))
+    return _MERGE_STRATEGIES[list_semantics].merge(
+        base,
+        other,
+        share_unmodified=share_unmodified,
+    )
 
 
 class FluentIterable(object):
@@ -14,7 +14,6 @@
 # limitations under the License.
 
 import datetime
-import functools
 import time
 
 from flask import current_app as app
@@ -27,6 +26,7 @@ from .model import (
     RefType,
 )
 from .pipelines import update_repository_pipelines
+import caching
 import ccc
 import concourse.client
 import util
@@ -42,16 +42,8 @@ class GithubWebhookDispatcher(object):
         self.whd_cfg = whd_cfg
         self.cfg_factory = util.ctx().cfg_factory()
 
-    @functools.lru_cache()
     def concourse_clients(self):
-        for concourse_config_name in self.whd_cfg.concourse_config_names():
-            concourse_cfg = self.cfg_factory.concourse(concourse_config_name)
-            job_mapping_set = self.cfg_factory.job_mapping(concourse_cfg.job_mapping_cfg_name())
-            for job_mapping in job_mapping_set.job_mappings().values():
-                yield concourse.client.from_cfg(
-                    concourse_cfg=concourse_cfg,
-                    team_name=job_mapping.team_name(),
-                )
+        return _concourse_clients(cfg_factory=self.cfg_factory, whd_cfg=self.whd_cfg)
 
     def dispatch_create_event(self, create_event):
         ref_type = create_event.ref_type()
@@ -123,7 +115,6 @@ class GithubWebhookDispatcher(object):
             )
 
     def _matching_resources(self, concourse_api, event):
-        resources = concourse_api.pipeline_resources(concourse_api.pipelines())
         if isinstance(event, PushEvent):
             resource_type = 'git'
         elif isinstance(event, PullRequestEvent):
@@ -131,11 +122,15 @@ class GithubWebhookDispatcher(object):
         else:
             raise NotImplementedError
 
+        resources = concourse_api.pipeline_resources(
+            concourse_api.pipelines(),
+            resource_types=(resource_type,),
+            # one broken pipeline must not prevent dispatching events to all others
+            isolate_errors=True,
+        )
         for resource in resources:
             if not resource.has_webhook_token():
                 continue
-            if not resource.type == resource_type:
-                continue
             ghs = resource.github_source()
             repository = event.repository()
             if not ghs.hostname() == repository.github_host():
@@ -214,11 +209,8 @@ class GithubWebhookDispatcher(object):
             sleep_seconds=sleep_seconds*1.2,
         )
 
-    @functools.lru_cache()
     def els_client(self):
-        elastic_cfg = self.cfg_set.elasticsearch()
-        elastic_client = ccc.elasticsearch.from_cfg(elasticsearch_cfg=elastic_cfg)
-        return elastic_client
+        return _els_client(elasticsearch_cfg=self.cfg_set.elasticsearch())
 
     def log_outdated_resources(self, outdated_resources):
         els_index = self.cfg_set.webhook_dispatcher_deployment().logging_els_index()
@@ -236,3 +228,27 @@ class GithubWebhookDispatcher(object):
                 for resource in outdated_resources
             ],
         )
+
+
+# dispatchers are instantiated per request - cache clients across requests (keyed by their
+# configuration), renewing them after some time
+@caching.cached(max_size=16, ttl_seconds=3600)
+def _concourse_clients(cfg_factory, whd_cfg: WebhookDispatcherConfig):
+    concourse_clients = []
+    for concourse_config_name in whd_cfg.concourse_config_names():
+        concourse_cfg = cfg_factory.concourse(concourse_config_name)
+        job_mapping_set = cfg_factory.job_mapping(concourse_cfg.job_mapping_cfg_name())
+        for job_mapping in job_mapping_set.job_mappings().values():
+            concourse_clients.append(
+                concourse.client.from_cfg(
+                    concourse_cfg=concourse_cfg,
+                    team_name=job_mapping.team_name(),
+                )
+            )
+    # tuple: results are shared between callers
+    return tuple(concourse_clients)
+
+
+@caching.cached(max_size=16, ttl_seconds=3600)
+def _els_client(elasticsearch_cfg):
+    return ccc.elasticsearch.from_cfg(elasticsearch_cfg=elasticsearch_cfg)
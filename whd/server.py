@@ -17,6 +17,7 @@ import logging
 from flask import Flask
 from flask_restful import Api
 
+from .stats import CacheStatistics, HTTPMetrics
 from .webhook import GithubWebhook
 from model.webhook_dispatcher import WebhookDispatcherConfig
 
@@ -37,5 +38,13 @@ def webhook_dispatcher_app(
             'cfg_set': cfg_set,
         }
     )
+    api.add_resource(
+        CacheStatistics,
+        '/cache-stats',
+    )
+    api.add_resource(
+        HTTPMetrics,
+        '/http-metrics',
+    )
 
     return app
@@ -0,0 +1,45 @@
+# Copyright (c) 2019 SAP SE or an SAP affiliate company. All rights reserved. This file is licensed
+# under the Apache Software License, v. 2 except as noted otherwise in the LICENSE file
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from flask import Response, abort
+from flask_restful import Resource
+
+import caching
+import http_requests
+
+
+class CacheStatistics(Resource):
+    '''
+    exposes hit / miss statistics of all in-process caches (see `caching`)
+    '''
+    def get(self):
+        return {
+            name: stats._asdict() for name, stats in sorted(caching.stats().items())
+        }
+
+
+class HTTPMetrics(Resource):
+    '''
+    exposes metrics of outgoing HTTP requests in Prometheus text format (only available if
+    enabled, see `http_requests.enable_http_metrics`)
+    '''
+    def get(self):
+        metrics = http_requests.http_metrics()
+        if not metrics:
+            abort(404, 'HTTP metrics are not enabled (set CC_HTTP_METRICS)')
+        return Response(
+            metrics.as_prometheus_text(),
+            mimetype='text/plain; version=0.0.4',
+        )